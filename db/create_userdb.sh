@@ -54,10 +54,17 @@ CREATE TABLE IF NOT EXISTS users (
     updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
     last_login_at TIMESTAMPTZ,
     failed_login_count INT NOT NULL DEFAULT 0,
-    locked_until TIMESTAMPTZ
+    locked_until TIMESTAMPTZ,
+    security_version INT NOT NULL DEFAULT 0
 );
 
+-- Added after the first release; bumped whenever an admin changes the user
+ALTER TABLE users ADD COLUMN IF NOT EXISTS security_version INT NOT NULL DEFAULT 0;
+
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+-- Keyset pagination and email-prefix search in /api/admin/users
+CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_users_email_prefix ON users(lower(email::text) text_pattern_ops);
 
 -- Refresh tokens
 CREATE TABLE IF NOT EXISTS refresh_tokens (
@@ -70,6 +77,11 @@ CREATE TABLE IF NOT EXISTS refresh_tokens (
     revoked BOOLEAN NOT NULL DEFAULT false
 );
 
+-- token_hash is an HMAC-SHA256 digest of the token, looked up by value
+CREATE UNIQUE INDEX IF NOT EXISTS idx_refresh_tokens_token_hash ON refresh_tokens(token_hash);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires_at ON refresh_tokens(expires_at);
+
 -- Email tokens
 CREATE TABLE IF NOT EXISTS email_tokens (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -124,6 +136,108 @@ CREATE INDEX IF NOT EXISTS idx_chat_session ON chat_history(session_id);
 CREATE INDEX IF NOT EXISTS idx_chat_model ON chat_history(model);
 CREATE INDEX IF NOT EXISTS idx_chat_user_assistant ON chat_history(user_id, assistant_id);
 
+-- Conversation grouping and previews for /api/chat/history. Generated, so
+-- Memori's inserts need no changes; the API stores its conversation id in
+-- metadata_json and older rows fall back to the Memori session.
+ALTER TABLE chat_history ADD COLUMN IF NOT EXISTS conversation_id VARCHAR(255)
+    GENERATED ALWAYS AS (COALESCE(metadata_json->>'conversation_id', session_id)) STORED;
+ALTER TABLE chat_history ADD COLUMN IF NOT EXISTS preview VARCHAR(160)
+    GENERATED ALWAYS AS (left(user_input, 160)) STORED;
+-- Turns of one conversation, and batched conversation deletes
+CREATE INDEX IF NOT EXISTS idx_chat_user_conversation
+    ON chat_history(user_id, conversation_id, created_at, chat_id);
+-- Superseded by conversation_summary below
+DROP INDEX IF EXISTS idx_chat_user_created_covering;
+
+-- One row per conversation, kept current by triggers on chat_history, so
+-- /api/chat/history pages by keyset on (last_at, conversation_id) and never
+-- aggregates a user's turns
+CREATE TABLE IF NOT EXISTS conversation_summary (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    conversation_id VARCHAR(255) NOT NULL,
+    title VARCHAR(160),
+    last_message VARCHAR(160),
+    turns INT NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ NOT NULL,
+    last_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, conversation_id)
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_summary_user_last
+    ON conversation_summary(user_id, last_at, conversation_id);
+
+-- Recompute one conversation from its turns (after deletes and updates)
+CREATE OR REPLACE FUNCTION refresh_conversation_summary(p_user UUID, p_conversation VARCHAR) RETURNS void AS $$
+BEGIN
+    DELETE FROM conversation_summary WHERE user_id = p_user AND conversation_id = p_conversation;
+    INSERT INTO conversation_summary (user_id, conversation_id, title, last_message, turns, started_at, last_at)
+    SELECT user_id, conversation_id,
+           (array_agg(preview ORDER BY created_at))[1],
+           (array_agg(preview ORDER BY created_at DESC))[1],
+           COUNT(*), MIN(created_at), MAX(created_at)
+    FROM chat_history
+    WHERE user_id = p_user AND conversation_id = p_conversation
+    GROUP BY user_id, conversation_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- New turns (the common case) are folded in without reading other turns
+CREATE OR REPLACE FUNCTION trg_chat_history_conversation_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO conversation_summary (user_id, conversation_id, title, last_message, turns, started_at, last_at)
+    VALUES (NEW.user_id, NEW.conversation_id, NEW.preview, NEW.preview, 1, NEW.created_at, NEW.created_at)
+    ON CONFLICT (user_id, conversation_id) DO UPDATE SET
+        title = CASE WHEN EXCLUDED.started_at < conversation_summary.started_at
+                     THEN EXCLUDED.title ELSE conversation_summary.title END,
+        last_message = CASE WHEN EXCLUDED.last_at >= conversation_summary.last_at
+                            THEN EXCLUDED.last_message ELSE conversation_summary.last_message END,
+        turns = conversation_summary.turns + 1,
+        started_at = LEAST(conversation_summary.started_at, EXCLUDED.started_at),
+        last_at = GREATEST(conversation_summary.last_at, EXCLUDED.last_at);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deletes and updates recompute each affected conversation once per statement
+CREATE OR REPLACE FUNCTION trg_chat_history_conversation_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_conversation_summary(k.user_id, k.conversation_id)
+        FROM (SELECT user_id, conversation_id FROM old_rows
+              UNION SELECT user_id, conversation_id FROM new_rows) k;
+    ELSE
+        PERFORM refresh_conversation_summary(k.user_id, k.conversation_id)
+        FROM (SELECT DISTINCT user_id, conversation_id FROM old_rows) k;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER chat_history_conversation_insert
+    AFTER INSERT ON chat_history
+    FOR EACH ROW EXECUTE FUNCTION trg_chat_history_conversation_insert();
+CREATE OR REPLACE TRIGGER chat_history_conversation_delete
+    AFTER DELETE ON chat_history REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_chat_history_conversation_refresh();
+CREATE OR REPLACE TRIGGER chat_history_conversation_update
+    AFTER UPDATE ON chat_history REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_chat_history_conversation_refresh();
+
+-- Backfill summaries for databases created before they existed
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM conversation_summary) THEN
+        LOCK TABLE chat_history IN SHARE MODE;
+        INSERT INTO conversation_summary (user_id, conversation_id, title, last_message, turns, started_at, last_at)
+        SELECT user_id, conversation_id,
+               (array_agg(preview ORDER BY created_at))[1],
+               (array_agg(preview ORDER BY created_at DESC))[1],
+               COUNT(*), MIN(created_at), MAX(created_at)
+        FROM chat_history
+        GROUP BY user_id, conversation_id;
+    END IF;
+END;
+$$;
+
 -- Short-term memory
 CREATE TABLE IF NOT EXISTS short_term_memory (
     memory_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -209,6 +323,304 @@ CREATE INDEX IF NOT EXISTS idx_long_term_user_assistant ON long_term_memory(user
 CREATE INDEX IF NOT EXISTS idx_long_term_user_category ON long_term_memory(user_id, category_primary, importance_score);
 CREATE INDEX IF NOT EXISTS idx_long_term_version ON long_term_memory(memory_id, version);
 
+-- =============================================
+-- OpenAI usage and cost, synced daily from the organization API
+-- =============================================
+CREATE TABLE IF NOT EXISTS openai_usage_daily (
+    day DATE NOT NULL,
+    model TEXT NOT NULL DEFAULT '',
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    requests BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, model)
+);
+
+CREATE TABLE IF NOT EXISTS openai_cost_daily (
+    day DATE NOT NULL,
+    line_item TEXT NOT NULL DEFAULT '',
+    cost_usd NUMERIC(18, 6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, line_item)
+);
+
+-- One row per synced day; final days are never fetched again
+CREATE TABLE IF NOT EXISTS openai_usage_sync (
+    day DATE PRIMARY KEY,
+    synced_at TIMESTAMPTZ NOT NULL,
+    final BOOLEAN NOT NULL DEFAULT false
+);
+
+-- =============================================
+-- Admin dashboard rollups
+-- Maintained incrementally by triggers so /api/admin/stats reads a
+-- handful of precomputed rows instead of scanning the base tables.
+-- rebuild_admin_rollups() recomputes everything from scratch.
+-- =============================================
+
+-- Global counters and sums, one row per metric
+CREATE TABLE IF NOT EXISTS stats_totals (
+    metric TEXT PRIMARY KEY,
+    value NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Hourly event counters for the rolling 24h / 7d / 30d windows
+CREATE TABLE IF NOT EXISTS stats_hourly (
+    metric TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, bucket)
+);
+
+-- Per-user activity summary
+CREATE TABLE IF NOT EXISTS user_activity_summary (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    chat_count BIGINT NOT NULL DEFAULT 0,
+    tokens_used BIGINT NOT NULL DEFAULT 0,
+    last_activity TIMESTAMPTZ,
+    stm_count BIGINT NOT NULL DEFAULT 0,
+    ltm_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_user_activity_chat_count ON user_activity_summary(chat_count DESC);
+
+-- Long-term memory counts per category
+CREATE TABLE IF NOT EXISTS memory_category_counts (
+    category_primary VARCHAR(255) PRIMARY KEY,
+    ltm_count BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_memory_category_counts_count ON memory_category_counts(ltm_count DESC);
+
+CREATE OR REPLACE FUNCTION rollup_add(p_metric TEXT, p_delta NUMERIC) RETURNS void AS $$
+BEGIN
+    IF p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO stats_totals (metric, value, updated_at) VALUES (p_metric, p_delta, now())
+    ON CONFLICT (metric) DO UPDATE
+        SET value = stats_totals.value + EXCLUDED.value, updated_at = now();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_add_hourly(p_metric TEXT, p_at TIMESTAMPTZ, p_delta NUMERIC) RETURNS void AS $$
+BEGIN
+    IF p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO stats_hourly (metric, bucket, value) VALUES (p_metric, date_trunc('hour', p_at), p_delta)
+    ON CONFLICT (metric, bucket) DO UPDATE SET value = stats_hourly.value + EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only inserts a missing summary row for positive deltas, so cascaded
+-- deletes of a user's rows never re-create the summary of a deleted user
+CREATE OR REPLACE FUNCTION rollup_user_activity(p_user UUID, p_chats BIGINT, p_tokens BIGINT,
+                                                p_stm BIGINT, p_ltm BIGINT, p_at TIMESTAMPTZ)
+RETURNS void AS $$
+BEGIN
+    UPDATE user_activity_summary SET
+        chat_count = chat_count + p_chats,
+        tokens_used = tokens_used + p_tokens,
+        stm_count = stm_count + p_stm,
+        ltm_count = ltm_count + p_ltm,
+        last_activity = GREATEST(last_activity, p_at),
+        updated_at = now()
+    WHERE user_id = p_user;
+    IF NOT FOUND AND p_chats >= 0 AND p_stm >= 0 AND p_ltm >= 0 THEN
+        INSERT INTO user_activity_summary (user_id, chat_count, tokens_used, stm_count, ltm_count, last_activity)
+        VALUES (p_user, p_chats, p_tokens, p_stm, p_ltm, p_at)
+        ON CONFLICT (user_id) DO UPDATE SET
+            chat_count = user_activity_summary.chat_count + EXCLUDED.chat_count,
+            tokens_used = user_activity_summary.tokens_used + EXCLUDED.tokens_used,
+            stm_count = user_activity_summary.stm_count + EXCLUDED.stm_count,
+            ltm_count = user_activity_summary.ltm_count + EXCLUDED.ltm_count,
+            last_activity = GREATEST(user_activity_summary.last_activity, EXCLUDED.last_activity),
+            updated_at = now();
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_users_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM rollup_add('users_total', 1);
+        PERFORM rollup_add('users_active', NEW.is_active::int);
+        PERFORM rollup_add('users_verified', NEW.is_email_verified::int);
+        PERFORM rollup_add_hourly('new_users', NEW.created_at, 1);
+        INSERT INTO user_activity_summary (user_id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM rollup_add('users_active', NEW.is_active::int - OLD.is_active::int);
+        PERFORM rollup_add('users_verified', NEW.is_email_verified::int - OLD.is_email_verified::int);
+    ELSE
+        PERFORM rollup_add('users_total', -1);
+        PERFORM rollup_add('users_active', -OLD.is_active::int);
+        PERFORM rollup_add('users_verified', -OLD.is_email_verified::int);
+        PERFORM rollup_add_hourly('new_users', OLD.created_at, -1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_chat_history_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollup_add('chats_total', -1);
+        PERFORM rollup_add('chat_tokens_total', -COALESCE(OLD.tokens_used, 0));
+        PERFORM rollup_add_hourly('chats', OLD.created_at, -1);
+        PERFORM rollup_user_activity(OLD.user_id, -1, -COALESCE(OLD.tokens_used, 0), 0, 0, NULL);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollup_add('chats_total', 1);
+        PERFORM rollup_add('chat_tokens_total', COALESCE(NEW.tokens_used, 0));
+        PERFORM rollup_add_hourly('chats', NEW.created_at, 1);
+        PERFORM rollup_user_activity(NEW.user_id, 1, COALESCE(NEW.tokens_used, 0), 0, 0, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_short_term_memory_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollup_add('stm_total', -1);
+        PERFORM rollup_add('stm_importance_sum', -OLD.importance_score::numeric);
+        PERFORM rollup_user_activity(OLD.user_id, 0, 0, -1, 0, NULL);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollup_add('stm_total', 1);
+        PERFORM rollup_add('stm_importance_sum', NEW.importance_score::numeric);
+        PERFORM rollup_user_activity(NEW.user_id, 0, 0, 1, 0, NULL);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_long_term_memory_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollup_add('ltm_total', -1);
+        PERFORM rollup_add('ltm_importance_sum', -OLD.importance_score::numeric);
+        PERFORM rollup_add('ltm_user_context', -COALESCE(OLD.is_user_context, false)::int);
+        PERFORM rollup_add('ltm_preferences', -COALESCE(OLD.is_preference, false)::int);
+        UPDATE memory_category_counts SET ltm_count = ltm_count - 1
+        WHERE category_primary = OLD.category_primary;
+        PERFORM rollup_user_activity(OLD.user_id, 0, 0, 0, -1, NULL);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollup_add('ltm_total', 1);
+        PERFORM rollup_add('ltm_importance_sum', NEW.importance_score::numeric);
+        PERFORM rollup_add('ltm_user_context', COALESCE(NEW.is_user_context, false)::int);
+        PERFORM rollup_add('ltm_preferences', COALESCE(NEW.is_preference, false)::int);
+        INSERT INTO memory_category_counts (category_primary, ltm_count) VALUES (NEW.category_primary, 1)
+        ON CONFLICT (category_primary) DO UPDATE SET ltm_count = memory_category_counts.ltm_count + 1;
+        PERFORM rollup_user_activity(NEW.user_id, 0, 0, 0, 1, NULL);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keeps the users_with_* counters in step with the per-user summary
+CREATE OR REPLACE FUNCTION trg_user_activity_summary_rollup() RETURNS trigger AS $$
+DECLARE
+    d_chats INT := 0;
+    d_stm INT := 0;
+    d_ltm INT := 0;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        d_chats := d_chats - (OLD.chat_count > 0)::int;
+        d_stm := d_stm - (OLD.stm_count > 0)::int;
+        d_ltm := d_ltm - (OLD.ltm_count > 0)::int;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        d_chats := d_chats + (NEW.chat_count > 0)::int;
+        d_stm := d_stm + (NEW.stm_count > 0)::int;
+        d_ltm := d_ltm + (NEW.ltm_count > 0)::int;
+    END IF;
+    PERFORM rollup_add('users_with_chats', d_chats);
+    PERFORM rollup_add('users_with_stm', d_stm);
+    PERFORM rollup_add('users_with_ltm', d_ltm);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE triggers are limited to the columns the rollups depend on, so
+-- e.g. last_login_at or Memori's access_count updates cost nothing
+CREATE OR REPLACE TRIGGER users_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF is_active, is_email_verified ON users
+    FOR EACH ROW EXECUTE FUNCTION trg_users_rollup();
+CREATE OR REPLACE TRIGGER chat_history_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, tokens_used, created_at ON chat_history
+    FOR EACH ROW EXECUTE FUNCTION trg_chat_history_rollup();
+CREATE OR REPLACE TRIGGER short_term_memory_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, importance_score ON short_term_memory
+    FOR EACH ROW EXECUTE FUNCTION trg_short_term_memory_rollup();
+CREATE OR REPLACE TRIGGER long_term_memory_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, importance_score, category_primary, is_user_context, is_preference
+    ON long_term_memory
+    FOR EACH ROW EXECUTE FUNCTION trg_long_term_memory_rollup();
+CREATE OR REPLACE TRIGGER user_activity_summary_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF chat_count, stm_count, ltm_count ON user_activity_summary
+    FOR EACH ROW EXECUTE FUNCTION trg_user_activity_summary_rollup();
+
+-- Recompute every rollup from the base tables (initial backfill / drift repair)
+CREATE OR REPLACE FUNCTION rebuild_admin_rollups() RETURNS void AS $$
+BEGIN
+    -- Block writers while recomputing so no trigger delta is lost
+    LOCK TABLE users, chat_history, short_term_memory, long_term_memory IN SHARE MODE;
+    TRUNCATE stats_totals, stats_hourly, user_activity_summary, memory_category_counts;
+
+    INSERT INTO stats_totals (metric, value)
+    SELECT 'users_total', COUNT(*) FROM users
+    UNION ALL SELECT 'users_active', COUNT(*) FILTER (WHERE is_active) FROM users
+    UNION ALL SELECT 'users_verified', COUNT(*) FILTER (WHERE is_email_verified) FROM users
+    UNION ALL SELECT 'chats_total', COUNT(*) FROM chat_history
+    UNION ALL SELECT 'chat_tokens_total', COALESCE(SUM(tokens_used), 0) FROM chat_history
+    UNION ALL SELECT 'stm_total', COUNT(*) FROM short_term_memory
+    UNION ALL SELECT 'stm_importance_sum', COALESCE(SUM(importance_score::numeric), 0) FROM short_term_memory
+    UNION ALL SELECT 'ltm_total', COUNT(*) FROM long_term_memory
+    UNION ALL SELECT 'ltm_importance_sum', COALESCE(SUM(importance_score::numeric), 0) FROM long_term_memory
+    UNION ALL SELECT 'ltm_user_context', COUNT(*) FILTER (WHERE is_user_context) FROM long_term_memory
+    UNION ALL SELECT 'ltm_preferences', COUNT(*) FILTER (WHERE is_preference) FROM long_term_memory
+    UNION ALL SELECT 'rebuilt_at', EXTRACT(EPOCH FROM now());
+
+    INSERT INTO stats_hourly (metric, bucket, value)
+    SELECT 'new_users', date_trunc('hour', created_at), COUNT(*) FROM users GROUP BY 2
+    UNION ALL
+    SELECT 'chats', date_trunc('hour', created_at), COUNT(*) FROM chat_history GROUP BY 2;
+
+    -- The summary trigger derives users_with_chats/stm/ltm from these rows
+    INSERT INTO user_activity_summary (user_id, chat_count, tokens_used, last_activity, stm_count, ltm_count)
+    SELECT
+        u.id,
+        COALESCE(ch.chat_count, 0),
+        COALESCE(ch.tokens_used, 0),
+        ch.last_activity,
+        COALESCE(stm.stm_count, 0),
+        COALESCE(ltm.ltm_count, 0)
+    FROM users u
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) AS chat_count, COALESCE(SUM(tokens_used), 0) AS tokens_used,
+               MAX(created_at) AS last_activity
+        FROM chat_history GROUP BY user_id
+    ) ch ON ch.user_id = u.id
+    LEFT JOIN (SELECT user_id, COUNT(*) AS stm_count FROM short_term_memory GROUP BY user_id) stm
+        ON stm.user_id = u.id
+    LEFT JOIN (SELECT user_id, COUNT(*) AS ltm_count FROM long_term_memory GROUP BY user_id) ltm
+        ON ltm.user_id = u.id;
+
+    INSERT INTO memory_category_counts (category_primary, ltm_count)
+    SELECT category_primary, COUNT(*) FROM long_term_memory GROUP BY category_primary;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill rollups for databases created before they existed
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM stats_totals WHERE metric = 'rebuilt_at') THEN
+        PERFORM rebuild_admin_rollups();
+    END IF;
+END;
+$$;
+
 EOSQL
 
 echo "All tables created successfully in $DB_NAME."
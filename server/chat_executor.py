@@ -0,0 +1,169 @@
+"""
+Bounded thread pool for the synchronous chat pipeline
+Keeps Memori search, embedding, HNSW search, the LLM completion and the
+Memori write off the uvicorn event loop, and rejects work once the pool
+and its queue are full instead of letting latency grow without bound
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+CHAT_EXECUTOR_WORKERS = int(os.getenv("CHAT_EXECUTOR_WORKERS", "8"))
+CHAT_EXECUTOR_MAX_PENDING = int(os.getenv("CHAT_EXECUTOR_MAX_PENDING", "64"))
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor already holds max_pending jobs"""
+
+
+class BoundedChatExecutor:
+    """
+    ThreadPoolExecutor with an admission limit and queue metrics
+
+    At most `workers` jobs run at once; up to `max_pending` jobs (running +
+    queued) are admitted, anything beyond that raises ExecutorSaturated.
+    """
+
+    def __init__(self, workers: int = CHAT_EXECUTOR_WORKERS,
+                 max_pending: int = CHAT_EXECUTOR_MAX_PENDING,
+                 name: str = "chat"):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix=f"{name}-worker"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturated(
+                    f"Chat executor saturated ({self._pending}/{self.max_pending} jobs pending)"
+                )
+            self._pending += 1
+            self.submitted += 1
+
+        loop = asyncio.get_running_loop()
+        job = partial(self._execute, time.monotonic(), fn, args, kwargs)
+        try:
+            future = loop.run_in_executor(self._executor, job)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # The job keeps its slot until it finishes, even if the client disconnects
+        return await future
+
+    async def stream(self, gen_fn, *args, **kwargs):
+        """
+        Iterate the sync generator gen_fn(*args, **kwargs) on the pool
+
+        Items are handed back to the event loop as they are produced. If the
+        consumer stops early (e.g. client disconnect) the generator is closed
+        on the worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            gen = gen_fn(*args, **kwargs)
+            try:
+                for item in gen:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (done, e))
+                return
+            finally:
+                gen.close()
+            loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+
+        future = asyncio.ensure_future(self.run(produce))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                finished, _ = await asyncio.wait(
+                    {getter, future}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter not in finished:
+                    # produce() never started (saturated) or failed outright
+                    getter.cancel()
+                    future.result()
+                    return
+                item, error = getter.result()
+                if item is done:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def _execute(self, enqueued_at: float, fn, args, kwargs):
+        started = time.monotonic()
+        wait = started - enqueued_at
+        with self._lock:
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._total_run += elapsed
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self) -> dict:
+        """Queue depth, saturation and latency counters"""
+        with self._lock:
+            finished = self.completed + self.failed
+            started = finished + self._running
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": max(0, self._pending - self._running),
+                "saturation": self._pending / self.max_pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_queue_wait_ms": (self._total_wait / started * 1000) if started else 0.0,
+                "max_queue_wait_ms": self._max_wait * 1000,
+                "avg_run_ms": (self._total_run / finished * 1000) if finished else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and wait for running jobs"""
+        self._executor.shutdown(wait=wait)
+
+
+chat_executor = BoundedChatExecutor()
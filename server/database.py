@@ -0,0 +1,155 @@
+"""
+Pooled async Postgres access for the API server
+One asyncpg pool per process replaces a psycopg2 connect() per unit of
+work, so handlers no longer pay TCP/auth setup or block the event loop
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+
+DB_CONFIG = {
+    "host": os.getenv("DATABASE_HOST", "localhost"),
+    "port": int(os.getenv("DATABASE_PORT", "5432")),
+    "database": os.getenv("DATABASE_NAME", "userdb"),
+    "user": os.getenv("DATABASE_USER", "useradmin"),
+    "password": os.getenv("DATABASE_PASSWORD", "userdb1234")
+}
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+
+
+class Database:
+    """
+    asyncpg pool with acquire-wait and query metrics
+
+    Each pooled connection keeps its own prepared-statement cache
+    (statement_cache_size), so the fixed queries used by the handlers are
+    parsed and planned once per connection rather than once per request.
+    """
+
+    def __init__(self, config: dict = None, min_size: int = DB_POOL_MIN_SIZE,
+                 max_size: int = DB_POOL_MAX_SIZE,
+                 acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT,
+                 statement_cache_size: int = DB_STATEMENT_CACHE_SIZE,
+                 command_timeout: float = DB_COMMAND_TIMEOUT):
+        self.config = dict(config or DB_CONFIG)
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.acquire_timeout = acquire_timeout
+        self.statement_cache_size = statement_cache_size
+        self.command_timeout = command_timeout
+        self._pool = None
+        self._connect_lock = asyncio.Lock()
+        self.acquisitions = 0
+        self.acquire_timeouts = 0
+        self.queries = 0
+        self.errors = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def connect(self):
+        """Create the pool (idempotent)"""
+        async with self._connect_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    **self.config,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    statement_cache_size=self.statement_cache_size,
+                    command_timeout=self.command_timeout
+                )
+                print(f"[Database] Pool ready ({self.min_size}-{self.max_size} connections "
+                      f"to {self.config['host']}:{self.config['port']})")
+
+    async def close(self):
+        """Close all pooled connections"""
+        async with self._connect_lock:
+            if self._pool is not None:
+                await self._pool.close()
+                self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a pooled connection (statements autocommit)"""
+        if self._pool is None:
+            await self.connect()
+        started = time.monotonic()
+        try:
+            conn = await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            raise
+        wait = time.monotonic() - started
+        self.acquisitions += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        try:
+            yield conn
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            await self._pool.release(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Borrow a pooled connection inside a transaction (commit on success, rollback on error)"""
+        async with self.connection() as conn:
+            async with conn.transaction():
+                yield conn
+
+    async def fetch(self, query: str, *args) -> list:
+        """Run a query and return all rows as dicts"""
+        async with self.connection() as conn:
+            self.queries += 1
+            return [dict(row) for row in await conn.fetch(query, *args)]
+
+    async def fetchrow(self, query: str, *args):
+        """Run a query and return the first row as a dict, or None"""
+        async with self.connection() as conn:
+            self.queries += 1
+            row = await conn.fetchrow(query, *args)
+            return dict(row) if row is not None else None
+
+    async def fetchval(self, query: str, *args):
+        """Run a query and return the first column of the first row"""
+        async with self.connection() as conn:
+            self.queries += 1
+            return await conn.fetchval(query, *args)
+
+    async def execute(self, query: str, *args) -> str:
+        """Run a statement and return its status string (e.g. "UPDATE 1")"""
+        async with self.connection() as conn:
+            self.queries += 1
+            return await conn.execute(query, *args)
+
+    def stats(self) -> dict:
+        """Pool occupancy and acquire latency counters"""
+        size = self._pool.get_size() if self._pool is not None else 0
+        idle = self._pool.get_idle_size() if self._pool is not None else 0
+        return {
+            "connected": self._pool is not None,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "statement_cache_size": self.statement_cache_size,
+            "acquisitions": self.acquisitions,
+            "acquire_timeouts": self.acquire_timeouts,
+            "queries": self.queries,
+            "errors": self.errors,
+            "avg_acquire_wait_ms": (self._total_wait / self.acquisitions * 1000) if self.acquisitions else 0.0,
+            "max_acquire_wait_ms": self._max_wait * 1000,
+        }
+
+
+db = Database()
@@ -0,0 +1,263 @@
+"""
+Background index build jobs
+A full rebuild runs leann_converter.py in its own low-priority process
+instead of inside the HTTP request. At most one build runs at a time;
+asking for a rebuild while one is running returns the running job. The
+converter's "[Progress] {json}" lines are parsed into the job's stage and
+counts, which the status endpoint reports. There is no time cap, but a job
+can be cancelled.
+"""
+import asyncio
+import json
+import os
+import signal
+import sys
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+LEANN_CONVERTER_PATH = Path(__file__).resolve().parents[1] / "src" / "utils" / "leann_converter.py"
+
+INDEX_BUILD_NICE = int(os.getenv("INDEX_BUILD_NICE", "10"))
+INDEX_JOB_HISTORY = int(os.getenv("INDEX_JOB_HISTORY", "20"))
+INDEX_JOB_OUTPUT_LINES = int(os.getenv("INDEX_JOB_OUTPUT_LINES", "200"))
+# Longest output line kept whole; longer ones are truncated instead of failing the read
+INDEX_JOB_LINE_LIMIT = int(os.getenv("INDEX_JOB_LINE_LIMIT", str(1024 * 1024)))
+# Seconds a cancelled build gets to exit on SIGTERM before it is killed
+INDEX_JOB_CANCEL_GRACE = float(os.getenv("INDEX_JOB_CANCEL_GRACE", "10"))
+
+PROGRESS_PREFIX = "[Progress] "
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def read_lines(stream: asyncio.StreamReader):
+    """
+    Lines of a subprocess pipe, including an unterminated last one
+
+    A line longer than the stream's limit is cut at the limit and the rest of
+    it discarded, so the pipe keeps being drained.
+    """
+    while True:
+        try:
+            yield await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                yield e.partial
+            return
+        except asyncio.LimitOverrunError as e:
+            line = await stream.readexactly(e.consumed)
+            while True:
+                try:
+                    await stream.readuntil(b"\n")
+                    break
+                except asyncio.LimitOverrunError as rest:
+                    await stream.readexactly(rest.consumed)
+                except asyncio.IncompleteReadError:
+                    break
+            yield line + b" [truncated]"
+
+
+class IndexJobManager:
+    """Start, track and cancel index build processes (one at a time)"""
+
+    def __init__(self, converter_path: Path = LEANN_CONVERTER_PATH, nice: int = INDEX_BUILD_NICE,
+                 history: int = INDEX_JOB_HISTORY):
+        self.converter_path = converter_path
+        self.nice = nice
+        self.history = history
+        self._jobs = OrderedDict()  # job id -> job dict, oldest first
+        self._processes = {}
+        self._tasks = {}
+        self._active_id = None
+        self._lock = asyncio.Lock()
+        self.started = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def _public(job: dict) -> dict:
+        return {key: value for key, value in job.items() if key != "output"}
+
+    def get(self, job_id: str, output: bool = False):
+        """Job status dict, or None if unknown (or already dropped from history)"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        result = self._public(job)
+        if output:
+            result["output"] = list(job["output"])
+        return result
+
+    def list(self) -> list:
+        """Known jobs, newest first"""
+        return [self._public(job) for job in reversed(self._jobs.values())]
+
+    def active(self):
+        return self.get(self._active_id) if self._active_id else None
+
+    async def start(self, on_success=None, **details):
+        """
+        Start a build unless one is already running
+
+        Args:
+            on_success: Coroutine function awaited after a successful build
+            details: Extra fields stored on the job (e.g. documents)
+
+        Returns:
+            (job, created): the new job, or the running one with created=False
+        """
+        async with self._lock:
+            if self._active_id is not None:
+                return self.get(self._active_id), False
+
+            job_id = str(uuid.uuid4())
+            job = {
+                "id": job_id,
+                "status": "queued",
+                "stage": None,
+                "progress": {},
+                "created_at": utc_now(),
+                "started_at": None,
+                "finished_at": None,
+                "returncode": None,
+                "error": None,
+                **details,
+                "output": deque(maxlen=INDEX_JOB_OUTPUT_LINES),
+            }
+            self._jobs[job_id] = job
+            self._active_id = job_id
+            self._trim_history()
+            self.started += 1
+            self._tasks[job_id] = asyncio.create_task(self._run(job, on_success))
+            return self.get(job_id), True
+
+    def _trim_history(self):
+        while len(self._jobs) > self.history:
+            oldest = next(iter(self._jobs))
+            if oldest == self._active_id:
+                break
+            del self._jobs[oldest]
+
+    async def _run(self, job: dict, on_success):
+        job_id = job["id"]
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, str(self.converter_path),
+                cwd=str(self.converter_path.parents[2]),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                limit=INDEX_JOB_LINE_LIMIT,
+                env=dict(os.environ, INDEX_BUILD_NICE=str(self.nice), PYTHONUNBUFFERED="1"),
+                # Own process group, so cancel also stops anything the build spawned
+                start_new_session=True
+            )
+            self._processes[job_id] = process
+            job["status"] = "running"
+            job["started_at"] = utc_now()
+            print(f"[IndexJobs] Job {job_id} started (pid {process.pid})")
+
+            async for raw in read_lines(process.stdout):
+                self._handle_line(job, raw.decode("utf-8", errors="replace").rstrip())
+            job["returncode"] = await process.wait()
+
+            # A build that finished before the signal arrived still swapped its index in
+            if job["status"] == "cancelling" and job["returncode"] != 0:
+                job["status"] = "cancelled"
+                self.cancelled += 1
+            elif job["returncode"] != 0:
+                job["status"] = "failed"
+                job["error"] = job["output"][-1] if job["output"] else f"exit code {job['returncode']}"
+                self.failed += 1
+            else:
+                if on_success is not None:
+                    await on_success()
+                job["status"] = "succeeded"
+                self.succeeded += 1
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            self.failed += 1
+        finally:
+            # A build nobody reads from any more would block on its pipe
+            # while holding the index lock; make sure it is gone
+            if process is not None and process.returncode is None:
+                self._signal(process, signal.SIGKILL)
+                await process.wait()
+            job["finished_at"] = utc_now()
+            self._processes.pop(job_id, None)
+            self._tasks.pop(job_id, None)
+            if self._active_id == job_id:
+                self._active_id = None
+            print(f"[IndexJobs] Job {job_id} {job['status']}")
+
+    def _handle_line(self, job: dict, line: str):
+        if line.startswith(PROGRESS_PREFIX):
+            try:
+                progress = json.loads(line[len(PROGRESS_PREFIX):])
+            except ValueError:
+                pass
+            else:
+                stage = progress.pop("stage", None)
+                if stage != job["stage"]:
+                    job["stage"] = stage
+                    job["progress"] = {}
+                job["progress"].update(progress)
+                return
+        job["output"].append(line)
+
+    async def cancel(self, job_id: str):
+        """
+        Stop a running build; the live index is left as it was
+
+        Returns:
+            The job dict, or None if the job is unknown
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        process = self._processes.get(job_id)
+        if job["status"] not in FINISHED_STATES and process is not None:
+            job["status"] = "cancelling"
+            self._signal(process, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(asyncio.shield(process.wait()), INDEX_JOB_CANCEL_GRACE)
+            except asyncio.TimeoutError:
+                self._signal(process, signal.SIGKILL)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self.get(job_id)
+
+    @staticmethod
+    def _signal(process, sig):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    async def shutdown(self):
+        """Cancel the running build, if any"""
+        if self._active_id is not None:
+            await self.cancel(self._active_id)
+
+    def stats(self) -> dict:
+        active = self.active()
+        return {
+            "active_job": active["id"] if active else None,
+            "active_stage": active["stage"] if active else None,
+            "started": self.started,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
+
+
+index_jobs = IndexJobManager()
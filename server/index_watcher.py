@@ -0,0 +1,115 @@
+"""
+Hot reload of published index versions
+Every server process polls the CURRENT index pointer. When a build or an
+upload publishes a new version, the new index is checksum-verified and
+loaded in a worker thread while the old engine keeps answering; the
+process-wide engine is then swapped and cached answers are dropped.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from retrieval_engine import loaded_retrieval_engine, reload_retrieval_engine
+from answer_cache import get_answer_cache
+from utils.index_versions import IndexVersionError, current_index_path, current_version, verify_version
+
+
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "5"))
+
+
+class IndexWatcher:
+    """Detect a newly published index version and switch readers over to it"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._watch_task = None
+        self._rejected_version = None
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_reload_at = None
+        self.last_reload_ms = 0.0
+
+    async def check(self) -> bool:
+        """
+        Reload the engine if CURRENT points elsewhere than the loaded index
+
+        Returns:
+            True if a new version was swapped in
+        """
+        async with self._lock:
+            engine = loaded_retrieval_engine()
+            target = current_index_path()
+            # Not loaded yet: the first request loads whatever is current
+            if engine is None or engine.index_path == target:
+                return False
+
+            version = current_version()
+            if version is not None and version == self._rejected_version:
+                return False
+            started = asyncio.get_running_loop().time()
+            try:
+                if version is not None:
+                    await asyncio.to_thread(verify_version, version)
+                await asyncio.to_thread(reload_retrieval_engine, target)
+            except IndexVersionError as e:
+                # A corrupt version won't fix itself; wait for the next publish
+                self._rejected_version = version
+                self._record_error(e)
+                return False
+            except Exception as e:
+                self._record_error(e)
+                return False
+
+            # Cached answers were generated from the old index
+            get_answer_cache().invalidate()
+            self.reloads += 1
+            self.last_reload_at = datetime.now(timezone.utc)
+            self.last_reload_ms = (asyncio.get_running_loop().time() - started) * 1000
+            print(f"[IndexWatcher] Switched to index {target} ({self.last_reload_ms:.0f} ms)")
+            return True
+
+    def _record_error(self, error: Exception):
+        self.errors += 1
+        self.last_error = str(error)
+        print(f"[IndexWatcher] Reload failed: {error}")
+
+    async def _watch_loop(self, interval: float):
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[IndexWatcher] Check failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_watch_job(self, interval: float = INDEX_WATCH_INTERVAL):
+        """Run check() every `interval` seconds on the event loop"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_loop(interval))
+
+    async def stop_watch_job(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    def stats(self) -> dict:
+        engine = loaded_retrieval_engine()
+        return {
+            "watch_job_running": self._watch_task is not None and not self._watch_task.done(),
+            "current_version": current_version(),
+            "loaded_index": engine.index_path if engine is not None else None,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_reload_at": self.last_reload_at.isoformat() if self.last_reload_at else None,
+            "last_reload_ms": self.last_reload_ms,
+        }
+
+
+index_watcher = IndexWatcher()
@@ -4,20 +4,21 @@ Handles authentication and chat endpoints
 """
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 import jwt
 from datetime import datetime, timedelta, timezone
 import uuid
-import bcrypt
+import json
+import base64
+import asyncio
+import time
 import os
 from pathlib import Path
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from contextlib import contextmanager
-import requests
 from dotenv import load_dotenv
+import asyncpg
 
 # Load environment variables from .env file
 env_path = Path(__file__).resolve().parents[1] / ".env"
@@ -29,6 +30,24 @@ src_path = Path(__file__).resolve().parents[1] / "src"
 sys.path.insert(0, str(src_path))
 
 from scripts.leann_chat_api import LeannChatAPI
+# leann_chat_api puts src/scripts on sys.path and imports its helpers from there;
+# import them the same way so the process-wide singletons are shared
+from retrieval_engine import (
+    get_retrieval_engine, loaded_retrieval_engine, shutdown_retrieval_engine
+)
+from memori_pool import get_memori_pool
+from answer_cache import get_answer_cache
+from memori_writer import get_memori_writer
+from chat_executor import chat_executor, ExecutorSaturated
+from database import db
+from user_cache import user_cache
+from password_hasher import password_hasher, PasswordHasherSaturated
+from refresh_tokens import refresh_token_store, RefreshTokenReused
+from utils.usage_cost import get_usage_cost_client
+from usage_store import usage_store
+from utils.incremental_index import add_document
+from index_jobs import index_jobs
+from index_watcher import index_watcher
 
 app = FastAPI(title="LEANN API", version="1.0.0")
 
@@ -50,27 +69,17 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours for longer admin sessions
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-# Database Configuration
-DB_CONFIG = {
-    "host": "localhost",
-    "database": "userdb",
-    "user": "useradmin",
-    "password": "userdb1234"
-}
-
-# Database connection context manager
-@contextmanager
-def get_db_connection():
-    """Context manager for database connections"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+# Chat history listing
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "20"))
+CHAT_HISTORY_MAX_PAGE_SIZE = 100
+CHAT_HISTORY_DELETE_BATCH = int(os.getenv("CHAT_HISTORY_DELETE_BATCH", "500"))
+
+# Admin usage/cost reports
+USAGE_MAX_DAYS = 366
+
+# Admin user listing
+ADMIN_USERS_PAGE_SIZE = int(os.getenv("ADMIN_USERS_PAGE_SIZE", "50"))
+ADMIN_USERS_MAX_PAGE_SIZE = 200
 
 
 # Models
@@ -123,29 +132,6 @@ class ChatResponse(BaseModel):
 
 
 # Utility functions
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    # Bcrypt has a max password length of 72 bytes
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a bcrypt hash"""
-    # Truncate password to match what was hashed
-    password_bytes = plain_password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-
-    hashed_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
-
-
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -153,10 +139,29 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def user_claims(user: dict) -> dict:
+    """
+    Access token claims for a users row
+
+    act/adm describe the account at issue time and are what
+    get_current_user authorizes from. ver is the user's security_version;
+    every is_active/is_admin change bumps it, so while ver still matches the
+    current value the act/adm claims are current too.
+    """
+    return {
+        "sub": str(user["id"]),
+        "email": user["email"],
+        "act": user["is_active"],
+        "adm": user["is_admin"],
+        "ver": user["security_version"]
+    }
+
+
 def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    # jti keeps tokens issued in the same second distinct (token_hash is unique)
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
@@ -182,8 +187,31 @@ def decode_token(token: str) -> dict:
         )
 
 
+USER_STATE_QUERY = """
+    SELECT id, email, is_active, is_email_verified, is_admin, security_version
+    FROM users WHERE id = $1
+"""
+
+
+async def load_user_state(user_id: str) -> Optional[dict]:
+    """Return the user's auth state from the user cache, loading it on a miss"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.fetchrow(USER_STATE_QUERY, user_id)
+        if user is None:
+            return None
+        user["id"] = str(user["id"])
+        user_cache.put(user_id, user)
+    return user
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Verify JWT token and return user info from database"""
+    """
+    Verify JWT token and return user info
+
+    Active/admin state comes from the token's act/adm claims; the user cache
+    (AUTH_USER_CACHE_TTL seconds) is only consulted for the ver check.
+    """
     try:
         token = credentials.credentials
         payload = decode_token(token)
@@ -196,14 +224,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 
         user_id = payload.get("sub")
 
-        # Fetch user from database
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(
-                    "SELECT id, email, is_active, is_email_verified, is_admin FROM users WHERE id = %s",
-                    (user_id,)
-                )
-                user = cur.fetchone()
+        # Usually served from the user cache without a database round trip
+        user = await load_user_state(user_id)
 
         if not user:
             raise HTTPException(
@@ -211,13 +233,21 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 detail="User not found"
             )
 
-        if not user['is_active']:
+        # Tokens issued before an admin changed this user (or before versioning) are stale
+        if payload.get("ver") != user['security_version']:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked"
+            )
+
+        # ver matches, so the claims reflect the account's current state
+        if not payload.get("act"):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User account is inactive"
             )
 
-        return dict(user)
+        return dict(user, is_active=True, is_admin=bool(payload.get("adm")))
     except HTTPException:
         raise
     except Exception as e:
@@ -238,14 +268,141 @@ async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict
     return current_user
 
 
-def create_chat_instance(user_id: str, user_email: str = None) -> LeannChatAPI:
+def create_chat_instance(user_id: str, user_email: str = None,
+                         conversation_id: str = None) -> LeannChatAPI:
     """
     Create a fresh LeannChatAPI instance for each request.
 
-    This ensures LeannChat doesn't accumulate conversation history across requests.
+    The instance only carries per-request conversation state; the LEANN index
+    and LLM client come from the process-wide RetrievalEngine, so nothing is
+    reloaded and no history leaks between users.
     Memori handles conversation history storage with proper user isolation.
     """
-    return LeannChatAPI(user_id, user_email=user_email)
+    return LeannChatAPI(
+        user_id,
+        user_email=user_email,
+        # Resolved inside, after the answer cache generation is read
+        memori_pool=get_memori_pool(),
+        memori_writer=get_memori_writer(),
+        answer_cache=get_answer_cache(),
+        conversation_id=conversation_id
+    )
+
+
+def run_chat_pipeline(user_id: str, user_email: str, message: str, top_k: int = 3,
+                      conversation_id: str = None) -> dict:
+    """
+    Run one chat turn synchronously (called on the chat executor).
+    """
+    # Create per-request chat state on top of the shared retrieval engine
+    # This prevents cross-request conversation history from accumulating
+    chat_api = create_chat_instance(user_id, user_email=user_email, conversation_id=conversation_id)
+    try:
+        return chat_api.ask(message, top_k=top_k)
+    finally:
+        # Return the user's Memori handle to the pool
+        chat_api.cleanup()
+
+
+def stream_chat_pipeline(user_id: str, user_email: str, message: str, top_k: int = 3,
+                         conversation_id: str = None):
+    """
+    Streaming variant of run_chat_pipeline (iterated on the chat executor).
+    """
+    chat_api = create_chat_instance(user_id, user_email=user_email, conversation_id=conversation_id)
+    try:
+        yield from chat_api.ask_stream(message, top_k=top_k)
+    finally:
+        chat_api.cleanup()
+
+
+def format_sources(raw_sources: list) -> List[SourceDocument]:
+    """Convert engine source dicts into SourceDocument models"""
+    sources = []
+    for idx, source in enumerate(raw_sources or []):
+        sources.append(SourceDocument(
+            document_id=idx,
+            text_preview=source.get('text', '')[:200],
+            metadata=str(source.get('metadata', {})),
+            relevance_score=source.get('score', 0.0)
+        ))
+    return sources
+
+
+def encode_cursor(created_at: datetime, key) -> str:
+    """Opaque keyset cursor pointing just past (created_at, key)"""
+    raw = json.dumps([created_at.isoformat(), str(key)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        created_at, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(key)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def check_page_size(limit: int, maximum: int):
+    if not 1 <= limit <= maximum:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {maximum}"
+        )
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.on_event("startup")
+async def load_retrieval_engine():
+    """Open the database pool and load the shared LEANN index once at startup"""
+    try:
+        await db.connect()
+    except Exception as e:
+        # The pool is created lazily on the first query if Postgres isn't up yet
+        print(f"Startup: Failed to connect to database: {e}")
+
+    try:
+        get_retrieval_engine()
+    except Exception as e:
+        # Keep auth/admin endpoints available; chat will retry the load lazily
+        print(f"Startup: Failed to load retrieval engine: {e}")
+
+    # Resume recording any conversations left in the write-behind spool
+    get_memori_writer().start()
+
+    # Spawn the bcrypt workers now rather than on the first login
+    password_hasher.start()
+
+    # Periodically delete expired and old revoked refresh tokens
+    refresh_token_store.start_purge_job()
+
+    # Keep the local OpenAI usage/cost tables current
+    if get_usage_cost_client().api_key:
+        usage_store.start_sync_job()
+
+    # Switch to newly published index versions without a restart
+    index_watcher.start_watch_job()
+
+
+@app.on_event("shutdown")
+async def unload_retrieval_engine():
+    """Flush pending Memori writes, then release the shared LEANN index, Memori handles and database pool"""
+    await index_jobs.shutdown()
+    chat_executor.shutdown(wait=True)
+    get_memori_writer().stop(flush=True)
+    get_memori_pool().close_all()
+    shutdown_retrieval_engine()
+    password_hasher.shutdown(wait=True)
+    await refresh_token_store.stop_purge_job()
+    await usage_store.stop_sync_job()
+    await index_watcher.stop_watch_job()
+    await get_usage_cost_client().aclose()
+    await db.close()
 
 
 # Routes
@@ -258,43 +415,40 @@ async def root():
 async def signup(request: SignupRequest):
     """Register a new user in database"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Check if user already exists
-                cur.execute("SELECT id FROM users WHERE email = %s", (request.email,))
-                if cur.fetchone():
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Email already registered"
-                    )
-
-                # Create new user
-                user_id = str(uuid.uuid4())
-                hashed_password = hash_password(request.password)
-
-                cur.execute("""
-                    INSERT INTO users (id, email, password_hash, is_active, is_email_verified, is_admin)
-                    VALUES (%s::uuid, %s, %s, %s, %s, %s)
-                    RETURNING id, email, is_email_verified, is_admin
-                """, (user_id, request.email, hashed_password, True, False, False))
-
-                user_data = cur.fetchone()
-                user_id_str = str(user_data['id'])
-
-                print(f"Signup: Created user with ID: {user_id_str}")
+        # Check if user already exists
+        if await db.fetchval("SELECT 1 FROM users WHERE email = $1", request.email):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+
+        # Hash outside any transaction: bcrypt is slow and must not pin a pooled connection
+        user_id = str(uuid.uuid4())
+        hashed_password = await password_hasher.hash(request.password)
+
+        # Create new user; the unique email constraint catches concurrent signups
+        try:
+            user_data = dict(await db.fetchrow("""
+                INSERT INTO users (id, email, password_hash, is_active, is_email_verified, is_admin)
+                VALUES ($1::uuid, $2, $3, $4, $5, $6)
+                RETURNING id, email, is_active, is_email_verified, is_admin, security_version
+            """, user_id, request.email, hashed_password, True, False, False))
+        except asyncpg.UniqueViolationError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+
+        user_id_str = str(user_data['id'])
+
+        print(f"Signup: Created user with ID: {user_id_str}")
 
         # Generate tokens
-        access_token = create_access_token({"sub": user_id_str, "email": request.email})
+        access_token = create_access_token(user_claims(user_data))
         refresh_token = create_refresh_token({"sub": user_id_str})
 
-        # Store refresh token in database (hashed for security)
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                token_hash = hash_password(refresh_token)  # Reuse hash function
-                cur.execute("""
-                    INSERT INTO refresh_tokens (user_id, token_hash, expires_at)
-                    VALUES (%s::uuid, %s, %s)
-                """, (user_id, token_hash, datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)))
+        # Store refresh token in database (HMAC digest, indexed)
+        await refresh_token_store.store(user_id, refresh_token, REFRESH_TOKEN_EXPIRE_DAYS)
 
         user = User(
             id=user_id_str,
@@ -312,6 +466,11 @@ async def signup(request: SignupRequest):
         )
     except HTTPException:
         raise
+    except PasswordHasherSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server is busy, please retry: {str(e)}"
+        )
     except Exception as e:
         print(f"Signup error: {e}")
         raise HTTPException(
@@ -324,14 +483,11 @@ async def signup(request: SignupRequest):
 async def login(request: LoginRequest):
     """Login user from database"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Find user by email
-                cur.execute("""
-                    SELECT id, email, password_hash, is_active, is_email_verified, is_admin
-                    FROM users WHERE email = %s
-                """, (request.email,))
-                user_data = cur.fetchone()
+        # Find user by email
+        user_data = await db.fetchrow("""
+            SELECT id, email, password_hash, is_active, is_email_verified, is_admin, security_version
+            FROM users WHERE email = $1
+        """, request.email)
 
         if not user_data:
             raise HTTPException(
@@ -339,7 +495,7 @@ async def login(request: LoginRequest):
                 detail="Invalid email or password"
             )
 
-        if not verify_password(request.password, user_data["password_hash"]):
+        if not await password_hasher.verify(request.password, user_data["password_hash"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -354,25 +510,17 @@ async def login(request: LoginRequest):
         user_id_str = str(user_data["id"])
 
         # Update last login time
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "UPDATE users SET last_login_at = %s WHERE id = %s",
-                    (datetime.now(timezone.utc), user_data["id"])
-                )
+        await db.execute(
+            "UPDATE users SET last_login_at = $1 WHERE id = $2",
+            datetime.now(timezone.utc), user_data["id"]
+        )
 
         # Generate tokens
-        access_token = create_access_token({"sub": user_id_str, "email": request.email})
+        access_token = create_access_token(user_claims(user_data))
         refresh_token = create_refresh_token({"sub": user_id_str})
 
-        # Store refresh token in database (hashed for security)
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                token_hash = hash_password(refresh_token)  # Reuse hash function
-                cur.execute("""
-                    INSERT INTO refresh_tokens (user_id, token_hash, expires_at)
-                    VALUES (%s, %s, %s)
-                """, (user_data["id"], token_hash, datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)))
+        # Store refresh token in database (HMAC digest, indexed)
+        await refresh_token_store.store(user_data["id"], refresh_token, REFRESH_TOKEN_EXPIRE_DAYS)
 
         user = User(
             id=user_id_str,
@@ -390,6 +538,11 @@ async def login(request: LoginRequest):
         )
     except HTTPException:
         raise
+    except PasswordHasherSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server is busy, please retry: {str(e)}"
+        )
     except Exception as e:
         print(f"Login error: {e}")
         raise HTTPException(
@@ -400,15 +553,13 @@ async def login(request: LoginRequest):
 
 @app.post("/api/auth/refresh")
 async def refresh_token(request: RefreshTokenRequest):
-    """Refresh access token"""
-    token = request.refreshToken
-
-    if token not in refresh_tokens_db:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token"
-        )
+    """
+    Exchange a refresh token for a new access token and a new refresh token
 
+    The presented refresh token is single-use: it is revoked as part of the
+    exchange, and presenting it again revokes all of the user's tokens.
+    """
+    token = request.refreshToken
     payload = decode_token(token)
 
     if payload.get("type") != "refresh":
@@ -418,26 +569,45 @@ async def refresh_token(request: RefreshTokenRequest):
         )
 
     user_id = payload.get("sub")
-    user_data = users_db.get(user_id)
 
-    if not user_data:
+    # Always read fresh state: this is where clients pick up a new security_version
+    user_cache.invalidate(user_id)
+    user_data = await load_user_state(user_id)
+
+    if not user_data or not user_data["is_active"]:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
 
+    new_refresh_token = create_refresh_token({"sub": user_id})
+    try:
+        rotated = await refresh_token_store.rotate(
+            user_id, token, new_refresh_token, REFRESH_TOKEN_EXPIRE_DAYS
+        )
+    except RefreshTokenReused as e:
+        print(f"Refresh: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token has been revoked"
+        )
+
+    if not rotated:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+
     # Generate new access token
-    access_token = create_access_token({"sub": user_id, "email": user_data["email"]})
+    access_token = create_access_token(user_claims(user_data))
 
-    return {"accessToken": access_token}
+    return {"accessToken": access_token, "refreshToken": new_refresh_token}
 
 
 @app.post("/api/auth/logout")
 async def logout(request: RefreshTokenRequest):
     """Logout user"""
-    token = request.refreshToken
-    if token in refresh_tokens_db:
-        del refresh_tokens_db[token]
+    await refresh_token_store.revoke(request.refreshToken)
 
     return {"message": "Logged out successfully"}
 
@@ -464,33 +634,32 @@ async def send_chat_message(
     try:
         user_id = current_user["id"]
         user_email = current_user.get("email")
+        # New conversations get their id on the first turn
+        conversation_id = request.conversation_id or str(uuid.uuid4())
         print(f"Chat: Processing message for user: {user_id} ({user_email})")
         print(f"Chat: Message: {request.message[:50]}...")
 
-        # Create fresh chat instance for this request
-        # This prevents LeannChat from accumulating cross-request conversation history
-        chat_api = create_chat_instance(user_id, user_email=user_email)
-
-        # Get response from LEANN
-        response = chat_api.ask(request.message, top_k=3)
+        # Run the blocking Memori/LEANN/OpenAI pipeline on the bounded chat
+        # executor so the event loop stays free for other requests
+        response = await chat_executor.run(
+            run_chat_pipeline, user_id, user_email, request.message,
+            conversation_id=conversation_id
+        )
 
         # Format sources
-        sources = []
-        if hasattr(response, 'sources') and response.sources:
-            for idx, source in enumerate(response.sources):
-                sources.append(SourceDocument(
-                    document_id=idx,
-                    text_preview=source.get('text', '')[:200],
-                    metadata=str(source.get('metadata', {})),
-                    relevance_score=source.get('score', 0.0)
-                ))
+        sources = format_sources(response.get('sources')) if isinstance(response, dict) else []
 
         return ChatResponse(
             response=response.get('answer', str(response)) if isinstance(response, dict) else str(response),
             sources=sources,
-            conversation_id=request.conversation_id
+            conversation_id=conversation_id
         )
 
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Chat is busy, please retry: {str(e)}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -498,11 +667,184 @@ async def send_chat_message(
         )
 
 
+@app.post("/api/chat/stream")
+async def stream_chat_message(
+    request: ChatMessageRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Send a chat message and stream the response as Server-Sent Events
+
+    Events: "token" ({"text"}) per generated chunk, then "sources"
+    ({"sources", "conversation_id"}), then "done". Failures are sent as an
+    "error" event ({"detail"}).
+    """
+    user_id = current_user["id"]
+    user_email = current_user.get("email")
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    print(f"Chat stream: Processing message for user: {user_id} ({user_email})")
+    print(f"Chat stream: Message: {request.message[:50]}...")
+
+    async def event_stream():
+        try:
+            async for kind, payload in chat_executor.stream(
+                stream_chat_pipeline, user_id, user_email, request.message,
+                conversation_id=conversation_id
+            ):
+                if kind == "token":
+                    yield sse_event("token", {"text": payload})
+                elif kind == "sources":
+                    yield sse_event("sources", {
+                        "sources": [s.dict() for s in format_sources(payload)],
+                        "conversation_id": conversation_id
+                    })
+                elif kind == "error":
+                    yield sse_event("error", {"detail": payload})
+            yield sse_event("done", {})
+        except ExecutorSaturated as e:
+            yield sse_event("error", {"detail": f"Chat is busy, please retry: {str(e)}"})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Chat error: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable nginx proxy buffering for SSE
+        }
+    )
+
+
 @app.get("/api/chat/history")
-async def get_chat_history(current_user: dict = Depends(get_current_user)):
-    """Get chat history for current user"""
-    # TODO: Implement chat history retrieval from database
-    return {"conversations": []}
+async def get_chat_history(
+    limit: int = CHAT_HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    List the current user's conversations, most recently active first
+
+    Reads the trigger-maintained conversation_summary rows by keyset on
+    (last_at, conversation_id), so a page costs the same however long the
+    user's history is. Pass next_cursor back as cursor for the following page.
+    """
+    check_page_size(limit, CHAT_HISTORY_MAX_PAGE_SIZE)
+    args = [current_user["id"]]
+    keyset = ""
+    if cursor:
+        try:
+            cursor_last_activity, cursor_conversation = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        args += [cursor_last_activity, cursor_conversation]
+        keyset = "AND (last_at, conversation_id) < ($2::timestamptz, $3)"
+    args.append(limit + 1)
+
+    try:
+        conversations = await db.fetch(f"""
+            SELECT
+                conversation_id,
+                title,
+                last_message,
+                turns,
+                started_at,
+                last_at as last_activity
+            FROM conversation_summary
+            WHERE user_id = $1::uuid
+            {keyset}
+            ORDER BY last_at DESC, conversation_id DESC
+            LIMIT ${len(args)}
+        """, *args)
+
+        next_cursor = None
+        if len(conversations) > limit:
+            conversations = conversations[:limit]
+            last = conversations[-1]
+            next_cursor = encode_cursor(last["last_activity"], last["conversation_id"])
+
+        return {"conversations": conversations, "next_cursor": next_cursor}
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve chat history: {str(e)}"
+        )
+
+
+@app.get("/api/chat/conversation/{conversation_id}")
+async def get_conversation(
+    conversation_id: str,
+    limit: int = CHAT_HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a conversation's turns, newest first, keyed on (created_at, chat_id)"""
+    check_page_size(limit, CHAT_HISTORY_MAX_PAGE_SIZE)
+    args = [current_user["id"], conversation_id]
+    keyset = ""
+    if cursor:
+        try:
+            cursor_created_at, cursor_chat_id = decode_cursor(cursor)
+            cursor_chat_id = str(uuid.UUID(cursor_chat_id))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        args += [cursor_created_at, cursor_chat_id]
+        keyset = "AND (created_at, chat_id) < ($3::timestamptz, $4::uuid)"
+    args.append(limit + 1)
+
+    try:
+        turns = await db.fetch(f"""
+            SELECT chat_id, user_input, ai_output, tokens_used, created_at
+            FROM chat_history
+            WHERE user_id = $1::uuid AND conversation_id = $2
+            {keyset}
+            ORDER BY created_at DESC, chat_id DESC
+            LIMIT ${len(args)}
+        """, *args)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve conversation: {str(e)}"
+        )
+
+    if not turns and not cursor:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    next_cursor = None
+    if len(turns) > limit:
+        turns = turns[:limit]
+        next_cursor = encode_cursor(turns[-1]["created_at"], turns[-1]["chat_id"])
+
+    return {"conversation_id": conversation_id, "turns": turns, "next_cursor": next_cursor}
+
+
+async def delete_chat_turns(user_id: str, conversation_id: str = None,
+                            batch_size: int = CHAT_HISTORY_DELETE_BATCH) -> int:
+    """
+    Delete a user's turns (optionally one conversation) in batches
+
+    Short batches keep row locks and the per-row rollup triggers from
+    holding up concurrent chat writes; returns rows deleted.
+    """
+    condition = "AND conversation_id = $3" if conversation_id is not None else ""
+    args = [user_id, batch_size] + ([conversation_id] if conversation_id is not None else [])
+    deleted = 0
+    while True:
+        status_line = await db.execute(f"""
+            DELETE FROM chat_history WHERE chat_id IN (
+                SELECT chat_id FROM chat_history
+                WHERE user_id = $1::uuid {condition}
+                LIMIT $2
+            )
+        """, *args)
+        count = int(status_line.split()[-1])
+        deleted += count
+        if count < batch_size:
+            break
+        # Let other queries in between large batches
+        await asyncio.sleep(0)
+    return deleted
 
 
 @app.delete("/api/chat/conversation/{conversation_id}")
@@ -511,98 +853,140 @@ async def delete_conversation(
     current_user: dict = Depends(get_current_user)
 ):
     """Delete a conversation"""
-    # TODO: Implement conversation deletion
-    return {"message": "Conversation deleted"}
+    try:
+        deleted = await delete_chat_turns(current_user["id"], conversation_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to delete conversation: {str(e)}"
+        )
+
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return {"message": "Conversation deleted", "deleted_turns": deleted}
+
+
+@app.delete("/api/chat/history")
+async def delete_chat_history(current_user: dict = Depends(get_current_user)):
+    """Delete all of the current user's conversations"""
+    try:
+        deleted = await delete_chat_turns(current_user["id"])
+        return {"message": "Chat history deleted", "deleted_turns": deleted}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to delete chat history: {str(e)}"
+        )
 
 
 # Admin Routes
+ROLLUP_WINDOWS_QUERY = """
+    SELECT
+        COALESCE(SUM(value) FILTER (
+            WHERE metric = 'new_users' AND bucket >= date_trunc('hour', NOW() - INTERVAL '7 days')
+        ), 0) as new_users_week,
+        COALESCE(SUM(value) FILTER (
+            WHERE metric = 'new_users' AND bucket >= date_trunc('hour', NOW() - INTERVAL '30 days')
+        ), 0) as new_users_month,
+        COALESCE(SUM(value) FILTER (
+            WHERE metric = 'chats' AND bucket >= date_trunc('hour', NOW() - INTERVAL '24 hours')
+        ), 0) as chats_today,
+        COALESCE(SUM(value) FILTER (
+            WHERE metric = 'chats' AND bucket >= date_trunc('hour', NOW() - INTERVAL '7 days')
+        ), 0) as chats_week
+    FROM stats_hourly
+    WHERE metric IN ('new_users', 'chats')
+      AND bucket >= date_trunc('hour', NOW() - INTERVAL '30 days')
+"""
+
+
 @app.get("/api/admin/stats")
 async def get_admin_stats(admin_user: dict = Depends(get_admin_user)):
-    """Get system statistics (admin only)"""
+    """
+    Get system statistics (admin only)
+
+    Reads the trigger-maintained rollup tables (stats_totals, stats_hourly,
+    user_activity_summary, memory_category_counts), so the cost no longer
+    grows with the number of users, chats or memories. Rolling windows are
+    counted in whole hours.
+    """
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # User stats
-                cur.execute("""
-                    SELECT
-                        COUNT(*) as total_users,
-                        COUNT(*) FILTER (WHERE is_active = true) as active_users,
-                        COUNT(*) FILTER (WHERE is_email_verified = true) as verified_users,
-                        COUNT(*) FILTER (WHERE created_at > NOW() - INTERVAL '7 days') as new_users_week,
-                        COUNT(*) FILTER (WHERE created_at > NOW() - INTERVAL '30 days') as new_users_month
-                    FROM users
-                """)
-                user_stats = cur.fetchone()
-
-                # Chat stats
-                cur.execute("""
-                    SELECT
-                        COUNT(*) as total_conversations,
-                        COUNT(DISTINCT user_id) as users_with_chats,
-                        COUNT(*) FILTER (WHERE created_at > NOW() - INTERVAL '24 hours') as chats_today,
-                        COUNT(*) FILTER (WHERE created_at > NOW() - INTERVAL '7 days') as chats_week,
-                        COALESCE(SUM(tokens_used), 0) as total_tokens
-                    FROM chat_history
-                """)
-                chat_stats = cur.fetchone()
-
-                # Memory stats
-                cur.execute("""
-                    SELECT
-                        COUNT(*) as total_stm,
-                        COUNT(DISTINCT user_id) as users_with_stm,
-                        AVG(importance_score) as avg_importance
-                    FROM short_term_memory
-                """)
-                stm_stats = cur.fetchone()
-
-                cur.execute("""
-                    SELECT
-                        COUNT(*) as total_ltm,
-                        COUNT(DISTINCT user_id) as users_with_ltm,
-                        AVG(importance_score) as avg_importance,
-                        COUNT(*) FILTER (WHERE is_user_context = true) as user_context_count,
-                        COUNT(*) FILTER (WHERE is_preference = true) as preferences_count
-                    FROM long_term_memory
-                """)
-                ltm_stats = cur.fetchone()
-
-                # Top users by activity
-                cur.execute("""
-                    SELECT
-                        u.email,
-                        COUNT(ch.chat_id) as chat_count,
-                        COALESCE(SUM(ch.tokens_used), 0) as tokens_used,
-                        MAX(ch.created_at) as last_activity
-                    FROM users u
-                    LEFT JOIN chat_history ch ON u.id = ch.user_id
-                    GROUP BY u.id, u.email
-                    ORDER BY chat_count DESC
-                    LIMIT 10
-                """)
-                top_users = cur.fetchall()
-
-                # Memory distribution by category
-                cur.execute("""
-                    SELECT
-                        category_primary,
-                        COUNT(*) as count
-                    FROM long_term_memory
-                    GROUP BY category_primary
-                    ORDER BY count DESC
-                    LIMIT 10
-                """)
-                memory_categories = cur.fetchall()
+        totals, windows, top_users, memory_categories = await asyncio.gather(
+            db.fetch("SELECT metric, value, updated_at FROM stats_totals"),
+            db.fetchrow(ROLLUP_WINDOWS_QUERY),
+            db.fetch("""
+            SELECT
+                u.email,
+                s.chat_count,
+                s.tokens_used,
+                s.last_activity
+            FROM user_activity_summary s
+            JOIN users u ON u.id = s.user_id
+            ORDER BY s.chat_count DESC
+            LIMIT 10
+            """),
+            db.fetch("""
+            SELECT
+                category_primary,
+                ltm_count as count
+            FROM memory_category_counts
+            WHERE ltm_count > 0
+            ORDER BY ltm_count DESC
+            LIMIT 10
+            """)
+        )
+
+        values = {row["metric"]: row["value"] for row in totals}
+
+        def count(metric):
+            return int(values.get(metric, 0))
+
+        def average(sum_metric, count_metric):
+            n = count(count_metric)
+            return float(values.get(sum_metric, 0)) / n if n else None
+
+        rebuilt_at = values.get("rebuilt_at")
+        last_updated_at = max((row["updated_at"] for row in totals), default=None)
 
         return {
-            "user_stats": dict(user_stats),
-            "chat_stats": dict(chat_stats),
+            "user_stats": {
+                "total_users": count("users_total"),
+                "active_users": count("users_active"),
+                "verified_users": count("users_verified"),
+                "new_users_week": int(windows["new_users_week"]),
+                "new_users_month": int(windows["new_users_month"])
+            },
+            "chat_stats": {
+                "total_conversations": count("chats_total"),
+                "users_with_chats": count("users_with_chats"),
+                "chats_today": int(windows["chats_today"]),
+                "chats_week": int(windows["chats_week"]),
+                "total_tokens": count("chat_tokens_total")
+            },
             "memory_stats": {
-                "short_term": dict(stm_stats),
-                "long_term": dict(ltm_stats)
+                "short_term": {
+                    "total_stm": count("stm_total"),
+                    "users_with_stm": count("users_with_stm"),
+                    "avg_importance": average("stm_importance_sum", "stm_total")
+                },
+                "long_term": {
+                    "total_ltm": count("ltm_total"),
+                    "users_with_ltm": count("users_with_ltm"),
+                    "avg_importance": average("ltm_importance_sum", "ltm_total"),
+                    "user_context_count": count("ltm_user_context"),
+                    "preferences_count": count("ltm_preferences")
+                }
             },
-            "top_users": [dict(u) for u in top_users],
-            "memory_categories": [dict(c) for c in memory_categories]
+            "top_users": top_users,
+            "memory_categories": memory_categories,
+            # Rollups are updated in the same transaction as the base rows,
+            # so they are current as of the last committed write
+            "freshness": {
+                "source": "rollups",
+                "last_updated_at": last_updated_at,
+                "rebuilt_at": datetime.fromtimestamp(float(rebuilt_at), timezone.utc) if rebuilt_at else None
+            }
         }
 
     except Exception as e:
@@ -612,34 +996,102 @@ async def get_admin_stats(admin_user: dict = Depends(get_admin_user)):
         )
 
 
+@app.post("/api/admin/stats/rebuild")
+async def rebuild_admin_stats(admin_user: dict = Depends(get_admin_user)):
+    """Recompute the stats rollups from the base tables (admin only)"""
+    try:
+        started = time.monotonic()
+        await db.execute("SELECT rebuild_admin_rollups()")
+        return {
+            "success": True,
+            "duration_ms": round((time.monotonic() - started) * 1000, 1)
+        }
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to rebuild stats: {str(e)}"
+        )
+
+
 @app.get("/api/admin/users")
-async def get_all_users(admin_user: dict = Depends(get_admin_user)):
-    """Get all users (admin only)"""
+async def get_all_users(
+    limit: int = ADMIN_USERS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    email: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    is_admin: Optional[bool] = None,
+    is_email_verified: Optional[bool] = None,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """
+    Get users, newest first, one page at a time (admin only)
+
+    Pages are keyed on (created_at, id) rather than OFFSET, so every page
+    is an index range scan. Per-user counts come from user_activity_summary
+    instead of joining the chat and memory tables.
+
+    Args:
+        limit: Page size (1-ADMIN_USERS_MAX_PAGE_SIZE)
+        cursor: next_cursor from the previous page
+        email: Case-insensitive email prefix
+        is_active, is_admin, is_email_verified: Exact-match filters
+    """
+    check_page_size(limit, ADMIN_USERS_MAX_PAGE_SIZE)
+
+    conditions = []
+    args = []
+
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+            cursor_id = str(uuid.UUID(cursor_id))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        args += [cursor_created_at, cursor_id]
+        conditions.append(f"(u.created_at, u.id) < (${len(args) - 1}::timestamptz, ${len(args)}::uuid)")
+
+    if email:
+        prefix = email.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        args.append(prefix + "%")
+        conditions.append(f"lower(u.email::text) LIKE ${len(args)}")
+
+    for column, value in (("is_active", is_active), ("is_admin", is_admin),
+                          ("is_email_verified", is_email_verified)):
+        if value is not None:
+            args.append(value)
+            conditions.append(f"u.{column} = ${len(args)}")
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # One extra row tells whether there is a next page
+    args.append(limit + 1)
+
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT
-                        u.id,
-                        u.email,
-                        u.is_active,
-                        u.is_email_verified,
-                        u.is_admin,
-                        u.created_at,
-                        u.last_login_at,
-                        COUNT(DISTINCT ch.chat_id) as chat_count,
-                        COUNT(DISTINCT ltm.memory_id) as ltm_count,
-                        COUNT(DISTINCT stm.memory_id) as stm_count
-                    FROM users u
-                    LEFT JOIN chat_history ch ON u.id = ch.user_id
-                    LEFT JOIN long_term_memory ltm ON u.id = ltm.user_id
-                    LEFT JOIN short_term_memory stm ON u.id = stm.user_id
-                    GROUP BY u.id, u.email, u.is_active, u.is_email_verified, u.is_admin, u.created_at, u.last_login_at
-                    ORDER BY u.created_at DESC
-                """)
-                users = cur.fetchall()
-
-        return {"users": [dict(u) for u in users]}
+        users = await db.fetch(f"""
+            SELECT
+                u.id,
+                u.email,
+                u.is_active,
+                u.is_email_verified,
+                u.is_admin,
+                u.created_at,
+                u.last_login_at,
+                COALESCE(s.chat_count, 0) as chat_count,
+                COALESCE(s.ltm_count, 0) as ltm_count,
+                COALESCE(s.stm_count, 0) as stm_count
+            FROM users u
+            LEFT JOIN user_activity_summary s ON s.user_id = u.id
+            {where}
+            ORDER BY u.created_at DESC, u.id DESC
+            LIMIT ${len(args)}
+        """, *args)
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1]["created_at"], users[-1]["id"])
+
+        return {"users": users, "next_cursor": next_cursor}
 
     except Exception as e:
         raise HTTPException(
@@ -652,55 +1104,49 @@ async def get_all_users(admin_user: dict = Depends(get_admin_user)):
 async def get_user_details(user_id: str, admin_user: dict = Depends(get_admin_user)):
     """Get detailed user information (admin only)"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # User info
-                cur.execute("""
-                    SELECT id, email, is_active, is_email_verified, is_admin, created_at, last_login_at
-                    FROM users WHERE id = %s
-                """, (user_id,))
-                user = cur.fetchone()
-
-                if not user:
-                    raise HTTPException(status_code=404, detail="User not found")
-
-                # Recent chats
-                cur.execute("""
-                    SELECT chat_id, LEFT(user_input, 100) as user_input_preview,
-                           LEFT(ai_output, 100) as ai_output_preview,
-                           tokens_used, created_at
-                    FROM chat_history
-                    WHERE user_id = %s
-                    ORDER BY created_at DESC
-                    LIMIT 20
-                """, (user_id,))
-                recent_chats = cur.fetchall()
-
-                # Memory counts
-                cur.execute("""
-                    SELECT
-                        COUNT(*) as ltm_count,
-                        AVG(importance_score) as avg_importance
-                    FROM long_term_memory
-                    WHERE user_id = %s
-                """, (user_id,))
-                ltm_info = cur.fetchone()
-
-                cur.execute("""
-                    SELECT
-                        COUNT(*) as stm_count,
-                        AVG(importance_score) as avg_importance
-                    FROM short_term_memory
-                    WHERE user_id = %s
-                """, (user_id,))
-                stm_info = cur.fetchone()
+        # User info
+        user = await db.fetchrow("""
+            SELECT id, email, is_active, is_email_verified, is_admin, created_at, last_login_at
+            FROM users WHERE id = $1
+        """, user_id)
+
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        recent_chats, ltm_info, stm_info = await asyncio.gather(
+            # Recent chats
+            db.fetch("""
+                SELECT chat_id, LEFT(user_input, 100) as user_input_preview,
+                       LEFT(ai_output, 100) as ai_output_preview,
+                       tokens_used, created_at
+                FROM chat_history
+                WHERE user_id = $1
+                ORDER BY created_at DESC
+                LIMIT 20
+            """, user_id),
+            # Memory counts
+            db.fetchrow("""
+                SELECT
+                    COUNT(*) as ltm_count,
+                    AVG(importance_score) as avg_importance
+                FROM long_term_memory
+                WHERE user_id = $1
+            """, user_id),
+            db.fetchrow("""
+                SELECT
+                    COUNT(*) as stm_count,
+                    AVG(importance_score) as avg_importance
+                FROM short_term_memory
+                WHERE user_id = $1
+            """, user_id)
+        )
 
         return {
-            "user": dict(user),
-            "recent_chats": [dict(c) for c in recent_chats],
+            "user": user,
+            "recent_chats": recent_chats,
             "memory_info": {
-                "long_term": dict(ltm_info),
-                "short_term": dict(stm_info)
+                "long_term": ltm_info,
+                "short_term": stm_info
             }
         }
 
@@ -713,13 +1159,93 @@ async def get_user_details(user_id: str, admin_user: dict = Depends(get_admin_us
         )
 
 
+class AdminUserUpdateRequest(BaseModel):
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+
+
+@app.patch("/api/admin/user/{user_id}")
+async def update_user(
+    user_id: str,
+    request: AdminUserUpdateRequest,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """
+    Activate/deactivate a user or change admin rights (admin only)
+
+    Bumps the user's security_version, so access tokens issued before the
+    change are rejected; deactivation also revokes refresh tokens.
+    """
+    if request.is_active is None and request.is_admin is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Nothing to update"
+        )
+
+    if user_id == admin_user["id"] and False in (request.is_active, request.is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Admins cannot deactivate or demote themselves"
+        )
+
+    try:
+        async with db.transaction() as conn:
+            user = await conn.fetchrow("""
+                UPDATE users SET
+                    is_active = COALESCE($2, is_active),
+                    is_admin = COALESCE($3, is_admin),
+                    security_version = security_version + 1,
+                    updated_at = now()
+                WHERE id = $1
+                RETURNING id, email, is_active, is_email_verified, is_admin, security_version
+            """, user_id, request.is_active, request.is_admin)
+
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+
+            if not user["is_active"]:
+                await refresh_token_store.revoke_all(user_id, conn=conn)
+
+        user_cache.invalidate(user_id)
+        print(f"Admin: {admin_user['email']} updated user {user_id}: "
+              f"is_active={user['is_active']}, is_admin={user['is_admin']}")
+        return {"user": dict(user)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to update user: {str(e)}"
+        )
+
+
+@app.get("/api/admin/metrics")
+async def get_chat_metrics(admin_user: dict = Depends(get_admin_user)):
+    """Get chat pipeline runtime metrics (admin only)"""
+    engine = loaded_retrieval_engine()
+    return {
+        "chat_executor": chat_executor.stats(),
+        "memori_pool": get_memori_pool().stats(),
+        "memori_writer": get_memori_writer().stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "embedding_cache": engine.embedding_cache.stats() if engine is not None else None,
+        "db_pool": db.stats(),
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "refresh_tokens": refresh_token_store.stats(),
+        "usage_cost": get_usage_cost_client().stats(),
+        "usage_store": usage_store.stats(),
+        "index_jobs": index_jobs.stats(),
+        "index_watcher": index_watcher.stats()
+    }
+
+
 # Document Management Routes
 from fastapi import UploadFile, File as FastAPIFile
 import shutil
-import subprocess
 
 DOCUMENTS_DIR = Path(__file__).resolve().parents[1] / "data"
-LEANN_CONVERTER_PATH = Path(__file__).resolve().parents[1] / "src" / "utils" / "leann_converter.py"
 
 @app.get("/api/documents/list")
 async def list_documents(admin_user: dict = Depends(get_admin_user)):
@@ -752,9 +1278,18 @@ async def list_documents(admin_user: dict = Depends(get_admin_user)):
 @app.post("/api/documents/upload")
 async def upload_document(
     file: UploadFile = FastAPIFile(...),
+    index: bool = True,
     admin_user: dict = Depends(get_admin_user)
 ):
-    """Upload a PDF document to /data directory (admin only)"""
+    """
+    Upload a PDF document to /data directory (admin only)
+
+    With index=true (default) the new document is chunked, embedded and
+    appended to the live index; "index_status" is "rebuild_required" when
+    that isn't possible (replaced file, index without a manifest). While a
+    full rebuild holds the index the upload is not queued behind it: the
+    file is saved and 202 is returned with "rebuild_in_progress".
+    """
     try:
         if not file.filename.endswith('.pdf'):
             raise HTTPException(
@@ -771,12 +1306,37 @@ async def upload_document(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        return {
+        response = {
             "success": True,
             "filename": file.filename,
             "file_path": str(file_path),
             "message": f"Document '{file.filename}' uploaded successfully"
         }
+        if not index:
+            return response
+
+        try:
+            result = await asyncio.to_thread(add_document, file_path)
+        except Exception as e:
+            print(f"[Upload] Incremental indexing of '{file.filename}' failed: {e}")
+            result = {"status": "rebuild_required", "chunks_added": 0,
+                      "reason": f"Incremental indexing failed: {e}"}
+
+        if result["status"] == "indexed":
+            # Switch this process over now; other workers pick it up on their next poll
+            await index_watcher.check()
+            response["message"] = (
+                f"Document '{file.filename}' uploaded and indexed ({result['chunks_added']} passages)"
+            )
+        response["index_status"] = result["status"]
+        response["chunks_added"] = result["chunks_added"]
+        if "version" in result:
+            response["index_version"] = result["version"]
+        if "reason" in result:
+            response["index_reason"] = result["reason"]
+        if result["status"] == "rebuild_in_progress":
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=response)
+        return response
 
     except HTTPException:
         raise
@@ -824,11 +1384,16 @@ async def delete_document(
         )
 
 
-@app.post("/api/documents/rebuild-index")
+@app.post("/api/documents/rebuild-index", status_code=status.HTTP_202_ACCEPTED)
 async def rebuild_index(admin_user: dict = Depends(get_admin_user)):
-    """Rebuild LEANN index using leann_converter.py (admin only)"""
+    """
+    Start a background rebuild of the LEANN index (admin only)
+
+    Returns the job to poll at /api/documents/jobs/{id}. If a build is
+    already running, that job is returned instead of starting another.
+    """
     try:
-        if not LEANN_CONVERTER_PATH.exists():
+        if not index_jobs.converter_path.exists():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="leann_converter.py not found at /utils/leann_converter.py"
@@ -844,35 +1409,20 @@ async def rebuild_index(admin_user: dict = Depends(get_admin_user)):
                 detail="No PDF documents found in /data directory"
             )
 
-        # Run leann_converter.py
-        result = subprocess.run(
-            ["python3", str(LEANN_CONVERTER_PATH)],
-            cwd=str(DOCUMENTS_DIR.parent),
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
-
-        if result.returncode != 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Index rebuild failed: {result.stderr}"
-            )
+        job, created = await index_jobs.start(on_success=index_watcher.check, documents=pdf_count)
 
         return {
             "success": True,
-            "message": f"Index rebuilt successfully with {pdf_count} documents",
-            "documents_indexed": pdf_count,
-            "output": result.stdout
+            "message": (
+                f"Index rebuild started for {pdf_count} documents" if created
+                else "An index rebuild is already running"
+            ),
+            "already_running": not created,
+            "job": job
         }
 
     except HTTPException:
         raise
-    except subprocess.TimeoutExpired:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Index rebuild timed out after 5 minutes"
-        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -880,48 +1430,39 @@ async def rebuild_index(admin_user: dict = Depends(get_admin_user)):
         )
 
 
-# ============================================================================
-# OpenAI Usage and Cost Tracking Endpoints (Admin Only)
-# ============================================================================
+@app.get("/api/documents/jobs")
+async def list_index_jobs(admin_user: dict = Depends(get_admin_user)):
+    """Recent index build jobs, newest first (admin only)"""
+    return {"jobs": index_jobs.list()}
 
-def fetch_all_pages(url, headers, params=None):
-    """Fetch all pages from a paginated OpenAI API endpoint."""
-    all_data = []
-    next_page = None
-    while True:
-        req_params = dict(params or {})
-        if next_page:
-            req_params["page"] = next_page
-        resp = requests.get(url, headers=headers, params=req_params)
-        resp.raise_for_status()
-        data = resp.json()
-        all_data.extend(data.get("data", []))
-        if not data.get("has_more"):
-            break
-        next_page = data.get("next_page")
-    return all_data
 
+@app.get("/api/documents/jobs/{job_id}")
+async def get_index_job(job_id: str, output: bool = False, admin_user: dict = Depends(get_admin_user)):
+    """Status, stage and progress counts of an index build job (admin only)"""
+    job = index_jobs.get(job_id, output=output)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Index job '{job_id}' not found"
+        )
+    return job
 
-def aggregate_usage(usage_data):
-    """Aggregate token usage from OpenAI API response."""
-    total_input = 0
-    total_output = 0
-    for bucket in usage_data:
-        for result in bucket.get("results", []):
-            total_input += result.get("input_tokens", 0)
-            total_output += result.get("output_tokens", 0)
-    return total_input, total_output
 
+@app.post("/api/documents/jobs/{job_id}/cancel")
+async def cancel_index_job(job_id: str, admin_user: dict = Depends(get_admin_user)):
+    """Cancel a running index build; the served index is left unchanged (admin only)"""
+    job = await index_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Index job '{job_id}' not found"
+        )
+    return job
 
-def aggregate_costs(cost_data):
-    """Aggregate costs from OpenAI API response."""
-    total_cost = 0.0
-    for bucket in cost_data:
-        for result in bucket.get("results", []):
-            amount = result.get("amount", {}).get("value", 0.0)
-            total_cost += amount
-    return total_cost
 
+# ============================================================================
+# OpenAI Usage and Cost Tracking Endpoints (Admin Only)
+# ============================================================================
 
 class UsageCostResponse(BaseModel):
     """Response model for usage and cost data"""
@@ -932,6 +1473,10 @@ class UsageCostResponse(BaseModel):
     period_days: int
     start_date: str
     end_date: str
+    by_day: List[dict] = []
+    by_model: List[dict] = []
+    synced_at: Optional[datetime] = None
+    stale: bool = False
 
 
 @app.get("/api/admin/usage-cost", response_model=UsageCostResponse)
@@ -942,78 +1487,52 @@ async def get_usage_cost(
     """
     Get OpenAI API usage and cost data for the specified period (admin only)
 
+    Answered from the local daily tables; only days missing from them (or
+    recent days that may still change) are fetched from OpenAI first. If
+    that fetch fails the stored figures are returned with stale=true.
+
     Args:
-        days: Number of days to look back (default: 7)
+        days: Number of calendar days (UTC) to look back, including today (default: 7)
     """
-    try:
-        # Get API key from environment
-        api_key = os.getenv("ADMIN_KEY")
-        if not api_key:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="ADMIN_KEY not configured in environment"
-            )
-
-        org_id = os.getenv("ORG_ID")
-
-        # Setup headers
-        headers = {
-            "Authorization": f"Bearer {api_key}"
-        }
-        if org_id:
-            headers["OpenAI-Organization"] = org_id
-
-        # Calculate time range
-        end = datetime.utcnow()
-        start = end - timedelta(days=days)
+    if not 1 <= days <= USAGE_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"days must be between 1 and {USAGE_MAX_DAYS}"
+        )
 
-        base_url = "https://api.openai.com/v1"
-        usage_url = f"{base_url}/organization/usage/completions"
-        costs_url = f"{base_url}/organization/costs"
+    if not get_usage_cost_client().api_key:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="ADMIN_KEY not configured in environment"
+        )
 
-        params = {
-            "start_time": int(start.timestamp()),
-            "end_time": int(end.timestamp()),
-            "interval": "1d"
-        }
+    end_day = datetime.now(timezone.utc).date()
+    start_day = end_day - timedelta(days=days - 1)
 
-        # Fetch usage data
-        total_input_tokens = 0
-        total_output_tokens = 0
-        try:
-            print(f"Fetching usage data from: {usage_url}")
-            usage_data = fetch_all_pages(usage_url, headers, params)
-            total_input_tokens, total_output_tokens = aggregate_usage(usage_data)
-            print(f"Successfully fetched usage data: {total_input_tokens} input, {total_output_tokens} output")
-        except Exception as e:
-            print(f"Error fetching usage data: {e}")
-            import traceback
-            traceback.print_exc()
+    stale = False
+    try:
+        await usage_store.sync(start_day, end_day)
+    except Exception as e:
+        print(f"Error syncing usage/cost data: {e}")
+        stale = True
 
-        # Fetch cost data
-        total_cost_usd = 0.0
-        try:
-            print(f"Fetching cost data from: {costs_url}")
-            costs_data = fetch_all_pages(costs_url, headers, params)
-            total_cost_usd = aggregate_costs(costs_data)
-            print(f"Successfully fetched cost data: ${total_cost_usd}")
-        except Exception as e:
-            print(f"Error fetching costs data: {e}")
-            import traceback
-            traceback.print_exc()
+    try:
+        report = await usage_store.report(start_day, end_day)
 
         return UsageCostResponse(
-            total_input_tokens=total_input_tokens,
-            total_output_tokens=total_output_tokens,
-            total_tokens=total_input_tokens + total_output_tokens,
-            total_cost_usd=total_cost_usd,
+            total_input_tokens=report["total_input_tokens"],
+            total_output_tokens=report["total_output_tokens"],
+            total_tokens=report["total_input_tokens"] + report["total_output_tokens"],
+            total_cost_usd=report["total_cost_usd"],
             period_days=days,
-            start_date=start.strftime("%Y-%m-%d"),
-            end_date=end.strftime("%Y-%m-%d")
+            start_date=start_day.isoformat(),
+            end_date=end_day.isoformat(),
+            by_day=report["by_day"],
+            by_model=report["by_model"],
+            synced_at=report["synced_at"],
+            stale=stale
         )
 
-    except HTTPException:
-        raise
     except Exception as e:
         print(f"Unexpected error in get_usage_cost: {e}")
         import traceback
@@ -0,0 +1,135 @@
+"""
+bcrypt hashing and verification on a dedicated process pool
+bcrypt is deliberately CPU-expensive (tens of ms per call at the default
+cost); running it inline in async handlers stalls every other request on
+the worker, so signup/login hand it to a small pool of processes instead
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    """Hash a password using bcrypt"""
+    # Bcrypt has a max password length of 72 bytes
+    password_bytes = password.encode('utf-8')
+    if len(password_bytes) > 72:
+        password_bytes = password_bytes[:72]
+
+    salt = bcrypt.gensalt(rounds=rounds)
+    hashed = bcrypt.hashpw(password_bytes, salt)
+    return hashed.decode('utf-8')
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against a bcrypt hash"""
+    # Truncate password to match what was hashed
+    password_bytes = plain_password.encode('utf-8')
+    if len(password_bytes) > 72:
+        password_bytes = password_bytes[:72]
+
+    hashed_bytes = hashed_password.encode('utf-8')
+    return bcrypt.checkpw(password_bytes, hashed_bytes)
+
+
+class PasswordHasherSaturated(Exception):
+    """Raised when max_pending hash/verify jobs are already queued"""
+
+
+class PasswordHasher:
+    """
+    Bounded process pool for bcrypt work
+
+    The cost factor only applies to new hashes; verification uses the cost
+    stored in each hash, so BCRYPT_ROUNDS can be changed without
+    invalidating existing passwords.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, rounds: int = BCRYPT_ROUNDS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = max(1, workers)
+        self.rounds = rounds
+        self.max_pending = max(self.workers, max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: the server process runs threads (chat executor, Memori), fork isn't safe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherSaturated(
+                f"Password hasher saturated ({self._pending}/{self.max_pending} jobs pending)"
+            )
+        self._pending += 1
+        self.submitted += 1
+        started = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+            elapsed = (time.monotonic() - started) * 1000
+            self._total_ms += elapsed
+            self._max_ms = max(self._max_ms, elapsed)
+
+    async def hash(self, password: str) -> str:
+        """bcrypt-hash a password at the configured cost"""
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Check a password against a bcrypt hash"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def start(self):
+        """Spawn the worker processes ahead of the first login"""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(time.time)
+
+    def shutdown(self, wait: bool = True):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def stats(self) -> dict:
+        """Pool size, cost factor and latency counters (including queue wait)"""
+        finished = self.submitted - self._pending
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "avg_ms": self._total_ms / finished if finished else 0.0,
+            "max_ms": self._max_ms,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,176 @@
+"""
+Database-backed refresh tokens
+Tokens are stored as HMAC-SHA256 digests under a unique index, so a refresh
+or logout is one indexed lookup instead of bcrypt-checking every row.
+Every refresh rotates the token; presenting an already rotated token
+revokes all of the user's tokens (it was probably stolen).
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+from datetime import datetime, timedelta, timezone
+
+from database import Database, db
+
+
+REFRESH_TOKEN_HMAC_KEY = (
+    os.getenv("REFRESH_TOKEN_HMAC_KEY")
+    or os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
+)
+REFRESH_TOKEN_PURGE_INTERVAL = float(os.getenv("REFRESH_TOKEN_PURGE_INTERVAL", "3600"))
+REFRESH_TOKEN_PURGE_BATCH = int(os.getenv("REFRESH_TOKEN_PURGE_BATCH", "1000"))
+# Rotated/revoked rows are kept this long so reuse of an old token can be detected
+REFRESH_TOKEN_REVOKED_RETENTION_DAYS = int(os.getenv("REFRESH_TOKEN_REVOKED_RETENTION_DAYS", "1"))
+
+
+class RefreshTokenReused(Exception):
+    """Raised when a rotated or revoked refresh token is presented again"""
+
+
+def refresh_token_digest(token: str) -> str:
+    """Keyed SHA-256 digest of a refresh token (what is stored in token_hash)"""
+    return hmac.new(
+        REFRESH_TOKEN_HMAC_KEY.encode("utf-8"),
+        token.encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()
+
+
+class RefreshTokenStore:
+    """Issue, rotate, revoke and purge rows in refresh_tokens"""
+
+    def __init__(self, database: Database):
+        self.db = database
+        self._purge_task = None
+        self.purged = 0
+        self.last_purge_at = None
+
+    async def store(self, user_id, token: str, expires_days: int, conn=None):
+        """Persist a newly issued refresh token"""
+        query = """
+            INSERT INTO refresh_tokens (user_id, token_hash, expires_at)
+            VALUES ($1::uuid, $2, $3)
+        """
+        args = (str(user_id), refresh_token_digest(token),
+                datetime.now(timezone.utc) + timedelta(days=expires_days))
+        if conn is not None:
+            await conn.execute(query, *args)
+        else:
+            await self.db.execute(query, *args)
+
+    async def rotate(self, user_id: str, token: str, new_token: str, expires_days: int):
+        """
+        Atomically consume `token` and store `new_token` in its place
+
+        Returns:
+            False if the token is unknown or expired
+
+        Raises:
+            RefreshTokenReused: token was already rotated or revoked; all of
+                the user's refresh tokens have been revoked
+        """
+        digest = refresh_token_digest(token)
+        reused = False
+        async with self.db.transaction() as conn:
+            consumed = await conn.fetchval("""
+                UPDATE refresh_tokens SET revoked = true, last_used_at = now()
+                WHERE token_hash = $1 AND user_id = $2::uuid
+                  AND revoked = false AND expires_at > now()
+                RETURNING id
+            """, digest, user_id)
+
+            if consumed is None:
+                reused = await conn.fetchval("""
+                    SELECT revoked FROM refresh_tokens
+                    WHERE token_hash = $1 AND user_id = $2::uuid
+                """, digest, user_id)
+                if not reused:
+                    return False
+                await self.revoke_all(user_id, conn=conn)
+            else:
+                await self.store(user_id, new_token, expires_days, conn=conn)
+
+        # Raised only after the mass revoke has committed; raising inside the
+        # transaction would roll it back and leave the other tokens valid
+        if reused:
+            raise RefreshTokenReused(f"Refresh token reuse detected for user {user_id}")
+        return True
+
+    async def revoke(self, token: str) -> bool:
+        """Revoke one token (logout); returns False if it was unknown or already revoked"""
+        status = await self.db.execute("""
+            UPDATE refresh_tokens SET revoked = true, last_used_at = now()
+            WHERE token_hash = $1 AND revoked = false
+        """, refresh_token_digest(token))
+        return status != "UPDATE 0"
+
+    async def revoke_all(self, user_id: str, conn=None):
+        """Revoke every active token of a user"""
+        # last_used_at starts the revoked-row retention clock (see purge)
+        query = """
+            UPDATE refresh_tokens SET revoked = true, last_used_at = now()
+            WHERE user_id = $1::uuid AND revoked = false
+        """
+        if conn is not None:
+            await conn.execute(query, user_id)
+        else:
+            await self.db.execute(query, user_id)
+
+    async def purge(self, batch_size: int = REFRESH_TOKEN_PURGE_BATCH) -> int:
+        """Delete expired rows and old revoked rows in batches; returns rows deleted"""
+        deleted = 0
+        while True:
+            status = await self.db.execute("""
+                DELETE FROM refresh_tokens WHERE id IN (
+                    SELECT id FROM refresh_tokens
+                    WHERE expires_at < now()
+                       OR (revoked AND COALESCE(last_used_at, issued_at) < now() - make_interval(days => $2))
+                    LIMIT $1
+                )
+            """, batch_size, REFRESH_TOKEN_REVOKED_RETENTION_DAYS)
+            count = int(status.split()[-1])
+            deleted += count
+            if count < batch_size:
+                break
+            # Let other queries in between large batches
+            await asyncio.sleep(0)
+        self.purged += deleted
+        self.last_purge_at = datetime.now(timezone.utc)
+        return deleted
+
+    async def _purge_loop(self, interval: float):
+        while True:
+            try:
+                deleted = await self.purge()
+                if deleted:
+                    print(f"[RefreshTokens] Purged {deleted} expired/revoked tokens")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[RefreshTokens] Purge failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_purge_job(self, interval: float = REFRESH_TOKEN_PURGE_INTERVAL):
+        """Run purge() every `interval` seconds on the event loop"""
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.create_task(self._purge_loop(interval))
+
+    async def stop_purge_job(self):
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            try:
+                await self._purge_task
+            except asyncio.CancelledError:
+                pass
+            self._purge_task = None
+
+    def stats(self) -> dict:
+        return {
+            "purge_job_running": self._purge_task is not None and not self._purge_task.done(),
+            "purged": self.purged,
+            "last_purge_at": self.last_purge_at.isoformat() if self.last_purge_at else None,
+        }
+
+
+refresh_token_store = RefreshTokenStore(db)
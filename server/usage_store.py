@@ -0,0 +1,250 @@
+"""
+Local daily store of OpenAI usage and cost
+Daily buckets (per model for tokens, per line item for cost) are kept in
+Postgres and synced incrementally: only days that were never synced, or
+are recent enough that OpenAI may still revise them, are fetched again.
+Dashboard windows are then answered with indexed range queries.
+"""
+import asyncio
+import os
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from decimal import Decimal
+
+from database import Database, db
+from utils.usage_cost import COSTS_PATH, USAGE_PATH, UsageCostClient, get_usage_cost_client
+
+
+USAGE_SYNC_INTERVAL = float(os.getenv("USAGE_SYNC_INTERVAL", "3600"))
+USAGE_SYNC_LOOKBACK_DAYS = int(os.getenv("USAGE_SYNC_LOOKBACK_DAYS", "30"))
+# A day's figures are treated as final this long after the day ends
+USAGE_FINAL_AFTER_HOURS = float(os.getenv("USAGE_FINAL_AFTER_HOURS", "48"))
+# Non-final days synced longer ago than this are refetched before a query
+USAGE_SYNC_MAX_AGE = float(os.getenv("USAGE_SYNC_MAX_AGE", "300"))
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+def day_range(first: date, last: date) -> list:
+    """Every day from first to last, inclusive"""
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def contiguous_ranges(days: list) -> list:
+    """Group sorted days into (first, last) runs of consecutive days"""
+    ranges = []
+    for day in days:
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(r) for r in ranges]
+
+
+class UsageCostStore:
+    """Sync and query the openai_usage_daily / openai_cost_daily tables"""
+
+    def __init__(self, database: Database, client: UsageCostClient = None,
+                 final_after_hours: float = USAGE_FINAL_AFTER_HOURS,
+                 max_age: float = USAGE_SYNC_MAX_AGE):
+        self.db = database
+        self._client = client
+        self.final_after = timedelta(hours=final_after_hours)
+        self.max_age = timedelta(seconds=max_age)
+        self._lock = asyncio.Lock()
+        self._sync_task = None
+        self.syncs = 0
+        self.synced_days = 0
+        self.sync_errors = 0
+        self.last_sync_at = None
+
+    @property
+    def client(self) -> UsageCostClient:
+        return self._client or get_usage_cost_client()
+
+    async def stale_days(self, first: date, last: date) -> list:
+        """Days in [first, last] that are unsynced, or non-final and older than max_age"""
+        rows = await self.db.fetch("""
+            SELECT day, final, synced_at FROM openai_usage_sync
+            WHERE day BETWEEN $1 AND $2
+        """, first, last)
+        now = datetime.now(timezone.utc)
+        fresh = {
+            row["day"] for row in rows
+            if row["final"] or now - row["synced_at"] <= self.max_age
+        }
+        return [day for day in day_range(first, last) if day not in fresh]
+
+    async def sync(self, first: date = None, last: date = None) -> int:
+        """
+        Fetch the stale days of [first, last] (default: the lookback window)
+
+        Returns:
+            Number of days fetched
+        """
+        last = last or utc_today()
+        first = first or last - timedelta(days=USAGE_SYNC_LOOKBACK_DAYS - 1)
+        # One sync at a time; a caller that waited usually finds nothing left to do
+        async with self._lock:
+            days = await self.stale_days(first, last)
+            try:
+                for range_first, range_last in contiguous_ranges(days):
+                    await self._sync_range(range_first, range_last)
+            except Exception:
+                self.sync_errors += 1
+                raise
+            self.syncs += 1
+            self.synced_days += len(days)
+            self.last_sync_at = datetime.now(timezone.utc)
+            return len(days)
+
+    async def _sync_range(self, first: date, last: date):
+        params = {
+            "start_time": int(day_start(first).timestamp()),
+            "end_time": int(day_start(last + timedelta(days=1)).timestamp()),
+            "bucket_width": "1d",
+            "limit": 31
+        }
+        usage_data, costs_data = await asyncio.gather(
+            self.client.fetch_all_pages(USAGE_PATH, dict(params, group_by="model")),
+            self.client.fetch_all_pages(COSTS_PATH, dict(params, group_by="line_item"))
+        )
+
+        usage = {}
+        for bucket in usage_data:
+            day = datetime.fromtimestamp(bucket["start_time"], timezone.utc).date()
+            for result in bucket.get("results", []):
+                totals = usage.setdefault((day, result.get("model") or ""), [0, 0, 0])
+                totals[0] += result.get("input_tokens", 0)
+                totals[1] += result.get("output_tokens", 0)
+                totals[2] += result.get("num_model_requests", 0)
+
+        costs = {}
+        for bucket in costs_data:
+            day = datetime.fromtimestamp(bucket["start_time"], timezone.utc).date()
+            for result in bucket.get("results", []):
+                key = (day, result.get("line_item") or "")
+                amount = Decimal(str(result.get("amount", {}).get("value", 0.0)))
+                costs[key] = costs.get(key, Decimal(0)) + amount
+
+        now = datetime.now(timezone.utc)
+        async with self.db.transaction() as conn:
+            await conn.execute("DELETE FROM openai_usage_daily WHERE day BETWEEN $1 AND $2", first, last)
+            await conn.execute("DELETE FROM openai_cost_daily WHERE day BETWEEN $1 AND $2", first, last)
+            await conn.executemany("""
+                INSERT INTO openai_usage_daily (day, model, input_tokens, output_tokens, requests)
+                VALUES ($1, $2, $3, $4, $5)
+            """, [(day, model, *totals) for (day, model), totals in usage.items()])
+            await conn.executemany("""
+                INSERT INTO openai_cost_daily (day, line_item, cost_usd)
+                VALUES ($1, $2, $3)
+            """, [(day, line_item, amount) for (day, line_item), amount in costs.items()])
+            await conn.executemany("""
+                INSERT INTO openai_usage_sync (day, synced_at, final) VALUES ($1, $2, $3)
+                ON CONFLICT (day) DO UPDATE SET synced_at = EXCLUDED.synced_at, final = EXCLUDED.final
+            """, [
+                (day, now, day_start(day + timedelta(days=1)) + self.final_after <= now)
+                for day in day_range(first, last)
+            ])
+        print(f"[UsageStore] Synced {first} to {last}: "
+              f"{len(usage)} usage rows, {len(costs)} cost rows")
+
+    async def report(self, first: date, last: date) -> dict:
+        """Totals plus per-day and per-model breakdowns for [first, last]"""
+        usage_by_day, usage_by_model, cost_by_day, synced_at = await asyncio.gather(
+            self.db.fetch("""
+                SELECT day, SUM(input_tokens) as input_tokens, SUM(output_tokens) as output_tokens
+                FROM openai_usage_daily
+                WHERE day BETWEEN $1 AND $2
+                GROUP BY day
+            """, first, last),
+            self.db.fetch("""
+                SELECT
+                    model,
+                    SUM(input_tokens) as input_tokens,
+                    SUM(output_tokens) as output_tokens,
+                    SUM(requests) as requests
+                FROM openai_usage_daily
+                WHERE day BETWEEN $1 AND $2
+                GROUP BY model
+                ORDER BY SUM(input_tokens + output_tokens) DESC
+            """, first, last),
+            self.db.fetch("""
+                SELECT day, SUM(cost_usd) as cost_usd
+                FROM openai_cost_daily
+                WHERE day BETWEEN $1 AND $2
+                GROUP BY day
+            """, first, last),
+            self.db.fetchval("""
+                SELECT MIN(synced_at) FROM openai_usage_sync WHERE day BETWEEN $1 AND $2
+            """, first, last)
+        )
+
+        by_day = {
+            day: {"day": day.isoformat(), "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+            for day in day_range(first, last)
+        }
+        for row in usage_by_day:
+            by_day[row["day"]]["input_tokens"] = int(row["input_tokens"])
+            by_day[row["day"]]["output_tokens"] = int(row["output_tokens"])
+        for row in cost_by_day:
+            by_day[row["day"]]["cost_usd"] = float(row["cost_usd"])
+
+        days = list(by_day.values())
+        return {
+            "total_input_tokens": sum(d["input_tokens"] for d in days),
+            "total_output_tokens": sum(d["output_tokens"] for d in days),
+            "total_cost_usd": sum(d["cost_usd"] for d in days),
+            "by_day": days,
+            "by_model": [
+                {
+                    "model": row["model"],
+                    "input_tokens": int(row["input_tokens"]),
+                    "output_tokens": int(row["output_tokens"]),
+                    "requests": int(row["requests"])
+                }
+                for row in usage_by_model
+            ],
+            "synced_at": synced_at,
+        }
+
+    async def _sync_loop(self, interval: float):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[UsageStore] Sync failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_sync_job(self, interval: float = USAGE_SYNC_INTERVAL):
+        """Run sync() every `interval` seconds on the event loop"""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_loop(interval))
+
+    async def stop_sync_job(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+
+    def stats(self) -> dict:
+        return {
+            "sync_job_running": self._sync_task is not None and not self._sync_task.done(),
+            "syncs": self.syncs,
+            "synced_days": self.synced_days,
+            "sync_errors": self.sync_errors,
+            "last_sync_at": self.last_sync_at.isoformat() if self.last_sync_at else None,
+        }
+
+
+usage_store = UsageCostStore(db)
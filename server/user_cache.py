@@ -0,0 +1,72 @@
+"""
+Short-lived cache of per-user auth state
+Lets get_current_user check a token's security_version (its act/adm claims
+are trusted while that matches) without a users query on every
+authenticated request. Entries expire after
+AUTH_USER_CACHE_TTL seconds, which bounds how long a change made through
+another server process can go unnoticed; changes made through this
+process invalidate the entry immediately.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+
+
+class UserStateCache:
+    """LRU map of user_id -> users row, with a TTL per entry"""
+
+    def __init__(self, ttl: float = AUTH_USER_CACHE_TTL, max_entries: int = AUTH_USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (loaded_at, state)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str):
+        """Return the cached state for user_id, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, state: dict):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Forget a user's state so the next request reloads it"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = UserStateCache()
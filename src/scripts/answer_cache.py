@@ -0,0 +1,199 @@
+"""
+Semantic answer cache for repeated questions
+Answers are keyed by query embedding: a new question whose embedding is at
+least ANSWER_CACHE_THRESHOLD cosine-similar to a cached one reuses its answer
+and sources instead of paying for retrieval and a gpt-4.1-mini completion
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough OpenAI token count (~4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+class CachedAnswer:
+    """One cached answer and the query it was generated for"""
+
+    def __init__(self, slot: int, query: str, top_k: int, answer: str,
+                 sources: list, tokens: int):
+        self.slot = slot
+        self.query = query
+        self.top_k = top_k
+        self.answer = answer
+        self.sources = sources
+        self.tokens = tokens
+        self.created_at = time.monotonic()
+        self.hits = 0
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe similarity cache with LRU and TTL eviction
+
+    Embeddings live in one preallocated float32 matrix (one row per slot), so
+    a lookup is a single matrix-vector product over the live entries.
+    Only answers built without user memories may be stored: a cached answer
+    is shared by every user.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        """
+        Args:
+            max_entries: Cached answers kept before the least recently used is evicted
+            ttl: Seconds an answer stays valid
+            threshold: Minimum cosine similarity for a hit
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # slot -> CachedAnswer, oldest use first
+        self._matrix = None
+        self._live = np.zeros(self.max_entries, dtype=bool)
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        # Bumped on invalidate(); answers generated against an older index are discarded
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _drop(self, slot: int):
+        del self._entries[slot]
+        self._live[slot] = False
+        self._free.append(slot)
+
+    def get(self, embedding, top_k: int):
+        """
+        Return the most similar live answer for this query embedding, or None
+
+        A returned entry is not counted as a hit until hit() is called, since
+        the caller may still bypass it (e.g. the user has relevant memories).
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            if not self._entries or self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+
+            now = time.monotonic()
+            expired = [slot for slot, entry in self._entries.items() if now - entry.created_at > self.ttl]
+            for slot in expired:
+                self._drop(slot)
+            self.expirations += len(expired)
+
+            scores = self._matrix @ vector
+            scores[~self._live] = -1.0
+            for slot in np.argsort(scores)[::-1]:
+                if scores[slot] < self.threshold:
+                    break
+                entry = self._entries[int(slot)]
+                if entry.top_k == top_k:
+                    self._entries.move_to_end(entry.slot)
+                    return entry
+            self.misses += 1
+            return None
+
+    def hit(self, entry: CachedAnswer):
+        """Record that a cached answer was served"""
+        with self._lock:
+            self.hits += 1
+            entry.hits += 1
+            self.saved_tokens += entry.tokens
+
+    def bypass(self):
+        """Record a lookup that could not be served from the cache"""
+        with self._lock:
+            self.bypassed += 1
+
+    def put(self, embedding, query: str, top_k: int, answer: str, sources: list,
+            tokens: int, generation: int):
+        """
+        Cache an answer generated without user memories
+
+        Args:
+            generation: self.generation read before retrieval started; the
+                answer is dropped if the index was rebuilt in the meantime
+            tokens: Prompt + completion tokens a hit on this entry saves
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            if generation != self.generation:
+                return
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                for slot in list(self._entries):
+                    self._drop(slot)
+            if not self._free:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._live[slot] = True
+            self._entries[slot] = CachedAnswer(slot, query, top_k, answer, sources, tokens)
+            self.stores += 1
+
+    def invalidate(self):
+        """Drop every cached answer (called after the index is rebuilt)"""
+        with self._lock:
+            for slot in list(self._entries):
+                self._drop(slot)
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Size, hit rate and saved-token counters"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.bypassed
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "saved_tokens_estimated": self.saved_tokens,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Return the process-wide answer cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache()
+    return _cache
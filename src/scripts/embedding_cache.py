@@ -0,0 +1,212 @@
+"""
+Two-tier cache for query embeddings
+Tier 1 is an in-process LRU; tier 2 is a persistent, memory-mapped float32
+matrix on disk shared by every server process. Both tiers are namespaced by
+embedding model and dimension, so changing either never serves stale vectors.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR",
+    str(Path(__file__).resolve().parents[2] / "data" / "embedding_cache")
+)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+# 50k rows of 1536 float32 is ~300MB on disk
+EMBEDDING_CACHE_DISK_ROWS = int(os.getenv("EMBEDDING_CACHE_DISK_ROWS", "50000"))
+
+DIGEST_SIZE = 16
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query used as cache key"""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk store of (digest, vector) rows
+
+    vectors.f32 holds row-major float32 vectors and is read through a
+    memmap; keys.bin holds one 16-byte digest per row. A vector is written
+    before its digest, so a row only becomes visible once it is complete.
+    Appends take an flock so several processes can share the directory.
+    """
+
+    def __init__(self, directory: str, dimensions: int, max_rows: int = EMBEDDING_CACHE_DISK_ROWS):
+        self.directory = Path(directory)
+        self.dimensions = dimensions
+        self.max_rows = max_rows
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / "vectors.f32"
+        self.keys_path = self.directory / "keys.bin"
+        self.lock_path = self.directory / "append.lock"
+        self.vectors_path.touch(exist_ok=True)
+        self.keys_path.touch(exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._keys_read = 0
+        self._matrix = None
+        self._refresh()
+
+    def _refresh(self):
+        """Pick up rows appended since the last read (by any process)"""
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_read * DIGEST_SIZE)
+            data = f.read()
+        complete = len(data) // DIGEST_SIZE
+        for i in range(complete):
+            self._rows[data[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]] = self._keys_read + i
+        self._keys_read += complete
+        if self._keys_read and (self._matrix is None or self._matrix.shape[0] < self._keys_read):
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r",
+                shape=(self._keys_read, self.dimensions)
+            )
+
+    def __len__(self) -> int:
+        return self._keys_read
+
+    def get(self, digest: bytes):
+        with self._lock:
+            row = self._rows.get(digest)
+            if row is None and os.path.getsize(self.keys_path) > self._keys_read * DIGEST_SIZE:
+                self._refresh()
+                row = self._rows.get(digest)
+            if row is None:
+                return None
+            return np.array(self._matrix[row])
+
+    def put(self, digest: bytes, vector: np.ndarray) -> bool:
+        """Append a vector; returns False once the store is full"""
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dimensions:
+            return False
+        with self._lock, open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh()
+            if digest in self._rows:
+                return True
+            if self._keys_read >= self.max_rows:
+                return False
+            row = self._keys_read
+            # Another process may have died between the two writes; overwrite its partial vector
+            with open(self.vectors_path, "r+b") as f:
+                f.seek(row * self.dimensions * 4)
+                f.write(vector.tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(digest)
+            self._refresh()
+            return True
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU in front of a DiskEmbeddingStore
+
+    Keys are digests of (model, dimensions, normalized text).
+    """
+
+    def __init__(self, model: str, dimensions: int, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 max_entries: int = EMBEDDING_CACHE_SIZE,
+                 max_disk_rows: int = EMBEDDING_CACHE_DISK_ROWS):
+        """
+        Args:
+            model: Embedding model name (part of every key)
+            dimensions: Embedding dimension (part of every key)
+            cache_dir: Root directory of the on-disk tier; None disables it
+            max_entries: Vectors kept in the in-process LRU
+            max_disk_rows: Vectors kept on disk before new ones are not persisted
+        """
+        self.model = model
+        self.dimensions = dimensions
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+
+        self.disk = None
+        if cache_dir:
+            slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+            try:
+                self.disk = DiskEmbeddingStore(
+                    os.path.join(cache_dir, f"{slug}-{dimensions}"), dimensions, max_disk_rows
+                )
+            except OSError as e:
+                print(f"[EmbeddingCache] On-disk tier disabled: {e}")
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_full = 0
+
+    def _digest(self, text: str) -> bytes:
+        key = f"{self.model}\0{self.dimensions}\0{normalize_text(text)}"
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+    def get(self, text: str):
+        """Return the cached vector for text, or None"""
+        digest = self._digest(text)
+        with self._lock:
+            vector = self._memory.get(digest)
+            if vector is not None:
+                self._memory.move_to_end(digest)
+                self.memory_hits += 1
+                return vector
+
+        vector = self.disk.get(digest) if self.disk is not None else None
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(digest, vector)
+        return vector
+
+    def _remember(self, digest: bytes, vector: np.ndarray):
+        self._memory[digest] = vector
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, text: str, vector):
+        """Cache a freshly computed vector in both tiers"""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dimensions:
+            return
+        digest = self._digest(text)
+        with self._lock:
+            self._remember(digest, vector)
+        if self.disk is not None:
+            try:
+                if not self.disk.put(digest, vector):
+                    with self._lock:
+                        self.disk_full += 1
+            except OSError as e:
+                print(f"[EmbeddingCache] Could not persist embedding: {e}")
+
+    def stats(self) -> dict:
+        """Tier sizes and hit counters"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "memory_size": len(self._memory),
+                "memory_max_entries": self.max_entries,
+                "disk_size": len(self.disk) if self.disk is not None else 0,
+                "disk_max_rows": self.disk.max_rows if self.disk is not None else 0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk_full": self.disk_full,
+            }
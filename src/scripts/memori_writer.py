@@ -0,0 +1,280 @@
+"""
+Write-behind queue for Memori conversation ingestion
+Chat turns are spooled to a local SQLite file and recorded into Memori by a
+background worker, so record_conversation (and the conscious_ingest work it
+triggers) never adds to user-facing latency
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from memori_pool import MemoriPool, get_memori_pool
+
+
+QUEUE_PATH = os.getenv(
+    "MEMORI_QUEUE_PATH",
+    str(Path(__file__).resolve().parents[2] / "db" / "memori_queue.sqlite3")
+)
+MEMORI_QUEUE_MAX_BACKLOG = int(os.getenv("MEMORI_QUEUE_MAX_BACKLOG", "10000"))
+MEMORI_QUEUE_BATCH_SIZE = int(os.getenv("MEMORI_QUEUE_BATCH_SIZE", "32"))
+MEMORI_QUEUE_MAX_ATTEMPTS = 5
+# A claimed row not deleted within this many seconds is retried (worker died)
+MEMORI_QUEUE_LEASE_SECONDS = 300
+
+
+def record_conversation(handle, user_input: str, ai_output: str, conversation_id: str = None):
+    """Record one chat exchange into a pooled Memori handle"""
+    metadata = {
+        "type": "immigration_query",
+        "assistant": "leann_assistant"
+    }
+    # Stored in chat_history.metadata_json; /api/chat/history groups turns by it
+    if conversation_id:
+        metadata["conversation_id"] = conversation_id
+    with handle.lock:
+        return handle.memori.record_conversation(
+            user_input=user_input,
+            ai_output=ai_output,
+            model="gpt-4.1-mini",
+            metadata=metadata
+        )
+
+
+class MemoriWriteBehindQueue:
+    """
+    Durable, bounded queue of pending record_conversation calls
+
+    Rows live in SQLite until Memori has accepted them, so a crash or
+    restart does not lose conversations. Rows are claimed with a lease,
+    which lets several server processes share one spool file.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH, pool: MemoriPool = None,
+                 max_backlog: int = MEMORI_QUEUE_MAX_BACKLOG,
+                 batch_size: int = MEMORI_QUEUE_BATCH_SIZE,
+                 poll_interval: float = 0.5):
+        """
+        Args:
+            path: SQLite spool file
+            pool: MemoriPool used to reach each user's Memori instance
+            max_backlog: Pending rows beyond which enqueue() refuses new work
+            batch_size: Rows recorded per worker cycle
+            poll_interval: Seconds the idle worker waits between polls
+        """
+        self.path = path
+        self.pool = pool
+        self.max_backlog = max_backlog
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    user_input TEXT NOT NULL,
+                    ai_output TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    claimed_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    conversation_id TEXT
+                )
+            """)
+            # Spool files created before conversation ids were recorded
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(pending_conversations)")]
+            if "conversation_id" not in columns:
+                conn.execute("ALTER TABLE pending_conversations ADD COLUMN conversation_id TEXT")
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.batches = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def backlog(self) -> int:
+        """Number of conversations waiting to be recorded"""
+        row = self._connect().execute("SELECT COUNT(*) FROM pending_conversations").fetchone()
+        return row[0]
+
+    def enqueue(self, user_id: str, user_input: str, ai_output: str,
+                conversation_id: str = None) -> bool:
+        """
+        Spool one exchange for background recording
+
+        Returns:
+            False if the backlog is full and the caller should record inline
+        """
+        if self.backlog() >= self.max_backlog:
+            with self._stats_lock:
+                self.rejected += 1
+            return False
+        self._connect().execute(
+            "INSERT INTO pending_conversations "
+            "(user_id, user_input, ai_output, enqueued_at, conversation_id) VALUES (?, ?, ?, ?, ?)",
+            (user_id, user_input, ai_output, time.time(), conversation_id)
+        )
+        with self._stats_lock:
+            self.enqueued += 1
+        self.start()
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        """Start the background worker (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="memori-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = True, timeout: float = 30.0):
+        """
+        Stop the worker, optionally draining the backlog first
+
+        Rows that cannot be written before the timeout stay in the spool
+        and are picked up on the next start.
+        """
+        if flush:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and self._process_batch():
+                pass
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(1.0, timeout))
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if self._process_batch():
+                    continue
+            except Exception as e:
+                print(f"[MemoriWriter] Worker error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim_batch(self) -> list:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, user_id, user_input, ai_output, attempts, conversation_id FROM pending_conversations "
+                "WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                (now - MEMORI_QUEUE_LEASE_SECONDS, self.batch_size)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE pending_conversations SET claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now, row[0]) for row in rows]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _process_batch(self) -> bool:
+        """Record one batch; returns False when nothing was pending"""
+        rows = self._claim_batch()
+        if not rows:
+            return False
+
+        # Group by user so each batch acquires a user's Memori handle once
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row[1], []).append(row)
+
+        done, retry = [], []
+        pool = self.pool or get_memori_pool()
+        for user_id, user_rows in by_user.items():
+            try:
+                handle = pool.acquire(user_id)
+            except Exception as e:
+                print(f"[MemoriWriter] Could not open Memori for user {user_id}: {e}")
+                retry.extend(user_rows)
+                continue
+            try:
+                for row in user_rows:
+                    row_id, _, user_input, ai_output, attempts, conversation_id = row
+                    try:
+                        chat_id = record_conversation(handle, user_input, ai_output, conversation_id)
+                        print(f"[Memori] Conversation recorded with chat_id: {chat_id}")
+                        done.append(row_id)
+                    except Exception as e:
+                        print(f"[MemoriWriter] Error recording conversation {row_id}: {e}")
+                        retry.append(row)
+            finally:
+                pool.release(handle)
+
+        dropped = [row[0] for row in retry if row[4] + 1 >= MEMORI_QUEUE_MAX_ATTEMPTS]
+        # Back off failed rows exponentially by shortening their remaining lease
+        now = time.time()
+        retried = [
+            (now - MEMORI_QUEUE_LEASE_SECONDS + min(60, 2 ** (row[4] + 1)), row[0])
+            for row in retry if row[4] + 1 < MEMORI_QUEUE_MAX_ATTEMPTS
+        ]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("DELETE FROM pending_conversations WHERE id = ?", [(i,) for i in done + dropped])
+        conn.executemany("UPDATE pending_conversations SET claimed_at = ? WHERE id = ?", retried)
+        conn.execute("COMMIT")
+        if dropped:
+            print(f"[MemoriWriter] Dropped {len(dropped)} conversations after "
+                  f"{MEMORI_QUEUE_MAX_ATTEMPTS} attempts")
+
+        with self._stats_lock:
+            self.batches += 1
+            self.written += len(done)
+            self.failed += len(retry)
+            self.dropped += len(dropped)
+        # Don't spin on a batch that failed entirely; wait for the next poll
+        return bool(done)
+
+    def stats(self) -> dict:
+        """Backlog size and throughput counters"""
+        with self._stats_lock:
+            return {
+                "backlog": self.backlog(),
+                "max_backlog": self.max_backlog,
+                "worker_alive": self._thread is not None and self._thread.is_alive(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "batches": self.batches,
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_memori_writer() -> MemoriWriteBehindQueue:
+    """Return the process-wide write-behind queue"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = MemoriWriteBehindQueue()
+    return _writer
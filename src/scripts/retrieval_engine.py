@@ -0,0 +1,329 @@
+"""
+Process-wide retrieval engine shared by every chat request
+Loads the LEANN index (HNSW graph, passage store, embedding client) and the
+LLM client once, instead of once per /api/chat/message call
+"""
+import os
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+import numpy as np
+from leann import LeannChat
+
+from embedding_cache import QueryEmbeddingCache
+from utils.index_versions import current_index_path
+from utils.passage_store import PassageStore, StorePassageManager, has_passage_store
+
+
+ENV_PATH = Path(__file__).resolve().parents[2] / ".env"
+
+LLM_CONFIG = {
+    "type": "openai",
+    "model": "gpt-4.1-mini",
+    "max_tokens": 500  # Limit response length to keep answers concise
+}
+
+
+class RetrievalEngine:
+    """
+    Long-lived, stateless wrapper around LeannChat
+
+    Holds only read-only resources (index, passages, LLM client). No
+    conversation state is kept here, so one instance can safely serve all
+    users concurrently; per-user state lives in LeannChatAPI.
+    """
+
+    def __init__(self, index_path: str = None, llm_config: dict = None,
+                 embedding_cache: QueryEmbeddingCache = None):
+        """
+        Load the LEANN index and LLM client
+
+        Args:
+            index_path: Path to the LEANN index (without extension);
+                defaults to the currently published index version
+            llm_config: LeannChat llm_config dict
+            embedding_cache: Query embedding cache to reuse (e.g. across a reload);
+                ignored if it was built for a different embedding model
+        """
+        load_dotenv(dotenv_path=ENV_PATH)
+        os.environ["OPENAI_API_KEY"]
+
+        self.index_path = index_path or current_index_path()
+        self.llm_config = dict(llm_config or LLM_CONFIG)
+
+        print(f"[RetrievalEngine] Loading LEANN index from {self.index_path}")
+        self.chat = LeannChat(self.index_path, llm_config=self.llm_config)
+        self.searcher = self.chat.searcher
+        self.llm = self.chat.llm
+        print(f"[RetrievalEngine] Index loaded")
+
+        meta = self.searcher.meta_data
+        model, dimensions = meta["embedding_model"], int(meta["dimensions"])
+        if (embedding_cache is not None and embedding_cache.model == model
+                and embedding_cache.dimensions == dimensions):
+            self.embedding_cache = embedding_cache
+        else:
+            self.embedding_cache = QueryEmbeddingCache(model, dimensions)
+        self._install_embedding_cache()
+        self._install_passage_store()
+
+        # In-flight requests; a retired engine is cleaned up when the last one ends
+        self._leases = 0
+        self._retired = False
+        self._lease_lock = threading.Lock()
+
+    def _install_embedding_cache(self):
+        """
+        Route the backend's query embedding through the embedding cache
+
+        Wraps the searcher's compute_query_embedding so both embed_query()
+        and LeannSearcher.search() skip the embedding API for cached queries.
+        """
+        backend = self.searcher.backend_impl
+        compute = backend.compute_query_embedding
+        cache = self.embedding_cache
+
+        def cached_compute_query_embedding(query, use_server_if_available=True,
+                                           zmq_port=None, query_template=None):
+            text = f"{query_template}{query}" if query_template else query
+            vector = cache.get(text)
+            if vector is None:
+                embedding = compute(
+                    query,
+                    use_server_if_available=use_server_if_available,
+                    zmq_port=zmq_port,
+                    query_template=query_template
+                )
+                cache.put(text, embedding)
+                return embedding
+            # Backends expect a (1, D) batch
+            return vector.reshape(1, -1)
+
+        backend.compute_query_embedding = cached_compute_query_embedding
+
+    def _install_passage_store(self):
+        """
+        Serve passage lookups from the memory-mapped binary store, if built
+
+        LeannSearcher resolves each result with a seek and json.loads on
+        passages.jsonl; the store answers from shared mmapped arrays instead.
+        Indexes without a store (or with a stale one) keep the JSONL path.
+        """
+        self.passage_store = None
+        if not has_passage_store(self.index_path):
+            return
+        manager = self.searcher.passage_manager
+        try:
+            store = PassageStore(self.index_path)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"[RetrievalEngine] Passage store unavailable, using passages.jsonl: {e}")
+            return
+        if len(store) != len(manager):
+            print(f"[RetrievalEngine] Passage store has {len(store)} passages, index has "
+                  f"{len(manager)}; using passages.jsonl")
+            return
+        self.passage_store = store
+        self.searcher.passage_manager = StorePassageManager(store, manager)
+        print(f"[RetrievalEngine] Serving {len(store)} passages from the binary passage store "
+              f"({store.compression})")
+
+    def search(self, query: str, top_k: int = 3, recompute_embeddings: bool = False):
+        """
+        Retrieve the top_k passages for a query
+
+        LeannSearcher.search only reads the loaded graph and passage files,
+        so concurrent calls from different requests are safe.
+        """
+        return self.searcher.search(
+            query,
+            top_k=top_k,
+            recompute_embeddings=recompute_embeddings
+        )
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Compute the query embedding the searcher would use for this query
+
+        Mirrors LeannSearcher.search (same model, provider options and query
+        template) without touching the index.
+        """
+        options = self.searcher.embedding_options
+        query_template = options.get("query_prompt_template", options.get("prompt_template"))
+        embedding = self.searcher.backend_impl.compute_query_embedding(
+            query,
+            use_server_if_available=False,
+            query_template=query_template
+        )
+        return np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+    @staticmethod
+    def build_prompt(question: str, results) -> str:
+        """Build the RAG prompt (same template as LeannChat.ask)"""
+        context = "\n\n".join([r.text for r in results])
+        return (
+            "Here is some retrieved context that might help answer your question:\n\n"
+            f"{context}\n\n"
+            f"Question: {question}\n\n"
+            "Please provide the best answer you can based on this context and your knowledge."
+        )
+
+    @staticmethod
+    def format_sources(results) -> list:
+        """Convert LEANN SearchResults into plain source dicts"""
+        return [
+            {
+                "id": r.id,
+                "text": r.text,
+                "metadata": r.metadata,
+                "score": float(r.score)
+            }
+            for r in results
+        ]
+
+    def _llm_kwargs(self, llm_kwargs: dict) -> dict:
+        # LeannChat's get_llm() drops max_tokens from llm_config; pass it per call
+        if "max_tokens" in self.llm_config:
+            llm_kwargs.setdefault("max_tokens", self.llm_config["max_tokens"])
+        return llm_kwargs
+
+    def generate(self, prompt: str, **llm_kwargs) -> str:
+        """Run the LLM completion for an already assembled prompt"""
+        return self.llm.ask(prompt, **self._llm_kwargs(llm_kwargs))
+
+    def generate_stream(self, prompt: str, **llm_kwargs):
+        """
+        Stream the LLM completion for a prompt, yielding text deltas
+
+        Uses the OpenAI client held by LeannChat's LLM when available;
+        other LLM types fall back to a single chunk with the full answer.
+        """
+        llm_kwargs = self._llm_kwargs(llm_kwargs)
+        client = getattr(self.llm, "client", None)
+        if self.llm_config.get("type") != "openai" or client is None:
+            yield self.llm.ask(prompt, **llm_kwargs)
+            return
+
+        stream = client.chat.completions.create(
+            model=self.llm.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=llm_kwargs.pop("temperature", 0.7),
+            stream=True,
+            **llm_kwargs
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    def ask(self, question: str, top_k: int = 3, recompute_embeddings: bool = False) -> dict:
+        """
+        Retrieve passages and generate an answer
+
+        Returns:
+            Dict with "answer" and "sources"
+        """
+        results = self.search(question, top_k=top_k, recompute_embeddings=recompute_embeddings)
+        answer = self.generate(self.build_prompt(question, results))
+        return {"answer": answer, "sources": self.format_sources(results)}
+
+    def acquire(self) -> bool:
+        """
+        Register an in-flight request using this engine
+
+        Returns:
+            False if the engine has been retired (use the current one instead)
+        """
+        with self._lease_lock:
+            if self._retired:
+                return False
+            self._leases += 1
+            return True
+
+    def release(self):
+        """End a request registered with acquire()"""
+        with self._lease_lock:
+            self._leases -= 1
+            finished = self._retired and self._leases == 0
+        if finished:
+            self.cleanup()
+
+    def retire(self):
+        """Mark the engine superseded; it is cleaned up once no request holds it"""
+        with self._lease_lock:
+            self._retired = True
+            finished = self._leases == 0
+        if finished:
+            self.cleanup()
+
+    def cleanup(self):
+        """Release the index and embedding server resources"""
+        try:
+            self.searcher.cleanup()
+        except Exception as e:
+            print(f"[RetrievalEngine] Error during cleanup: {e}")
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_retrieval_engine() -> RetrievalEngine:
+    """Return the process-wide RetrievalEngine, loading it on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RetrievalEngine()
+    return _engine
+
+
+def acquire_retrieval_engine() -> RetrievalEngine:
+    """
+    The process-wide RetrievalEngine, registered for one request
+
+    Callers must release() it when the request ends.
+    """
+    while True:
+        engine = get_retrieval_engine()
+        # Fails only if a reload retired it just now; the next read sees the new one
+        if engine.acquire():
+            return engine
+
+
+def loaded_retrieval_engine():
+    """Return the process-wide RetrievalEngine if it is loaded, without loading it"""
+    return _engine
+
+
+def reload_retrieval_engine(index_path: str = None) -> RetrievalEngine:
+    """
+    Load an index version and swap it in as the process-wide engine
+
+    The new engine is loaded while the old one keeps serving; requests
+    already holding the old engine finish on it, and its searcher (embedding
+    server, ZMQ sockets) is cleaned up when the last of them releases it.
+    Query embeddings stay cached.
+    """
+    global _engine
+    previous = _engine
+    engine = RetrievalEngine(
+        index_path=index_path,
+        embedding_cache=previous.embedding_cache if previous is not None else None
+    )
+    with _engine_lock:
+        _engine = engine
+    if previous is not None:
+        previous.retire()
+    return engine
+
+
+def shutdown_retrieval_engine():
+    """Cleanup the process-wide RetrievalEngine if it was loaded"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.cleanup()
+            _engine = None
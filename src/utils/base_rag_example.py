@@ -27,6 +27,8 @@ except ImportError:
 
 from leann.registry import register_project_directory
 
+from embedding_pipeline import BatchEmbedder
+
 # Optional import: older PyPI builds may not include settings
 try:
     from leann.settings import resolve_ollama_host, resolve_openai_api_key, resolve_openai_base_url
@@ -315,11 +317,27 @@ class BaseRAGExample(ABC):
         for i in range(0, len(texts), batch_size):
             batch = texts[i : i + batch_size]
             for text in batch:
-                builder.add_text(text)
+                if isinstance(text, str) and text.strip():
+                    builder.add_text(text)
             print(f"Added {min(i + batch_size, len(texts))}/{len(texts)} texts...")
 
-        print("Building index structure...")
-        builder.build_index(index_path)
+        if args.embedding_mode == "openai":
+            # Batched, concurrency-limited embedding instead of the library's sequential loop
+            embedder = BatchEmbedder(args.embedding_model, **embedding_options)
+            try:
+                embeddings = await embedder.embed([chunk["text"] for chunk in builder.chunks])
+            finally:
+                await embedder.aclose()
+            stats = embedder.stats()
+            print(f"Embedded {len(builder.chunks)} chunks in {stats['requests']} requests "
+                  f"({stats['chunks_per_second']} chunks/s)")
+            print("Building index structure...")
+            builder.build_index_from_arrays(
+                index_path, [chunk["id"] for chunk in builder.chunks], embeddings
+            )
+        else:
+            print("Building index structure...")
+            builder.build_index(index_path)
         print(f"Index saved to: {index_path}")
 
         # Register project directory so leann list can discover this index
@@ -0,0 +1,304 @@
+"""
+Streaming index build pipeline
+Parsing, embedding and writing run as concurrent stages joined by bounded
+queues, so only a few batches of chunks and vectors are held in memory at
+any time and embedding overlaps parsing. Passages and vectors are appended
+to the version directory as they arrive; only the final HNSW graph build
+reads the whole vector matrix, memory-mapped from disk.
+Each queue records its occupancy and how long its producer and consumer
+waited on it: a queue that stays full points at a slow consumer, one that
+stays empty at a slow producer.
+"""
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+# Chunks parsed ahead of the embedding stage
+BUILD_QUEUE_CHUNKS = int(os.getenv("BUILD_QUEUE_CHUNKS", "4096"))
+# Chunks handed to the embedder at once (further split into API requests)
+BUILD_EMBED_BATCH = int(os.getenv("BUILD_EMBED_BATCH", "1024"))
+# Micro-batches being embedded at once (their requests share one rate limiter)
+BUILD_EMBED_AHEAD = int(os.getenv("BUILD_EMBED_AHEAD", "4"))
+# Embedded batches waiting to be written
+BUILD_QUEUE_BATCHES = int(os.getenv("BUILD_QUEUE_BATCHES", "4"))
+
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+class PipelineAborted(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+
+class StageQueue:
+    """Bounded hand-off between two stages that tracks its occupancy"""
+
+    def __init__(self, name: str, maxsize: int, abort: threading.Event):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self._queue = queue.Queue(self.maxsize)
+        self._abort = abort
+        self.producer_wait = 0.0
+        self.consumer_wait = 0.0
+        self.peak = 0
+        self._samples = 0
+        self._occupancy_total = 0
+
+    def put(self, item):
+        started = time.monotonic()
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted(f"Pipeline aborted while writing to {self.name}")
+            try:
+                self._queue.put(item, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        self.producer_wait += time.monotonic() - started
+
+    def get(self):
+        started = time.monotonic()
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted(f"Pipeline aborted while reading from {self.name}")
+            try:
+                item = self._queue.get(timeout=_POLL_SECONDS)
+                break
+            except queue.Empty:
+                continue
+        self.consumer_wait += time.monotonic() - started
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is _END:
+                return
+            yield item
+
+    def sample(self) -> int:
+        """Record and return the current number of queued items"""
+        size = self._queue.qsize()
+        self._samples += 1
+        self._occupancy_total += size
+        self.peak = max(self.peak, size)
+        return size
+
+    def stats(self) -> dict:
+        average = self._occupancy_total / self._samples if self._samples else 0.0
+        return {
+            "capacity": self.maxsize,
+            "size": self._queue.qsize(),
+            "avg_fill": round(average / self.maxsize, 3),
+            "peak": self.peak,
+            "producer_wait_s": round(self.producer_wait, 3),
+            "consumer_wait_s": round(self.consumer_wait, 3),
+        }
+
+
+class StreamingPipeline:
+    """
+    Run generator stages in threads connected by bounded queues
+
+    Used as a context manager: leaving the block (normally or on error)
+    stops every stage, and the first stage failure is re-raised.
+    """
+
+    def __init__(self):
+        self.abort = threading.Event()
+        self.queues = []
+        self._threads = []
+        self._errors = []
+        self._done = threading.Event()
+
+    def stage(self, name: str, source, maxsize: int) -> StageQueue:
+        """
+        Iterate `source` in a thread and feed its items into a new queue
+
+        Args:
+            name: Queue name used in occupancy reports
+            source: Iterable (typically a generator reading an upstream queue)
+            maxsize: Queue capacity; the stage blocks when it is full
+
+        Returns:
+            The queue; iterating it yields the stage's items
+        """
+        output = StageQueue(name, maxsize, self.abort)
+
+        def run():
+            try:
+                for item in source:
+                    output.put(item)
+                output.put(_END)
+            except PipelineAborted:
+                pass
+            except BaseException as e:
+                self._errors.append(e)
+                self.abort.set()
+            finally:
+                close = getattr(source, "close", None)
+                if close is not None:
+                    close()
+
+        thread = threading.Thread(target=run, name=f"build-{name}", daemon=True)
+        self.queues.append(output)
+        self._threads.append(thread)
+        thread.start()
+        return output
+
+    def monitor(self, interval: float, callback):
+        """Sample every queue each `interval` seconds and call callback({name: size})"""
+
+        def run():
+            while not self._done.wait(interval):
+                callback(self.sample())
+
+        thread = threading.Thread(target=run, name="build-monitor", daemon=True)
+        thread.start()
+
+    def sample(self) -> dict:
+        return {q.name: q.sample() for q in self.queues}
+
+    def stats(self) -> dict:
+        return {q.name: q.stats() for q in self.queues}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._done.set()
+        if exc_type is not None:
+            self.abort.set()
+        for thread in self._threads:
+            # A stage stuck in a network call is a daemon thread; don't wait it out
+            thread.join(timeout=None if exc_type is None else 5)
+        if self._errors:
+            raise self._errors[0]
+        return False
+
+
+def batched(items, size: int):
+    """Group an iterable into lists of at most `size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class StreamingIndexWriter:
+    """
+    Append passages and vectors to disk, then build the LEANN index from them
+
+    Produces the same files as LeannBuilder.build_index_from_arrays
+    (passages.jsonl/.idx, ids.txt, the backend index and meta.json) with
+    sequential passage ids, without holding the passages in memory.
+    """
+
+    def __init__(self, builder, index_path: str):
+        """
+        Args:
+            builder: LeannBuilder carrying the backend and embedding settings
+            index_path: Index path (without extension) inside an unpublished version
+        """
+        self.builder = builder
+        self.index_path = Path(index_path)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        name = self.index_path.name
+        self.passages_file = self.index_path.parent / f"{name}.passages.jsonl"
+        self.offsets_file = self.index_path.parent / f"{name}.passages.idx"
+        self.ids_file = self.index_path.parent / f"{name}.ids.txt"
+        self.meta_file = self.index_path.parent / f"{name}.meta.json"
+        # Removed once the graph is built; never part of the published version
+        self.vectors_file = self.index_path.parent / f"{name}.vectors.f32.tmp"
+
+        self._passages = open(self.passages_file, "w", encoding="utf-8")
+        self._vectors = open(self.vectors_file, "wb")
+        self.offsets = {}
+        self.documents = {}
+        self.count = 0
+
+    def append(self, chunks: list, vectors: np.ndarray):
+        """Write one embedded batch; passage ids continue from the previous batch"""
+        if len(chunks) != len(vectors):
+            raise ValueError(f"Batch has {len(vectors)} vectors for {len(chunks)} chunks")
+        for chunk in chunks:
+            passage_id = str(self.count)
+            metadata = {"file_name": chunk["metadata"].get("file_name")}
+            self.offsets[passage_id] = self._passages.tell()
+            json.dump({"id": passage_id, "text": chunk["text"], "metadata": metadata},
+                      self._passages, ensure_ascii=False)
+            self._passages.write("\n")
+            self.documents.setdefault(metadata["file_name"], []).append(passage_id)
+            self.count += 1
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(self._vectors)
+
+    def finish(self) -> int:
+        """
+        Build the vector index over everything appended and write the metadata
+
+        Returns:
+            Number of passages indexed
+        """
+        self._passages.close()
+        self._vectors.close()
+        if not self.count:
+            raise ValueError("No passages were written")
+
+        builder = self.builder
+        with open(self.offsets_file, "wb") as f:
+            pickle.dump(self.offsets, f)
+        ids = [str(i) for i in range(self.count)]
+        with open(self.ids_file, "w", encoding="utf-8") as f:
+            f.write("".join(f"{passage_id}\n" for passage_id in ids))
+
+        # Copy-on-write: the backend may normalize in place without touching the file
+        embeddings = np.memmap(self.vectors_file, dtype=np.float32, mode="c",
+                               shape=(self.count, builder.dimensions))
+        backend = builder.backend_factory.builder(**{**builder.backend_kwargs, "dimensions": builder.dimensions})
+        backend.build(embeddings, ids, str(self.index_path))
+        del embeddings
+        self.vectors_file.unlink()
+
+        meta = {
+            "version": "1.1",
+            "backend_name": builder.backend_name,
+            "embedding_model": builder.embedding_model,
+            "dimensions": builder.dimensions,
+            "backend_kwargs": builder.backend_kwargs,
+            "embedding_mode": builder.embedding_mode,
+            "passage_id_scheme": builder.passage_id_scheme,
+            "passage_sources": [
+                {
+                    "type": "jsonl",
+                    "path": self.passages_file.name,
+                    "index_path": self.offsets_file.name,
+                    "path_relative": self.passages_file.name,
+                    "index_path_relative": self.offsets_file.name,
+                }
+            ],
+            "built_from_precomputed_embeddings": True,
+        }
+        if builder.embedding_options:
+            meta["embedding_options"] = builder.embedding_options
+        if builder.backend_name == "hnsw":
+            meta["is_compact"] = builder.backend_kwargs.get("is_compact", True)
+            meta["is_pruned"] = bool(builder.backend_kwargs.get("is_recompute", True))
+        with open(self.meta_file, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        return self.count
+
+    def close(self):
+        """Release open files (after a failed build)"""
+        self._passages.close()
+        self._vectors.close()
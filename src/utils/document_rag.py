@@ -3,7 +3,13 @@ Document RAG example using the unified interface.
 Supports PDF, TXT, MD, and other document formats.
 """
 
+import itertools
+import multiprocessing
+import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Add parent directory to path for imports
@@ -13,6 +19,8 @@ from base_rag_example import BaseRAGExample
 from chunking import create_text_chunks
 from llama_index.core import SimpleDirectoryReader
 
+DOCUMENT_PARSE_WORKERS = int(os.getenv("DOCUMENT_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
 
 class DocumentRAG(BaseRAGExample):
     """RAG example for document processing (PDF, TXT, MD, etc.)."""
@@ -53,59 +61,151 @@ class DocumentRAG(BaseRAGExample):
 
     async def load_data(self, args) -> list[str]:
         """Load documents and convert to text chunks."""
-        print(f"Loading documents from: {args.data_dir}")
-        if args.file_types:
-            print(f"Filtering by file types: {args.file_types}")
-        else:
-            print("Processing all supported file types")
+        return self.load_chunks(args)
 
+    def list_files(self, args) -> list[Path]:
+        """Files under args.data_dir that will be indexed, in reader (sorted) order."""
         # Check if data directory exists
         data_path = Path(args.data_dir)
         if not data_path.exists():
             raise ValueError(f"Data directory not found: {args.data_dir}")
 
-        # Load documents
-        reader_kwargs = {
-            "recursive": True,
-            "encoding": "utf-8",
-        }
+        reader_kwargs = {"recursive": True}
         if args.file_types:
             reader_kwargs["required_exts"] = args.file_types
+        try:
+            return list(SimpleDirectoryReader(args.data_dir, **reader_kwargs).input_files)
+        except ValueError:
+            # The reader refuses directories without matching files
+            return []
 
-        documents = SimpleDirectoryReader(args.data_dir, **reader_kwargs).load_data(
-            show_progress=True
-        )
+    def iter_file_results(self, files: list, args, workers: int = None):
+        """
+        Parse and chunk files on a process pool, yielding results in file order.
+
+        At most 2x workers files are in flight, so memory stays bounded however
+        many files there are while the pool keeps busy.
+
+        Args:
+            workers: Pool size (default DOCUMENT_PARSE_WORKERS); 1 parses inline
+        """
+        workers = max(1, min(workers or DOCUMENT_PARSE_WORKERS, len(files) or 1))
+        if workers == 1:
+            for path in files:
+                yield parse_and_chunk_file(str(path), args)
+            return
+
+        # spawn: the parent may be running threads, fork isn't safe
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        pending = deque()
+        remaining = iter(files)
+        try:
+            for path in itertools.islice(remaining, 2 * workers):
+                pending.append(pool.submit(parse_and_chunk_file, str(path), args))
+            while pending:
+                result = pending.popleft().result()
+                for path in itertools.islice(remaining, 1):
+                    pending.append(pool.submit(parse_and_chunk_file, str(path), args))
+                yield result
+        finally:
+            # Also reached when the consumer stops early (cancelled build)
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def load_chunks(self, args, on_file=None, workers: int = None) -> list[dict]:
+        """
+        Parse and chunk every file on a process pool, merged in file order.
+
+        Args:
+            on_file: Called as on_file(done, total, result) as each file finishes
+            workers: Pool size (default DOCUMENT_PARSE_WORKERS); 1 parses inline
+        """
+        print(f"Loading documents from: {args.data_dir}")
+        if args.file_types:
+            print(f"Filtering by file types: {args.file_types}")
+        else:
+            print("Processing all supported file types")
 
-        if not documents:
+        files = self.list_files(args)
+        if not files:
             print(f"No documents found in {args.data_dir} with extensions {args.file_types}")
             return []
 
-        print(f"Loaded {len(documents)} documents")
+        if args.enable_code_chunking or getattr(args, "use_ast_chunking", False):
+            print("Using AST-aware chunking for code files")
 
-        # Determine chunking strategy
-        use_ast = args.enable_code_chunking or getattr(args, "use_ast_chunking", False)
+        started = time.perf_counter()
+        all_texts = []
+        documents = 0
+        busy = 0.0
+        for done, result in enumerate(self.iter_file_results(files, args, workers), start=1):
+            print(f"  {Path(result['path']).name}: {result['documents']} pages, "
+                  f"{len(result['chunks'])} chunks in {result['seconds']:.2f}s")
+            all_texts.extend(result["chunks"])
+            documents += result["documents"]
+            busy += result["seconds"]
+            if on_file is not None:
+                on_file(done, len(files), result)
+        elapsed = time.perf_counter() - started
+        workers = max(1, min(workers or DOCUMENT_PARSE_WORKERS, len(files)))
+        print(f"Loaded {documents} documents from {len(files)} files "
+              f"in {elapsed:.2f}s on {workers} worker(s) ({busy:.2f}s of parsing)")
+        return apply_max_items(all_texts, args)
+
+    async def load_files(self, files: list, args) -> list[dict]:
+        """Load and chunk only the given files (used for incremental indexing)."""
+        all_texts = []
+        for path in files:
+            result = parse_and_chunk_file(str(path), args)
+            print(f"Loaded {result['documents']} documents from {Path(path).name} in {result['seconds']:.2f}s")
+            all_texts.extend(result["chunks"])
+        return all_texts
 
-        if use_ast:
-            print("Using AST-aware chunking for code files")
 
-        # Convert to text chunks with optional AST support
-        all_texts = create_text_chunks(
-            documents,
-            chunk_size=args.chunk_size,
-            chunk_overlap=args.chunk_overlap,
-            use_ast_chunking=use_ast,
-            ast_chunk_size=getattr(args, "ast_chunk_size", 512),
-            ast_chunk_overlap=getattr(args, "ast_chunk_overlap", 64),
-            code_file_extensions=getattr(args, "code_file_extensions", None),
-            ast_fallback_traditional=getattr(args, "ast_fallback_traditional", True),
-        )
+def chunk_documents(documents, args) -> list[dict]:
+    """Split loaded documents into {"text", "metadata"} chunks."""
+    if not documents:
+        return []
+
+    # Determine chunking strategy
+    use_ast = args.enable_code_chunking or getattr(args, "use_ast_chunking", False)
+
+    # Convert to text chunks with optional AST support
+    return create_text_chunks(
+        documents,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        use_ast_chunking=use_ast,
+        ast_chunk_size=getattr(args, "ast_chunk_size", 512),
+        ast_chunk_overlap=getattr(args, "ast_chunk_overlap", 64),
+        code_file_extensions=getattr(args, "code_file_extensions", None),
+        ast_fallback_traditional=getattr(args, "ast_fallback_traditional", True),
+    )
 
-        # Apply max_items limit if specified
-        if args.max_items > 0 and len(all_texts) > args.max_items:
-            print(f"Limiting to {args.max_items} chunks (from {len(all_texts)})")
-            all_texts = all_texts[: args.max_items]
 
-        return all_texts
+def apply_max_items(all_texts: list, args) -> list:
+    """Apply max_items limit if specified."""
+    if args.max_items > 0 and len(all_texts) > args.max_items:
+        print(f"Limiting to {args.max_items} chunks (from {len(all_texts)})")
+        all_texts = all_texts[: args.max_items]
+    return all_texts
+
+
+def parse_and_chunk_file(path: str, args) -> dict:
+    """
+    Extract and chunk one file (runs in a pool worker).
+
+    Chunking is per document, so chunking files separately gives the same
+    chunks as chunking the whole corpus at once.
+    """
+    started = time.perf_counter()
+    documents = SimpleDirectoryReader(input_files=[path], encoding="utf-8").load_data()
+    chunks = chunk_documents(documents, args)
+    return {
+        "path": path,
+        "documents": len(documents),
+        "chunks": chunks,
+        "seconds": time.perf_counter() - started,
+    }
 
 
 if __name__ == "__main__":
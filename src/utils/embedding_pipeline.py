@@ -0,0 +1,297 @@
+"""
+Batched, concurrency-limited embedding stage for index builds
+Chunks are grouped into token-bounded batches and sent to an
+OpenAI-compatible /embeddings endpoint with a bounded number of requests
+in flight. Rate-limit responses halve the allowed concurrency and honour
+Retry-After; successes grow it back one request at a time. The limiter and
+HTTP client belong to the embedder, so backoff and keep-alive connections
+carry over between calls. Vectors are returned in input order, ready for
+LeannBuilder.build_index_from_arrays.
+EMBEDDING_BASE_URL can point the stage at a local stand-in server.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+import numpy as np
+
+
+EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL") or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+# OpenAI allows 300k tokens and 2048 inputs per embeddings request
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_BATCH_MAX_INPUTS = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "2048"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "60"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough OpenAI token count (~4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def token_batches(texts: list, max_tokens: int = EMBED_BATCH_TOKENS,
+                  max_inputs: int = EMBED_BATCH_MAX_INPUTS) -> list:
+    """
+    Group text positions into consecutive batches under both limits
+
+    A single text over max_tokens gets a batch of its own.
+    """
+    batches = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that backs off on rate limits (AIMD)
+
+    A rate-limited request halves the limit and pauses new requests for the
+    server's Retry-After; every `limit` consecutive successes raise it by one,
+    up to the configured maximum.
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self.lowest = self.maximum
+        self.in_flight = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            while self.in_flight >= self.limit:
+                await self._cond.wait()
+            self.in_flight += 1
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def succeeded(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+
+    def rate_limited(self, retry_after: float):
+        self.limit = max(1, self.limit // 2)
+        self.lowest = min(self.lowest, self.limit)
+        self._successes = 0
+        self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+
+
+class BatchEmbedder:
+    """
+    Embed many texts through an OpenAI-compatible /embeddings endpoint
+
+    The rate limiter and connection pool are created on first use and bound
+    to that event loop. Synchronous callers share one background loop owned
+    by the embedder; call close() (or await aclose() from async code) when done.
+    """
+
+    def __init__(self, model: str, dimensions: int = None, base_url: str = EMBEDDING_BASE_URL,
+                 api_key: str = None, concurrency: int = EMBED_CONCURRENCY,
+                 batch_tokens: int = EMBED_BATCH_TOKENS, max_inputs: int = EMBED_BATCH_MAX_INPUTS,
+                 max_retries: int = EMBED_MAX_RETRIES, timeout: float = EMBED_TIMEOUT):
+        """
+        Args:
+            model: Embedding model name
+            dimensions: Expected vector size; responses of another size are an error
+            base_url: API root, e.g. a local stand-in server in tests
+            api_key: Bearer token (defaults to OPENAI_API_KEY)
+            concurrency: Maximum requests in flight
+            batch_tokens: Estimated tokens per request
+            max_inputs: Texts per request
+            max_retries: Retries per batch on 429/5xx/transport errors
+            timeout: Per-request timeout in seconds
+        """
+        self.model = model
+        self.dimensions = dimensions
+        self.base_url = (base_url or EMBEDDING_BASE_URL).rstrip("/")
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+        self.concurrency = concurrency
+        self.batch_tokens = batch_tokens
+        self.max_inputs = max_inputs
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.chunks = 0
+        self.seconds = 0.0
+
+        self._limiter = None
+        self._client = None
+        self._client_loop = None
+        self._loop = None
+        self._thread = None
+        self._loop_lock = threading.Lock()
+
+    def _session(self):
+        """The limiter and HTTP client, created for the running loop on first use"""
+        loop = asyncio.get_running_loop()
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._limiter = AdaptiveLimiter(self.concurrency)
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=headers,
+                                             timeout=self.timeout, limits=limits)
+            self._client_loop = loop
+        elif self._client_loop is not loop:
+            raise RuntimeError("BatchEmbedder is already in use on another event loop")
+        return self._client, self._limiter
+
+    async def embed(self, texts: list, on_batch=None) -> np.ndarray:
+        """
+        Embed texts, returning a float32 (len(texts), dimensions) array in input order
+
+        Args:
+            on_batch: Called as on_batch(positions, vectors) as each batch completes
+        """
+        if not texts:
+            return np.empty((0, self.dimensions or 0), dtype=np.float32)
+
+        started = time.monotonic()
+        client, limiter = self._session()
+        results = [None] * len(texts)
+
+        async def run(positions):
+            vectors = await self._embed_batch(client, limiter, [texts[i] for i in positions])
+            for i, vector in zip(positions, vectors):
+                results[i] = vector
+            if on_batch is not None:
+                on_batch(positions, vectors)
+
+        tasks = [
+            asyncio.ensure_future(run(positions))
+            for positions in token_batches(texts, self.batch_tokens, self.max_inputs)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        self.chunks += len(texts)
+        self.seconds += time.monotonic() - started
+        return np.vstack(results).astype(np.float32)
+
+    def embed_sync(self, texts: list, on_batch=None) -> np.ndarray:
+        """
+        embed() for synchronous callers (build scripts)
+
+        Runs on the embedder's background loop, so calls from several threads
+        share one limiter and connection pool and their requests overlap.
+        """
+        return asyncio.run_coroutine_threadsafe(self.embed(texts, on_batch), self._background_loop()).result()
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="batch-embedder", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    async def aclose(self):
+        """Close the HTTP client (from the loop it was used on)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+
+    def close(self):
+        """Close the HTTP client and stop the background loop used by embed_sync()"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def _embed_batch(self, client: httpx.AsyncClient, limiter: AdaptiveLimiter, batch: list) -> np.ndarray:
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            try:
+                self.requests += 1
+                response = await client.post("/embeddings", json={"model": self.model, "input": batch})
+            except httpx.TransportError as e:
+                response, error = None, e
+            finally:
+                await limiter.release()
+
+            if response is not None and response.status_code == 200:
+                limiter.succeeded()
+                return self._parse(response.json(), len(batch))
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+            if attempt >= self.max_retries:
+                if response is not None:
+                    response.raise_for_status()
+                raise error
+
+            attempt += 1
+            self.retries += 1
+            # Exponential backoff with jitter, unless the server says how long to wait
+            delay = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+            if response is not None and response.status_code == 429:
+                self.rate_limited += 1
+                retry_after = response.headers.get("retry-after")
+                try:
+                    delay = float(retry_after) if retry_after is not None else delay
+                except ValueError:
+                    pass
+                limiter.rate_limited(delay)
+                print(f"[EmbeddingPipeline] Rate limited; concurrency now {limiter.limit}, "
+                      f"retrying in {delay:.1f}s")
+            else:
+                await asyncio.sleep(delay)
+
+    def _parse(self, body: dict, expected: int) -> np.ndarray:
+        data = sorted(body["data"], key=lambda item: item["index"])
+        if len(data) != expected:
+            raise ValueError(f"Embedding response has {len(data)} vectors for {expected} inputs")
+        vectors = np.asarray([item["embedding"] for item in data], dtype=np.float32)
+        if self.dimensions is not None and vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} != expected {self.dimensions}")
+        return vectors
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "min_concurrency": self._limiter.lowest if self._limiter is not None else self.concurrency,
+            "embed_seconds": round(self.seconds, 3),
+            "chunks_per_second": round(self.chunks / self.seconds, 1) if self.seconds else 0.0,
+        }
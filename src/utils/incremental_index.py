@@ -0,0 +1,205 @@
+"""
+Incremental LEANN indexing
+Chunks and embeds a single new document and appends it to a copy of the
+current index version (graph, passages.jsonl/.idx, ids.txt), which is then
+published as a new version, instead of rebuilding the whole corpus. A
+document manifest (index.documents.json) records which passages came from
+which file, so re-uploads of an indexed file are detected.
+Also holds the chunking/builder settings shared with leann_converter.py.
+"""
+import asyncio
+import json
+import pickle
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add utils directory to path for local imports
+utils_dir = str(Path(__file__).parent)
+if utils_dir not in sys.path:
+    sys.path.insert(0, utils_dir)
+
+from leann import LeannBuilder
+from document_rag import DocumentRAG
+from passage_store import convert_index
+from index_versions import (
+    DATA_DIR, IndexLockBusy, current_index_path, discard_version, file_sha256, index_lock,
+    new_version, publish_version, write_atomic, write_version_manifest
+)
+
+
+# Seconds between retries while another upload holds the index lock
+INDEX_LOCK_POLL_INTERVAL = 0.2
+
+BUILDER_KWARGS = {
+    "backend_name": "hnsw",
+    "embedding_mode": "openai",
+    "embedding_model": "text-embedding-3-small",
+    # Known up front so cached passage vectors can be looked up without an API call
+    "dimensions": 1536,
+    "is_compact": False,
+    "is_recompute": False,
+}
+
+
+def chunk_args(data_dir: Path = DATA_DIR) -> SimpleNamespace:
+    """DocumentRAG arguments used by both full and incremental builds"""
+    return SimpleNamespace(
+        data_dir=str(data_dir),          # folder containing your PDFs
+        file_types=[".pdf"],        # filter PDFs
+        chunk_size=256,
+        chunk_overlap=128,
+        enable_code_chunking=False,
+        max_items=0,
+    )
+
+
+def index_files(index_path: str) -> dict:
+    """Paths of the files that make up a LEANN index"""
+    path = Path(index_path)
+    return {
+        "meta": path.parent / f"{path.name}.meta.json",
+        "passages": path.parent / f"{path.name}.passages.jsonl",
+        "offsets": path.parent / f"{path.name}.passages.idx",
+        "index": path.parent / f"{path.stem}.index",
+        "ids": path.parent / f"{path.name}.ids.txt",
+        "manifest": path.parent / f"{path.name}.documents.json",
+    }
+
+
+def load_manifest(index_path: str):
+    """The document manifest, or None if the index predates it"""
+    path = index_files(index_path)["manifest"]
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, index_path: str):
+    write_atomic(index_files(index_path)["manifest"], json.dumps(manifest, indent=2))
+
+
+def write_build_manifest(passage_ids: dict, documents_dir: Path, index_path: str):
+    """
+    Record which passages each file produced after a full build
+
+    Args:
+        passage_ids: {file_name: [passage ids]} as indexed
+        documents_dir: Directory holding the source files
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    documents = {}
+    for name, ids in passage_ids.items():
+        if not name:
+            continue
+        source = Path(documents_dir) / name
+        documents[name] = {
+            "sha256": file_sha256(source) if source.exists() else None,
+            "passage_ids": list(ids),
+            "indexed_at": now,
+        }
+    save_manifest({"documents": documents}, index_path)
+
+
+def add_document(file_path) -> dict:
+    """
+    Chunk, embed and append one document, publishing the result as a new version
+
+    Embedding cost is proportional to the document, not the corpus; the
+    current version's files are copied so readers never see a partial append.
+    Waits for another upload holding the index lock, but not for a full
+    rebuild, which has no time bound.
+
+    Returns:
+        Dict with "status" ("indexed", "unchanged", "empty", "rebuild_required"
+        or "rebuild_in_progress"), "chunks_added", "total_passages", "version"
+        and, for rebuild_required/rebuild_in_progress, "reason"
+    """
+    file_path = Path(file_path)
+    while True:
+        try:
+            with index_lock("upload", blocking=False):
+                return _append_document(file_path)
+        except IndexLockBusy as e:
+            if e.holder == "rebuild":
+                return {"status": "rebuild_in_progress", "chunks_added": 0, "total_passages": None,
+                        "reason": "A full index rebuild is running; rebuild again once it finishes "
+                                  "if the document is not included"}
+        time.sleep(INDEX_LOCK_POLL_INTERVAL)
+
+
+def _append_document(file_path: Path) -> dict:
+    """add_document() body; the caller holds the index lock"""
+    name = file_path.name
+
+    base_path = current_index_path()
+    base = index_files(base_path)
+    if not base["meta"].exists():
+        return {"status": "rebuild_required", "chunks_added": 0, "total_passages": None,
+                "reason": "No index has been built yet"}
+
+    manifest = load_manifest(base_path)
+    if manifest is None:
+        return {"status": "rebuild_required", "chunks_added": 0, "total_passages": None,
+                "reason": "Index was built without a document manifest"}
+
+    sha256 = file_sha256(file_path)
+    existing = manifest["documents"].get(name)
+    if existing is not None:
+        if existing.get("sha256") == sha256:
+            return {"status": "unchanged", "chunks_added": 0, "total_passages": None}
+        # HNSW cannot delete the old file's vectors in place
+        return {"status": "rebuild_required", "chunks_added": 0, "total_passages": None,
+                "reason": f"'{name}' is already indexed with different content"}
+
+    chunks = asyncio.run(DocumentRAG().load_files([file_path], chunk_args(file_path.parent)))
+    with open(base["offsets"], "rb") as f:
+        base_id = len(pickle.load(f))
+    builder = LeannBuilder(**BUILDER_KWARGS)
+    for i, chunk in enumerate(chunks):
+        # Sequential ids continue after the existing passages (HNSW labels == ids)
+        builder.add_text(chunk["text"], metadata={"id": str(base_id + i), "file_name": name})
+    # update_index assigns the new passage ids in place and then clears builder.chunks
+    added = [c for c in builder.chunks if isinstance(c["text"], str) and c["text"].strip()]
+    if not added:
+        return {"status": "empty", "chunks_added": 0, "total_passages": None}
+
+    version, index_path = new_version()
+    try:
+        files = index_files(index_path)
+        for key, source in base.items():
+            if source.exists():
+                shutil.copy2(source, files[key])
+        builder.update_index(index_path)
+
+        # update_index leaves the label -> passage id map untouched; extend it to match
+        ids_before = files["ids"].read_text(encoding="utf-8") if files["ids"].exists() else ""
+        if ids_before and not ids_before.endswith("\n"):
+            ids_before += "\n"
+        write_atomic(files["ids"], ids_before + "".join(f"{c['id']}\n" for c in added))
+        # The binary passage store is derived from passages.jsonl; regenerate it
+        convert_index(index_path)
+
+        manifest["documents"][name] = {
+            "sha256": sha256,
+            "passage_ids": [c["id"] for c in added],
+            "indexed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        save_manifest(manifest, index_path)
+
+        with open(files["meta"], encoding="utf-8") as f:
+            total = json.load(f).get("total_passages")
+        write_version_manifest(version, kind="incremental", base=Path(base_path).parent.name,
+                               documents=[name], total_passages=total)
+        publish_version(version)
+    except BaseException:
+        discard_version(version)
+        raise
+
+    print(f"[IncrementalIndex] Added {len(added)} passages from '{name}' (total {total})")
+    return {"status": "indexed", "chunks_added": len(added), "total_passages": total,
+            "version": version}
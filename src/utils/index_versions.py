@@ -0,0 +1,202 @@
+"""
+Versioned LEANN index directories
+Every build (full or incremental) writes a complete index into a fresh
+directory under data/indexes/, records a manifest with the size and SHA-256
+of each file, and only then switches the CURRENT pointer file to it with an
+atomic rename. Readers resolve CURRENT and never see a half-written index;
+running servers poll it and reload in the background.
+Before the first versioned build, the flat data/index.* files are served.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+INDEXES_DIR = DATA_DIR / "indexes"
+CURRENT_POINTER = INDEXES_DIR / "CURRENT"
+INDEX_NAME = "index"
+# Flat layout used before versioned builds
+LEGACY_INDEX_PATH = str(DATA_DIR / INDEX_NAME)
+LOCK_PATH = DATA_DIR / "index.lock"
+MANIFEST_NAME = "manifest.json"
+
+# Superseded versions kept on disk for readers that still have them open
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+
+
+class IndexVersionError(Exception):
+    """Raised when a version directory is missing files or fails its checksums"""
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_atomic(path: Path, text: str):
+    """Write a small file via fsync + rename so readers see old or new content"""
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+
+
+class IndexLockBusy(Exception):
+    """Raised by index_lock(blocking=False) while another writer holds the lock"""
+
+    def __init__(self, holder: str):
+        super().__init__(f"Index lock is held by {holder}")
+        self.holder = holder
+
+
+@contextmanager
+def index_lock(holder: str = "writer", blocking: bool = True):
+    """
+    Exclusive flock serializing index writers (uploads and full rebuilds)
+
+    Args:
+        holder: Name recorded in the lock file while held (e.g. "rebuild"),
+            so a non-blocking caller can tell who it would be waiting for
+        blocking: False raises IndexLockBusy instead of waiting
+    """
+    LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Not "w": truncating before the flock would wipe the current holder's name
+    with open(LOCK_PATH, "a+") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.seek(0)
+            raise IndexLockBusy(lock_file.read().strip() or "unknown")
+        lock_file.truncate(0)
+        lock_file.write(holder)
+        lock_file.flush()
+        try:
+            yield
+        finally:
+            lock_file.truncate(0)
+            lock_file.flush()
+
+
+def current_version():
+    """Name of the published version, or None before the first versioned build"""
+    try:
+        version = CURRENT_POINTER.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def version_index_path(version: str) -> str:
+    return str(INDEXES_DIR / version / INDEX_NAME)
+
+
+def current_index_path() -> str:
+    """Index path (without extension) that readers should load"""
+    version = current_version()
+    return version_index_path(version) if version else LEGACY_INDEX_PATH
+
+
+def new_version() -> tuple:
+    """
+    Create an empty, unpublished version directory
+
+    Returns:
+        (version, index_path); names sort in creation order
+    """
+    version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+    (INDEXES_DIR / version).mkdir(parents=True)
+    return version, version_index_path(version)
+
+
+def discard_version(version: str):
+    """Remove an unpublished version directory (failed or cancelled build)"""
+    if version != current_version():
+        shutil.rmtree(INDEXES_DIR / version, ignore_errors=True)
+
+
+def write_version_manifest(version: str, **details) -> dict:
+    """Checksum every file of a finished build into its manifest.json"""
+    directory = INDEXES_DIR / version
+    files = {
+        path.name: {"size": path.stat().st_size, "sha256": file_sha256(path)}
+        for path in sorted(directory.iterdir())
+        if path.is_file() and path.name != MANIFEST_NAME and not path.name.endswith(".tmp")
+    }
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "files": files,
+        **details,
+    }
+    write_atomic(directory / MANIFEST_NAME, json.dumps(manifest, indent=2))
+    return manifest
+
+
+def load_version_manifest(version: str) -> dict:
+    path = INDEXES_DIR / version / MANIFEST_NAME
+    if not path.exists():
+        raise IndexVersionError(f"Index version {version} has no manifest")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_version(version: str) -> dict:
+    """
+    Check every file listed in a version's manifest
+
+    Returns:
+        The manifest
+
+    Raises:
+        IndexVersionError: a file is missing or its size/checksum differs
+    """
+    manifest = load_version_manifest(version)
+    directory = INDEXES_DIR / version
+    for name, expected in manifest["files"].items():
+        path = directory / name
+        if not path.exists():
+            raise IndexVersionError(f"Index version {version} is missing {name}")
+        if path.stat().st_size != expected["size"] or file_sha256(path) != expected["sha256"]:
+            raise IndexVersionError(f"Index version {version}: checksum mismatch for {name}")
+    return manifest
+
+
+def publish_version(version: str, keep: int = INDEX_KEEP_VERSIONS):
+    """Verify a finished version and atomically make it CURRENT (caller holds index_lock)"""
+    verify_version(version)
+    write_atomic(CURRENT_POINTER, version + "\n")
+    print(f"[IndexVersions] Published index version {version}")
+    prune_versions(keep)
+
+
+def prune_versions(keep: int = INDEX_KEEP_VERSIONS):
+    """
+    Delete all but the current and the newest keep-1 older published versions
+
+    Unpublished directories (abandoned builds) are removed too, so this must
+    only run under index_lock, when no build is writing one.
+    """
+    current = current_version()
+    if current is None or not INDEXES_DIR.exists():
+        return
+    kept = 1
+    for directory in sorted((p for p in INDEXES_DIR.iterdir() if p.is_dir()), reverse=True):
+        if directory.name == current:
+            continue
+        published = directory.name < current and (directory / MANIFEST_NAME).exists()
+        if published and kept < keep:
+            kept += 1
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
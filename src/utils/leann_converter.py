@@ -1,12 +1,25 @@
+"""
+Full LEANN index build over every PDF in data/
+Runs as a standalone process (started by the server's index job manager or
+by hand). Documents stream through parse, embed and write stages joined by
+bounded queues (see build_pipeline.py). Progress is reported on stdout as
+one "[Progress] {json}" line per update: parse (per file until the first
+batch is written), chunk (parsing finished first), embed (files parsed,
+chunks written out of the total once parsing is done, queue occupancy),
+build and done. The index is
+built into a new version directory that is published only once complete
+and verified, so an interrupted build leaves the served index untouched.
+"""
 import sys
 import site
+import json
 from pathlib import Path
-from leann import LeannBuilder
-from document_rag import DocumentRAG
-from types import SimpleNamespace
 from dotenv import load_dotenv
-import asyncio
 import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Add utils directory to path for local imports
 utils_dir = str(Path(__file__).parent)
@@ -18,43 +31,202 @@ user_site = site.getusersitepackages()
 if user_site not in sys.path:
     sys.path.insert(0, user_site)
 
+env_path = Path(__file__).resolve().parents[2] / ".env"
+# Before the imports below read their EMBED_*/INDEX_* settings
+load_dotenv(dotenv_path=env_path)
+
+from leann import LeannBuilder
+from document_rag import DocumentRAG
+from incremental_index import BUILDER_KWARGS, chunk_args, write_build_manifest
+from passage_embedding_cache import PassageEmbeddingCache
+from embedding_pipeline import BatchEmbedder
+from build_pipeline import (
+    BUILD_EMBED_AHEAD, BUILD_EMBED_BATCH, BUILD_QUEUE_BATCHES, BUILD_QUEUE_CHUNKS, StreamingIndexWriter,
+    StreamingPipeline, batched
+)
+from passage_store import convert_index
+from index_versions import (
+    DATA_DIR, discard_version, index_lock, new_version, publish_version, write_version_manifest
+)
+
 
+data_dir = DATA_DIR
 
+# Set by the job manager so builds don't compete with request handling for CPU
+INDEX_BUILD_NICE = int(os.getenv("INDEX_BUILD_NICE", "0"))
+# Seconds between progress lines (with queue occupancy) while streaming
+BUILD_PROGRESS_INTERVAL = 1.0
 
-env_path = Path(__file__).resolve().parents[2] / ".env"
-data_dir = Path(__file__).resolve().parents[2] / "data"
-load_dotenv(dotenv_path=env_path)
-os.environ["OPENAI_API_KEY"] 
 
+def report_progress(stage: str, **counts):
+    """Emit one machine-readable progress line for the job manager"""
+    print(f"[Progress] {json.dumps(dict(stage=stage, **counts))}", flush=True)
 
-args = SimpleNamespace(
-    data_dir=str(data_dir),          # folder containing your PDFs
-    file_types=[".pdf"],        # filter PDFs
-    chunk_size=256,
-    chunk_overlap=128,
-    enable_code_chunking=False,
-    max_items=0,
-)
 
-rag = DocumentRAG()
-all_chunks = asyncio.run(rag.load_data(args))
-print(f"Extracted {len(all_chunks)} text chunks")
-
-# Build LEANN index
-INDEX_PATH = str(data_dir / "index")
-builder = LeannBuilder(
-    backend_name="hnsw",
-    embedding_mode="openai",
-    embedding_model="text-embedding-3-small",
-    is_compact=False,
-    is_recompute=False
-)
+def parse_chunks(rag: DocumentRAG, files: list, args, counts: dict):
+    """
+    Parsing stage: non-empty chunks in file order, up to args.max_items
+
+    Reports parse progress until embedding output starts (embed progress
+    carries the file counts from then on) and sets counts["total"] once
+    every chunk is known.
+    """
+    def parsed():
+        counts["total"] = counts["chunks"]
+        if not counts["done"]:
+            report_progress("chunk", chunks=counts["chunks"])
+
+    results = rag.iter_file_results(files, args)
+    try:
+        for result in results:
+            counts["files_done"] += 1
+            counts["documents"] += result["documents"]
+            print(f"  {Path(result['path']).name}: {result['documents']} pages, "
+                  f"{len(result['chunks'])} chunks in {result['seconds']:.2f}s")
+            for chunk in result["chunks"]:
+                if not (isinstance(chunk["text"], str) and chunk["text"].strip()):
+                    continue
+                if args.max_items > 0 and counts["chunks"] >= args.max_items:
+                    parsed()
+                    return
+                counts["chunks"] += 1
+                yield chunk
+            if not counts["done"]:
+                report_progress("parse", files_done=counts["files_done"], files=counts["files"],
+                                documents=counts["documents"], chunks=counts["chunks"])
+        parsed()
+    finally:
+        results.close()
+
+
+def embed_batches(cache: PassageEmbeddingCache, embedder: BatchEmbedder, chunks):
+    """
+    Embedding stage: (chunks, vectors) per micro-batch
+
+    Cached chunks are reused; misses go through the batched,
+    concurrency-limited embedding client. Up to BUILD_EMBED_AHEAD
+    micro-batches are in flight at once, sharing the embedder's limiter and
+    connections, and are yielded in order.
+    """
+    def embed(batch):
+        return batch, cache.embed([chunk["text"] for chunk in batch], embedder.embed_sync)
+
+    workers = max(1, BUILD_EMBED_AHEAD)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="build-embed")
+    pending = deque()
+    try:
+        for batch in batched(chunks, BUILD_EMBED_BATCH):
+            pending.append(pool.submit(embed, batch))
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Also reached when the pipeline aborts
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def build(args=None) -> str:
+    """
+    Stream documents through parse, embed and write stages, then publish the index
+
+    Peak memory is bounded by the queue sizes rather than the corpus; queue
+    occupancy is reported with the embed progress so the slow stage shows.
+
+    Returns:
+        The published index version
+    """
+    args = args or chunk_args(data_dir)
+
+    # Uploads append to the index incrementally; don't interleave with them
+    with index_lock("rebuild"):
+        rag = DocumentRAG()
+        files = rag.list_files(args)
+        if not files:
+            raise ValueError(f"No documents found in {args.data_dir}")
+        print(f"Streaming {len(files)} files from {args.data_dir}")
+
+        builder = LeannBuilder(**BUILDER_KWARGS)
+        cache = PassageEmbeddingCache(builder.embedding_model, builder.dimensions)
+        embedder = BatchEmbedder(
+            builder.embedding_model,
+            dimensions=builder.dimensions,
+            **{key: value for key, value in builder.embedding_options.items() if key in ("base_url", "api_key")}
+        )
+        counts = {"files_done": 0, "files": len(files), "documents": 0, "chunks": 0, "done": 0}
+        started = time.monotonic()
+
+        def on_sample(sizes):
+            # parse_chunks reports until the first batch is written
+            if not counts["done"]:
+                return
+            report_progress("embed", **counts, cache_hits=cache.hits,
+                            chunks_per_second=round(counts["done"] / max(time.monotonic() - started, 1e-6), 1),
+                            chunk_queue=sizes["chunks"], chunk_queue_capacity=BUILD_QUEUE_CHUNKS,
+                            vector_queue=sizes["vectors"], vector_queue_capacity=BUILD_QUEUE_BATCHES)
+
+        report_progress("parse", files_done=0, files=len(files), documents=0, chunks=0)
+        version, index_path = new_version()
+        writer = None
+        try:
+            writer = StreamingIndexWriter(builder, index_path)
+            with StreamingPipeline() as pipeline:
+                chunks = pipeline.stage("chunks", parse_chunks(rag, files, args, counts), BUILD_QUEUE_CHUNKS)
+                batches = pipeline.stage("vectors", embed_batches(cache, embedder, chunks), BUILD_QUEUE_BATCHES)
+                pipeline.monitor(BUILD_PROGRESS_INTERVAL, on_sample)
+                # Writing happens here; passage ids 0..n-1 match the HNSW labels
+                for batch, vectors in batches:
+                    writer.append(batch, vectors)
+                    counts["done"] = writer.count
 
-# Add all text chunks
-for chunk in all_chunks:
-    builder.add_text(chunk['text'])
+            elapsed = time.monotonic() - started
+            queues = pipeline.stats()
+            stats = dict(cache.stats(), **embedder.stats())
+            stats["chunks_per_second"] = round(writer.count / max(elapsed, 1e-6), 1)
+            report_progress("embed", **counts, **stats,
+                            chunk_queue_avg_fill=queues["chunks"]["avg_fill"],
+                            vector_queue_avg_fill=queues["vectors"]["avg_fill"],
+                            # Parse blocked on a full queue: embedding is the bottleneck, and so on
+                            parse_blocked_s=queues["chunks"]["producer_wait_s"],
+                            embed_starved_s=queues["chunks"]["consumer_wait_s"],
+                            embed_blocked_s=queues["vectors"]["producer_wait_s"],
+                            write_starved_s=queues["vectors"]["consumer_wait_s"])
+            print(f"Streamed {writer.count} chunks from {counts['documents']} documents in {elapsed:.2f}s "
+                  f"({stats['chunks_per_second']} chunks/s)")
+            print(f"Embedding cache: {stats['cache_hits']}/{writer.count} chunks reused "
+                  f"({stats['hit_rate']:.1%}), {stats['embedded']} embedded in {stats['requests']} requests "
+                  f"({stats['retries']} retries)")
+            for name, queue_stats in queues.items():
+                print(f"Queue {name}: avg {queue_stats['avg_fill']:.0%} full (peak {queue_stats['peak']}/"
+                      f"{queue_stats['capacity']}), producer waited {queue_stats['producer_wait_s']}s, "
+                      f"consumer waited {queue_stats['consumer_wait_s']}s")
+            if not writer.count:
+                raise ValueError(f"No text could be extracted from the documents in {args.data_dir}")
 
-builder.build_index(INDEX_PATH)
-print(f"Index saved to: {INDEX_PATH}")
+            report_progress("build", passages=writer.count)
+            writer.finish()
+            # Read-optimized copy of the passages for the retrieval engine
+            convert_index(index_path)
+            write_build_manifest(writer.documents, data_dir, index_path)
+            write_version_manifest(version, kind="full", documents=counts["documents"],
+                                   total_passages=writer.count)
+            publish_version(version)
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            discard_version(version)
+            raise
+        finally:
+            embedder.close()
+        report_progress("done", passages=writer.count, version=version)
+        print(f"Index saved to: {index_path}")
+        return version
 
 
+if __name__ == "__main__":
+    os.environ["OPENAI_API_KEY"]
+    if INDEX_BUILD_NICE:
+        os.nice(INDEX_BUILD_NICE)
+    # Exit via SystemExit on cancel so the unpublished version is cleaned up
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    build()
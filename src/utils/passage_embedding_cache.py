@@ -0,0 +1,148 @@
+"""
+Content-addressed cache of passage embeddings for index builds
+Vectors are keyed by a digest of (model, dimensions, exact chunk text) and
+kept in the same append-only memory-mapped store the query cache uses, so a
+rebuild only sends chunks it has never embedded before to the embedding API.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# The on-disk store lives with the query embedding cache in src/scripts
+scripts_dir = str(Path(__file__).resolve().parents[1] / "scripts")
+if scripts_dir not in sys.path:
+    sys.path.insert(0, scripts_dir)
+
+from embedding_cache import DIGEST_SIZE, EMBEDDING_CACHE_DIR, DiskEmbeddingStore
+
+
+PASSAGE_EMBEDDING_CACHE_DIR = os.getenv(
+    "PASSAGE_EMBEDDING_CACHE_DIR", os.path.join(EMBEDDING_CACHE_DIR, "passages")
+)
+# 200k rows of 1536 float32 is ~1.2GB on disk
+PASSAGE_EMBEDDING_CACHE_ROWS = int(os.getenv("PASSAGE_EMBEDDING_CACHE_ROWS", "200000"))
+
+
+class PassageEmbeddingCache:
+    """
+    Reuse stored passage vectors and embed only the chunks not seen before
+
+    Unlike the query cache, keys use the exact text: chunk boundaries and
+    whitespace are what was embedded, so nothing is normalized.
+    """
+
+    def __init__(self, model: str, dimensions: int, cache_dir: str = PASSAGE_EMBEDDING_CACHE_DIR,
+                 max_rows: int = PASSAGE_EMBEDDING_CACHE_ROWS):
+        """
+        Args:
+            model: Embedding model name (part of every key)
+            dimensions: Embedding dimension (part of every key)
+            cache_dir: Root directory of the store; None disables caching
+            max_rows: Vectors kept on disk before new ones are not persisted
+        """
+        self.model = model
+        self.dimensions = dimensions
+        self.store = None
+        if cache_dir:
+            slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+            try:
+                self.store = DiskEmbeddingStore(
+                    os.path.join(cache_dir, f"{slug}-{dimensions}"), dimensions, max_rows
+                )
+            except OSError as e:
+                print(f"[PassageEmbeddingCache] Cache disabled: {e}")
+
+        self.hits = 0
+        self.misses = 0
+        self.embedded = 0
+        self.stored = 0
+        self.store_full = 0
+        # Builds embed several micro-batches at once
+        self._stats_lock = threading.Lock()
+
+    def digest(self, text: str) -> bytes:
+        key = f"{self.model}\0{self.dimensions}\0{text}"
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+    def embed(self, texts: list, compute, on_progress=None) -> np.ndarray:
+        """
+        Embeddings for texts, computing only the cache misses
+
+        Args:
+            texts: Passage texts, in index order
+            compute: compute(texts, on_batch) embedding a list of texts into an
+                (n, dimensions) array, calling on_batch(positions, vectors) as
+                batches complete
+            on_progress: Called as on_progress(done, total) as vectors are resolved
+
+        Returns:
+            float32 array of shape (len(texts), dimensions)
+        """
+        vectors = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        digests = [self.digest(text) for text in texts]
+        # Identical chunks (repeated boilerplate) are embedded once
+        pending = {}
+        for i, digest in enumerate(digests):
+            vector = self.store.get(digest) if self.store is not None else None
+            if vector is None:
+                pending.setdefault(digest, []).append(i)
+            else:
+                vectors[i] = vector
+        missing = list(pending.values())
+        missed = sum(len(rows) for rows in missing)
+        with self._stats_lock:
+            self.hits += len(texts) - missed
+            self.misses += missed
+
+        done = len(texts) - missed
+        if on_progress is not None:
+            on_progress(done, len(texts))
+        if not missing:
+            return vectors
+
+        def on_batch(positions, embedded):
+            nonlocal done
+            # Persist as batches arrive, so an interrupted build keeps its progress
+            for position, vector in zip(positions, embedded):
+                rows = missing[position]
+                vectors[rows] = vector
+                self._put(digests[rows[0]], vector)
+                done += len(rows)
+            if on_progress is not None:
+                on_progress(done, len(texts))
+
+        compute([texts[rows[0]] for rows in missing], on_batch)
+        with self._stats_lock:
+            self.embedded += len(missing)
+        return vectors
+
+    def _put(self, digest: bytes, vector: np.ndarray):
+        if self.store is None:
+            return
+        try:
+            stored = self.store.put(digest, vector)
+        except OSError as e:
+            print(f"[PassageEmbeddingCache] Could not persist embedding: {e}")
+            return
+        with self._stats_lock:
+            if stored:
+                self.stored += 1
+            else:
+                self.store_full += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "embedded": self.embedded,
+            "stored": self.stored,
+            "store_size": len(self.store) if self.store is not None else 0,
+            "store_full": self.store_full,
+        }
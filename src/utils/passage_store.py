@@ -0,0 +1,307 @@
+"""
+Memory-mapped binary passage store
+A read-optimized copy of an index's passages.jsonl, written next to it in
+the same version directory:
+  index.passages.store.json   header (count, compression, metadata values)
+  index.passages.offsets.npy  uint64[count + 1] offsets into the UTF-8 text
+  index.passages.text.bin     passage texts back to back (or zstd blocks)
+  index.passages.blocks.npy   uint64[blocks + 1] compressed block offsets (zstd only)
+  index.passages.meta.npy     uint32[count] index into the header's metadata values
+Everything is opened with mmap, so loading is O(1), worker processes share
+the page cache and a top-k fetch is a few array lookups and slices instead
+of a seek and json.loads per passage. LEANN still owns passages.jsonl/.idx
+(update_index appends to them), so the store is regenerated from the JSONL
+whenever a version is written.
+
+Run directly to add a store to the published index as a new version:
+    python src/utils/passage_store.py [--compression zstd]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+# Optional: only needed for zstd-compressed stores
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+PASSAGE_STORE_COMPRESSION = os.getenv("PASSAGE_STORE_COMPRESSION", "none")
+# Passages per compressed block; larger blocks compress better but cost more per fetch
+PASSAGE_STORE_BLOCK_SIZE = int(os.getenv("PASSAGE_STORE_BLOCK_SIZE", "64"))
+# Decompressed blocks kept per process
+PASSAGE_STORE_CACHE_BLOCKS = int(os.getenv("PASSAGE_STORE_CACHE_BLOCKS", "256"))
+
+STORE_FORMAT = "passage-store"
+STORE_VERSION = 1
+COMPRESSIONS = ("none", "zstd")
+
+
+def store_files(index_path: str) -> dict:
+    """Paths of the files that make up a passage store"""
+    path = Path(index_path)
+    prefix = f"{path.name}.passages"
+    return {
+        "header": path.parent / f"{prefix}.store.json",
+        "offsets": path.parent / f"{prefix}.offsets.npy",
+        "text": path.parent / f"{prefix}.text.bin",
+        "blocks": path.parent / f"{prefix}.blocks.npy",
+        "meta": path.parent / f"{prefix}.meta.npy",
+    }
+
+
+def has_passage_store(index_path: str) -> bool:
+    return store_files(index_path)["header"].exists()
+
+
+def write_passage_store(index_path: str, passages, compression: str = PASSAGE_STORE_COMPRESSION,
+                        block_size: int = PASSAGE_STORE_BLOCK_SIZE) -> int:
+    """
+    Write a store from passages in id order (ids must be "0", "1", ...)
+
+    Args:
+        passages: Iterable of {"id", "text", "metadata"} dicts, streamed
+        compression: "none" or "zstd" (falls back to "none" without zstandard)
+        block_size: Passages per zstd block
+
+    Returns:
+        Number of passages written
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown passage store compression: {compression}")
+    if compression == "zstd" and zstandard is None:
+        print("[PassageStore] zstandard is not installed; writing an uncompressed store")
+        compression = "none"
+
+    files = store_files(index_path)
+    offsets = array("Q", [0])
+    blocks = array("Q", [0])
+    codes = array("I")
+    values = {}
+    compressor = zstandard.ZstdCompressor(level=3) if compression == "zstd" else None
+    pending = []
+
+    with open(files["text"], "wb") as text_file:
+        def flush_block():
+            if pending:
+                blocks.append(blocks[-1] + text_file.write(compressor.compress(b"".join(pending))))
+                pending.clear()
+
+        for row, passage in enumerate(passages):
+            if str(passage["id"]) != str(row):
+                raise ValueError(f"Passage store needs sequential ids; row {row} has id {passage['id']!r}")
+            data = passage["text"].encode("utf-8")
+            offsets.append(offsets[-1] + len(data))
+            # The id is implied by the row; keep only the (highly repetitive) rest
+            metadata = {k: v for k, v in (passage.get("metadata") or {}).items() if k != "id"}
+            codes.append(values.setdefault(json.dumps(metadata, sort_keys=True, ensure_ascii=False), len(values)))
+            if compressor is None:
+                text_file.write(data)
+            else:
+                pending.append(data)
+                if len(pending) >= block_size:
+                    flush_block()
+        if compressor is not None:
+            flush_block()
+
+    np.save(files["offsets"], np.frombuffer(offsets, dtype=np.uint64))
+    np.save(files["meta"], np.frombuffer(codes, dtype=np.uint32))
+    if compressor is not None:
+        np.save(files["blocks"], np.frombuffer(blocks, dtype=np.uint64))
+    elif files["blocks"].exists():
+        files["blocks"].unlink()
+
+    count = len(codes)
+    header = {
+        "format": STORE_FORMAT,
+        "version": STORE_VERSION,
+        "count": count,
+        "compression": compression,
+        "block_size": block_size if compressor is not None else None,
+        "metadata_values": [json.loads(value) for value in values],
+    }
+    # Header last: its presence marks a complete store
+    with open(files["header"], "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=2)
+    return count
+
+
+def iter_jsonl_passages(passages_file):
+    """Stream {"id", "text", "metadata"} dicts from a LEANN passages.jsonl"""
+    with open(passages_file, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def convert_index(index_path: str, compression: str = PASSAGE_STORE_COMPRESSION) -> int:
+    """Write (or rewrite) the store for an index from its passages.jsonl"""
+    passages_file = Path(index_path).parent / f"{Path(index_path).name}.passages.jsonl"
+    if not passages_file.exists():
+        raise FileNotFoundError(f"Passage file not found: {passages_file}")
+    return write_passage_store(index_path, iter_jsonl_passages(passages_file), compression)
+
+
+class PassageStore:
+    """Read-only, memory-mapped view of a passage store"""
+
+    def __init__(self, index_path: str, cache_blocks: int = PASSAGE_STORE_CACHE_BLOCKS):
+        files = store_files(index_path)
+        with open(files["header"], encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("format") != STORE_FORMAT or header.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported passage store in {files['header']}")
+
+        self.index_path = index_path
+        self.count = header["count"]
+        self.compression = header["compression"]
+        self.block_size = header["block_size"]
+        self.metadata_values = header["metadata_values"]
+        self.offsets = np.load(files["offsets"], mmap_mode="r")
+        self.codes = np.load(files["meta"], mmap_mode="r")
+        if len(self.offsets) != self.count + 1 or len(self.codes) != self.count:
+            raise ValueError(f"Passage store {files['header']} is inconsistent with its arrays")
+        # An empty file can't be mapped
+        size = files["text"].stat().st_size
+        self.text = np.memmap(files["text"], dtype=np.uint8, mode="r") if size else np.empty(0, np.uint8)
+
+        self.blocks = None
+        if self.compression == "zstd":
+            if zstandard is None:
+                raise RuntimeError("This passage store is zstd-compressed; install zstandard to read it")
+            self.blocks = np.load(files["blocks"], mmap_mode="r")
+            self._decompressor = zstandard.ZstdDecompressor()
+            self._block_cache = OrderedDict()
+            self._cache_blocks = cache_blocks
+            self._cache_lock = Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def row(self, passage_id) -> int:
+        """Row of a passage id; KeyError if it isn't in the store"""
+        try:
+            row = int(passage_id)
+        except (TypeError, ValueError):
+            raise KeyError(f"Passage ID not found: {passage_id}")
+        if not 0 <= row < self.count or str(passage_id) != str(row):
+            raise KeyError(f"Passage ID not found: {passage_id}")
+        return row
+
+    def _block(self, block: int) -> bytes:
+        with self._cache_lock:
+            data = self._block_cache.get(block)
+            if data is not None:
+                self._block_cache.move_to_end(block)
+                return data
+        start, end = int(self.blocks[block]), int(self.blocks[block + 1])
+        data = self._decompressor.decompress(self.text[start:end])
+        with self._cache_lock:
+            self._block_cache[block] = data
+            if len(self._block_cache) > self._cache_blocks:
+                self._block_cache.popitem(last=False)
+        return data
+
+    def text_at(self, row: int) -> str:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        if self.blocks is None:
+            return str(self.text[start:end], "utf-8")
+        block = row // self.block_size
+        base = int(self.offsets[block * self.block_size])
+        return str(self._block(block)[start - base:end - base], "utf-8")
+
+    def metadata_at(self, row: int) -> dict:
+        return dict(self.metadata_values[self.codes[row]])
+
+    def get(self, passage_id) -> dict:
+        """One passage as {"id", "text", "metadata"} (the PassageManager shape)"""
+        row = self.row(passage_id)
+        return {"id": str(row), "text": self.text_at(row), "metadata": self.metadata_at(row)}
+
+    def get_many(self, passage_ids) -> list:
+        """Passages for a batch of ids (e.g. a top-k result), in the given order"""
+        return [self.get(passage_id) for passage_id in passage_ids]
+
+    def stats(self) -> dict:
+        stats = {
+            "passages": self.count,
+            "compression": self.compression,
+            "text_bytes": int(self.text.shape[0]),
+            "metadata_values": len(self.metadata_values),
+        }
+        if self.blocks is not None:
+            stats["cached_blocks"] = len(self._block_cache)
+        return stats
+
+
+class StorePassageManager:
+    """
+    Drop-in for LeannSearcher.passage_manager backed by a PassageStore
+
+    Lookups that LEANN makes per search result (get_passage, len) go to the
+    store; everything else (metadata filters, BM25 passage files) is
+    delegated to the original PassageManager.
+    """
+
+    def __init__(self, store: PassageStore, passage_manager):
+        self.store = store
+        self._passage_manager = passage_manager
+        # The pickled id -> offset maps are no longer consulted; free them
+        passage_manager.offset_maps = {}
+
+    def get_passage(self, passage_id: str) -> dict:
+        return self.store.get(passage_id)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getattr__(self, name):
+        return getattr(self._passage_manager, name)
+
+
+def main():
+    utils_dir = str(Path(__file__).parent)
+    if utils_dir not in sys.path:
+        sys.path.insert(0, utils_dir)
+    from index_versions import (
+        current_index_path, discard_version, index_lock, new_version, publish_version, write_version_manifest
+    )
+    from incremental_index import index_files
+
+    parser = argparse.ArgumentParser(description="Add a binary passage store to the published index")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=PASSAGE_STORE_COMPRESSION)
+    args = parser.parse_args()
+
+    # Published versions are immutable: copy the current one and publish the copy
+    with index_lock("convert"):
+        base_path = current_index_path()
+        base = index_files(base_path)
+        if not base["meta"].exists():
+            raise SystemExit(f"No index found at {base_path}")
+        version, index_path = new_version()
+        try:
+            files = index_files(index_path)
+            for key, source in base.items():
+                if source.exists():
+                    shutil.copy2(source, files[key])
+            count = convert_index(index_path, args.compression)
+            write_version_manifest(version, kind="passage_store", base=Path(base_path).parent.name,
+                                   total_passages=count)
+            publish_version(version)
+        except BaseException:
+            discard_version(version)
+            raise
+    print(f"Converted {count} passages from {base_path} into version {version} ({args.compression})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
+"""
+OpenAI organization usage and cost reporting
+Paginated reports are fetched over one keep-alive async HTTP client; the
+server stores them as daily buckets (see server/usage_store.py).
+OPENAI_ADMIN_BASE_URL can point the client at a local stand-in server.
+"""
+import asyncio
 import os
-import requests
-from datetime import datetime, timedelta
-from dotenv import load_dotenv
 import sys
 import site
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-import os
+
+import httpx
+from dotenv import load_dotenv
 
 
 env_path = Path(__file__).resolve().parents[2] / ".env"
@@ -23,37 +31,16 @@ if user_site not in sys.path:
 
 
 load_dotenv(dotenv_path=env_path)
-API_KEY = os.getenv("ADMIN_KEY")
-ORG_ID = os.getenv("OPENAI_ORG_ID")  # optional
-
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}"
-}
-if ORG_ID:
-    HEADERS["OpenAI-Organization"] = ORG_ID
-
-BASE = "https://api.openai.com/v1"
-
-
-def fetch_all_pages(url, params=None):
-    """Fetch all pages from a paginated OpenAI API endpoint."""
-    all_data = []
-    next_page = None
-    while True:
-        req_params = dict(params or {})
-        if next_page:
-            req_params["page"] = next_page
-        resp = requests.get(url, headers=HEADERS, params=req_params)
-        resp.raise_for_status()
-        data = resp.json()
-        all_data.extend(data.get("data", []))
-        if not data.get("has_more"):
-            break
-        next_page = data.get("next_page")
-    return all_data
+
+USAGE_COST_BASE_URL = os.getenv("OPENAI_ADMIN_BASE_URL", "https://api.openai.com/v1")
+USAGE_COST_TIMEOUT = float(os.getenv("USAGE_COST_TIMEOUT", "30"))
+
+USAGE_PATH = "/organization/usage/completions"
+COSTS_PATH = "/organization/costs"
 
 
 def aggregate_usage(usage_data):
+    """Aggregate token usage from OpenAI API response."""
     total_input = 0
     total_output = 0
     for bucket in usage_data:
@@ -64,6 +51,7 @@ def aggregate_usage(usage_data):
 
 
 def aggregate_costs(cost_data):
+    """Aggregate costs from OpenAI API response."""
     total_cost = 0.0
     for bucket in cost_data:
         for result in bucket.get("results", []):
@@ -72,33 +60,118 @@ def aggregate_costs(cost_data):
     return total_cost
 
 
-if __name__ == "__main__":
-    # Example: last 7 days
-    end = datetime.utcnow()
-    start = end - timedelta(days=7)
-
-    usage_url = f"{BASE}/organization/usage/completions"
-    costs_url = f"{BASE}/organization/costs"
-
+class UsageCostClient:
+    """Async client for the organization usage and costs endpoints"""
+
+    def __init__(self, api_key: str = None, org_id: str = None,
+                 base_url: str = USAGE_COST_BASE_URL, timeout: float = USAGE_COST_TIMEOUT):
+        """
+        Args:
+            api_key: Admin API key (defaults to ADMIN_KEY)
+            org_id: Organization id header (defaults to ORG_ID / OPENAI_ORG_ID)
+            base_url: API root, e.g. a local stand-in server in tests
+            timeout: Per-request timeout in seconds
+        """
+        self.api_key = api_key if api_key is not None else os.getenv("ADMIN_KEY")
+        self.org_id = org_id if org_id is not None else (os.getenv("ORG_ID") or os.getenv("OPENAI_ORG_ID"))
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._client = None
+
+        self.requests = 0
+        self.pages = 0
+        self.errors = 0
+        self._fetch_total_ms = 0.0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            if self.org_id:
+                headers["OpenAI-Organization"] = self.org_id
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=8, max_keepalive_connections=4)
+            )
+        return self._client
+
+    async def fetch_all_pages(self, path: str, params: dict = None) -> list:
+        """Fetch all pages from a paginated endpoint."""
+        client = self._get_client()
+        all_data = []
+        next_page = None
+        started = time.monotonic()
+        self.requests += 1
+        try:
+            while True:
+                req_params = dict(params or {})
+                if next_page:
+                    req_params["page"] = next_page
+                resp = await client.get(path, params=req_params)
+                self.pages += 1
+                resp.raise_for_status()
+                data = resp.json()
+                all_data.extend(data.get("data", []))
+                if not data.get("has_more"):
+                    break
+                next_page = data.get("next_page")
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._fetch_total_ms += (time.monotonic() - started) * 1000
+        return all_data
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "requests": self.requests,
+            "pages": self.pages,
+            "errors": self.errors,
+            "avg_fetch_ms": self._fetch_total_ms / self.requests if self.requests else 0.0,
+        }
+
+
+_usage_cost_client = None
+
+
+def get_usage_cost_client() -> UsageCostClient:
+    """Process-wide UsageCostClient"""
+    global _usage_cost_client
+    if _usage_cost_client is None:
+        _usage_cost_client = UsageCostClient()
+    return _usage_cost_client
+
+
+async def _main(days: int = 7):
+    client = UsageCostClient()
+    end = datetime.now(timezone.utc)
     params = {
-        "start_time": int(start.timestamp()),
+        "start_time": int((end - timedelta(days=days)).timestamp()),
         "end_time": int(end.timestamp()),
-        "interval": "1d"
+        "bucket_width": "1d",
+        "limit": 31,
     }
-
-    # Fetch and aggregate usage
-    try:
-        usage_data = fetch_all_pages(usage_url, params)
-        total_input_tokens, total_output_tokens = aggregate_usage(usage_data)
-        print(f"Total input tokens: {total_input_tokens}")
-        print(f"Total output tokens: {total_output_tokens}")
-    except Exception as e:
-        print("Error fetching usage data:", e)
-
-    # Fetch and aggregate costs
     try:
-        costs_data = fetch_all_pages(costs_url, params)
-        total_cost_usd = aggregate_costs(costs_data)
-        print(f"Total estimated cost: ${total_cost_usd:.6f}")
-    except Exception as e:
-        print("Error fetching costs data:", e)
+        usage_data, costs_data = await asyncio.gather(
+            client.fetch_all_pages(USAGE_PATH, params),
+            client.fetch_all_pages(COSTS_PATH, params)
+        )
+    finally:
+        await client.aclose()
+    total_input, total_output = aggregate_usage(usage_data)
+    print(f"Total input tokens: {total_input}")
+    print(f"Total output tokens: {total_output}")
+    print(f"Total estimated cost: ${aggregate_costs(costs_data):.6f}")
+
+
+if __name__ == "__main__":
+    # Example: last 7 days
+    asyncio.run(_main(7))
@@ -1,12 +1,34 @@
 import { useState, useEffect } from 'react';
 import { adminApi, DashboardStats, UserListItem, UsageCostData } from '../services/adminApi';
-import { documentsApi, DocumentListItem } from '../services/documentsApi';
+import { documentsApi, DocumentListItem, IndexJob } from '../services/documentsApi';
 import { Button } from './ui/button';
 import {
   Users, Activity, Clock, CheckCircle, XCircle,
   LogOut, Shield, Upload, FileText, Trash2, RefreshCw, MessageSquare, Brain, Database, DollarSign, Zap
 } from 'lucide-react';
 
+const INDEX_JOB_POLL_MS = 2000;
+
+function describeIndexJob(job: IndexJob): string {
+  const progress = job.progress || {};
+  switch (job.stage) {
+    case 'parse':
+      return `Parsing documents (${progress.files_done ?? 0}/${progress.files ?? 0} files, ${progress.chunks ?? 0} chunks)...`;
+    case 'chunk':
+      return `Chunking (${progress.chunks ?? 0} chunks)...`;
+    case 'embed':
+      // The total is known once every file has been parsed
+      return `Embedding ${progress.done ?? 0}${progress.total !== undefined ? `/${progress.total}` : ''} chunks `
+        + `from ${progress.files_done ?? 0}/${progress.files ?? 0} files `
+        + `(${progress.cache_hits ?? 0} cached; queued: ${progress.chunk_queue ?? 0}/${progress.chunk_queue_capacity ?? 0} chunks, `
+        + `${progress.vector_queue ?? 0}/${progress.vector_queue_capacity ?? 0} batches)...`;
+    case 'build':
+      return `Building index (${progress.passages ?? 0} passages)...`;
+    default:
+      return 'Rebuilding index...';
+  }
+}
+
 function formatDate(dateStr: string | null): string {
   if (!dateStr) return 'Never';
   const date = new Date(dateStr);
@@ -16,6 +38,8 @@ function formatDate(dateStr: string | null): string {
 export function AdminDashboard() {
   const [stats, setStats] = useState<DashboardStats | null>(null);
   const [users, setUsers] = useState<UserListItem[]>([]);
+  const [usersCursor, setUsersCursor] = useState<string | null>(null);
+  const [loadingMoreUsers, setLoadingMoreUsers] = useState(false);
   const [documents, setDocuments] = useState<DocumentListItem[]>([]);
   const [usageCost, setUsageCost] = useState<UsageCostData | null>(null);
   const [usageDays, setUsageDays] = useState(7);
@@ -25,6 +49,7 @@ export function AdminDashboard() {
   const [indexStatus, setIndexStatus] = useState('');
   const [uploading, setUploading] = useState(false);
   const [rebuilding, setRebuilding] = useState(false);
+  const [rebuildJobId, setRebuildJobId] = useState<string | null>(null);
   const [loadingUsage, setLoadingUsage] = useState(false);
 
   useEffect(() => {
@@ -42,6 +67,7 @@ export function AdminDashboard() {
 
       setStats(statsData);
       setUsers(usersResponse.users || []);
+      setUsersCursor(usersResponse.next_cursor || null);
       setDocuments(documentsData);
 
       // Load usage/cost data separately (non-blocking)
@@ -56,6 +82,20 @@ export function AdminDashboard() {
     }
   };
 
+  const loadMoreUsers = async () => {
+    if (!usersCursor) return;
+    try {
+      setLoadingMoreUsers(true);
+      const page = await adminApi.getUsers({ cursor: usersCursor });
+      setUsers((prev) => [...prev, ...(page.users || [])]);
+      setUsersCursor(page.next_cursor || null);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load users');
+    } finally {
+      setLoadingMoreUsers(false);
+    }
+  };
+
   const loadUsageCost = async (days: number) => {
     try {
       setLoadingUsage(true);
@@ -87,7 +127,11 @@ export function AdminDashboard() {
       setUploading(true);
       setUploadStatus('Uploading...');
       const response = await documentsApi.uploadDocument(file);
-      setUploadStatus(`Success: ${response.message}`);
+      setUploadStatus(
+        response.index_status === 'rebuild_required' || response.index_status === 'rebuild_in_progress'
+          ? `Success: ${response.message}. Rebuild the index to include it (${response.index_reason})`
+          : `Success: ${response.message}`
+      );
 
       const documentsData = await documentsApi.listDocuments();
       setDocuments(documentsData);
@@ -126,13 +170,36 @@ export function AdminDashboard() {
       setRebuilding(true);
       setIndexStatus('Rebuilding index...');
       const response = await documentsApi.rebuildIndex();
-      setIndexStatus(`Success: ${response.message}`);
+      let job = response.job;
+      setRebuildJobId(job.id);
+      while (!['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+        setIndexStatus(describeIndexJob(job));
+        await new Promise((resolve) => setTimeout(resolve, INDEX_JOB_POLL_MS));
+        job = await documentsApi.getIndexJob(job.id);
+      }
+      if (job.status === 'succeeded') {
+        setIndexStatus(`Success: Index rebuilt (${job.progress.passages ?? 0} passages)`);
+      } else if (job.status === 'cancelled') {
+        setIndexStatus('Index rebuild cancelled');
+      } else {
+        setIndexStatus(`Error: ${job.error || 'Rebuild failed'}`);
+      }
       setTimeout(() => setIndexStatus(''), 5000);
     } catch (err) {
       setIndexStatus(`Error: ${err instanceof Error ? err.message : 'Rebuild failed'}`);
       setTimeout(() => setIndexStatus(''), 5000);
     } finally {
       setRebuilding(false);
+      setRebuildJobId(null);
+    }
+  };
+
+  const handleCancelRebuild = async () => {
+    if (!rebuildJobId) return;
+    try {
+      await documentsApi.cancelIndexJob(rebuildJobId);
+    } catch (err) {
+      setIndexStatus(`Error: ${err instanceof Error ? err.message : 'Cancel failed'}`);
     }
   };
 
@@ -468,6 +535,18 @@ export function AdminDashboard() {
               </tbody>
             </table>
           </div>
+
+          {usersCursor && (
+            <div className="flex justify-center mt-6">
+              <Button
+                onClick={loadMoreUsers}
+                disabled={loadingMoreUsers}
+                className="bg-white/10 hover:bg-white/20 text-white border border-white/20 transition-all disabled:opacity-50"
+              >
+                {loadingMoreUsers ? 'Loading...' : 'Load more users'}
+              </Button>
+            </div>
+          )}
         </div>
 
         {/* Document Management Section */}
@@ -493,6 +572,15 @@ export function AdminDashboard() {
                 {rebuilding ? 'Rebuilding...' : 'Rebuild Index'}
               </Button>
 
+              {rebuildJobId && (
+                <Button
+                  onClick={handleCancelRebuild}
+                  className="bg-white/10 hover:bg-white/20 text-white border-0 shadow-lg transition-all"
+                >
+                  Cancel
+                </Button>
+              )}
+
               <label className="cursor-pointer">
                 <input
                   type="file"
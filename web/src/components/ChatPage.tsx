@@ -15,6 +15,7 @@ export function ChatPage() {
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  const [conversationId, setConversationId] = useState<string | undefined>(undefined);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -35,25 +36,42 @@ export function ChatPage() {
       timestamp: new Date(),
     };
 
-    setMessages((prev) => [...prev, userMessage]);
+    // Filled in token by token as the answer streams
+    const assistantMessage: Message = {
+      role: 'assistant',
+      content: '',
+      timestamp: new Date(),
+    };
+
+    setMessages((prev) => [...prev, userMessage, assistantMessage]);
     setInput('');
     setLoading(true);
     setError('');
 
-    try {
-      const response: ChatResponse = await chatApi.sendMessage(input);
-
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: response.response,
-        sources: response.sources,
-        timestamp: new Date(),
-      };
+    const updateAnswer = (update: (message: Message) => Message) => {
+      setMessages((prev) => {
+        const next = [...prev];
+        next[next.length - 1] = update(next[next.length - 1]);
+        return next;
+      });
+    };
 
-      setMessages((prev) => [...prev, assistantMessage]);
+    try {
+      const response: ChatResponse = await chatApi.streamMessage(
+        input,
+        (text) => updateAnswer((message) => ({ ...message, content: message.content + text })),
+        conversationId
+      );
+      setConversationId(response.conversation_id);
+      updateAnswer((message) => ({ ...message, content: response.response, sources: response.sources }));
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to send message');
       console.error('Chat error:', err);
+      // Keep a partial answer; drop the bubble if nothing arrived
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        return last && last.role === 'assistant' && !last.content ? prev.slice(0, -1) : prev;
+      });
     } finally {
       setLoading(false);
     }
@@ -110,7 +128,10 @@ export function ChatPage() {
               </p>
             </div>
           ) : (
-            messages.map((message, index) => (
+            messages
+              // The streaming answer appears with its first token
+              .filter((message) => message.role === 'user' || message.content)
+              .map((message, index) => (
               <div
                 key={index}
                 className={`flex ${message.role === 'user' ? 'justify-end' : 'justify-start'}`}
@@ -175,7 +196,7 @@ export function ChatPage() {
             ))
           )}
 
-          {loading && (
+          {loading && !messages[messages.length - 1]?.content && (
             <div className="flex justify-start">
               <div className="bg-white/10 backdrop-blur-xl border border-white/20 rounded-2xl p-4 shadow-lg">
                 <div className="flex items-center gap-3">
@@ -66,6 +66,11 @@ export interface DashboardStats {
   };
   top_users: TopUser[];
   memory_categories: MemoryCategory[];
+  freshness?: {
+    source: string;
+    last_updated_at: string | null;
+    rebuilt_at: string | null;
+  };
   // Legacy fields for compatibility
   total_users?: number;
   active_users?: number;
@@ -91,6 +96,20 @@ export interface UserListItem {
   stm_count: number;
 }
 
+export interface UserListParams {
+  limit?: number;
+  cursor?: string | null;
+  email?: string;
+  is_active?: boolean;
+  is_admin?: boolean;
+  is_email_verified?: boolean;
+}
+
+export interface UserListPage {
+  users: UserListItem[];
+  next_cursor: string | null;
+}
+
 export interface UserDetails {
   user: {
     id: string;
@@ -134,6 +153,10 @@ export interface UsageCostData {
   period_days: number;
   start_date: string;
   end_date: string;
+  by_day?: { day: string; input_tokens: number; output_tokens: number; cost_usd: number }[];
+  by_model?: { model: string; input_tokens: number; output_tokens: number; requests: number }[];
+  synced_at?: string | null;
+  stale?: boolean;
 }
 
 class AdminApiService {
@@ -189,14 +212,31 @@ class AdminApiService {
     return await this.request<DashboardStats>('/admin/stats');
   }
 
-  async getUsers(): Promise<{ users: UserListItem[] }> {
-    return await this.request<{ users: UserListItem[] }>('/admin/users');
+  async getUsers(params: UserListParams = {}): Promise<UserListPage> {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        query.set(key, String(value));
+      }
+    });
+    const suffix = query.toString() ? `?${query.toString()}` : '';
+    return await this.request<UserListPage>(`/admin/users${suffix}`);
   }
 
   async getUserDetails(userId: string): Promise<UserDetails> {
     return await this.request<UserDetails>(`/admin/user/${userId}/details`);
   }
 
+  async updateUser(
+    userId: string,
+    changes: { is_active?: boolean; is_admin?: boolean }
+  ): Promise<{ user: UserListItem }> {
+    return await this.request<{ user: UserListItem }>(`/admin/user/${userId}`, {
+      method: 'PATCH',
+      body: JSON.stringify(changes),
+    });
+  }
+
   async getOpenAIUsage(): Promise<OpenAIUsageData> {
     // This endpoint may not exist yet, return mock data
     return { success: false, error: 'Not implemented' };
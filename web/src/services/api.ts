@@ -30,6 +30,7 @@ export interface SignupCredentials {
 class ApiService {
   private accessToken: string | null = null;
   private refreshToken: string | null = null;
+  private refreshing: Promise<boolean> | null = null;
 
   constructor() {
     // Load tokens from localStorage on initialization
@@ -139,18 +140,34 @@ class ApiService {
 
   /**
    * Refresh access token
+   * Concurrent callers share one refresh: the refresh token is single-use,
+   * and presenting it twice revokes the whole session.
    */
-  async refreshAccessToken(): Promise<boolean> {
+  refreshAccessToken(): Promise<boolean> {
+    if (!this.refreshing) {
+      this.refreshing = this.rotateRefreshToken().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    return this.refreshing;
+  }
+
+  private async rotateRefreshToken(): Promise<boolean> {
     try {
+      // Another tab or service may have rotated it since this one was loaded
+      this.refreshToken = localStorage.getItem('refreshToken') ?? this.refreshToken;
       if (!this.refreshToken) return false;
 
-      const response = await this.request<{ accessToken: string }>('/auth/refresh', {
+      const response = await this.request<{ accessToken: string; refreshToken: string }>('/auth/refresh', {
         method: 'POST',
         body: JSON.stringify({ refreshToken: this.refreshToken }),
       });
 
       this.accessToken = response.accessToken;
       localStorage.setItem('accessToken', response.accessToken);
+      // Refresh tokens are single-use; keep the rotated one
+      this.refreshToken = response.refreshToken;
+      localStorage.setItem('refreshToken', response.refreshToken);
       return true;
     } catch (error) {
       console.error('Failed to refresh token:', error);
@@ -1,3 +1,5 @@
+import { api } from './api';
+
 const API_BASE_URL = (import.meta as any).env?.VITE_API_URL || 'http://localhost:3001/api';
 
 export interface ChatMessage {
@@ -18,19 +20,58 @@ export interface ChatResponse {
   conversation_id?: string;
 }
 
+export interface ConversationSummary {
+  conversation_id: string;
+  title: string;
+  last_message: string;
+  turns: number;
+  started_at: string;
+  last_activity: string;
+}
+
+export interface ConversationTurn {
+  chat_id: string;
+  user_input: string;
+  ai_output: string;
+  tokens_used: number | null;
+  created_at: string;
+}
+
+function withCursor(endpoint: string, cursor?: string | null): string {
+  return cursor ? `${endpoint}?cursor=${encodeURIComponent(cursor)}` : endpoint;
+}
+
 class ChatApiService {
+  /**
+   * fetch with the current access token; on 401/403 refresh it once and retry
+   */
+  private async authorizedFetch(endpoint: string, options: RequestInit = {}): Promise<Response> {
+    const send = () => {
+      // Always read fresh token from localStorage to handle signup/login/refresh updates
+      const token = localStorage.getItem('accessToken');
+      return fetch(`${API_BASE_URL}${endpoint}`, {
+        ...options,
+        headers: {
+          'Content-Type': 'application/json',
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+          ...options.headers,
+        },
+      });
+    };
+
+    const response = await send();
+    if (response.status !== 401 && response.status !== 403) {
+      return response;
+    }
+    if (!(await api.refreshAccessToken())) {
+      await api.logout();
+      throw new Error('Session expired. Please login again.');
+    }
+    return send();
+  }
+
   private async request<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
-    // Always read fresh token from localStorage to handle signup/login updates
-    const token = localStorage.getItem('accessToken');
-
-    const response = await fetch(`${API_BASE_URL}${endpoint}`, {
-      ...options,
-      headers: {
-        'Content-Type': 'application/json',
-        ...(token ? { Authorization: `Bearer ${token}` } : {}),
-        ...options.headers,
-      },
-    });
+    const response = await this.authorizedFetch(endpoint, options);
 
     if (!response.ok) {
       const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
@@ -50,12 +91,84 @@ class ChatApiService {
     });
   }
 
-  async getHistory(): Promise<any> {
-    return this.request('/chat/history');
+  /**
+   * Send a message and receive the answer as Server-Sent Events.
+   * onToken is called for every generated text chunk; the promise resolves
+   * with the full response (including sources) once the stream ends.
+   */
+  async streamMessage(
+    message: string,
+    onToken: (text: string) => void,
+    conversationId?: string
+  ): Promise<ChatResponse> {
+    const response = await this.authorizedFetch('/chat/stream', {
+      method: 'POST',
+      headers: { Accept: 'text/event-stream' },
+      body: JSON.stringify({
+        message,
+        conversation_id: conversationId,
+      }),
+    });
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+      throw new Error(error.detail || `HTTP ${response.status}`);
+    }
+
+    const result: ChatResponse = { response: '', sources: [], conversation_id: conversationId };
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        const payload = data ? JSON.parse(data) : {};
+
+        if (event === 'token') {
+          result.response += payload.text;
+          onToken(payload.text);
+        } else if (event === 'sources') {
+          result.sources = payload.sources;
+          result.conversation_id = payload.conversation_id ?? conversationId;
+        } else if (event === 'error') {
+          throw new Error(payload.detail || 'Chat stream error');
+        }
+      }
+    }
+
+    return result;
+  }
+
+  async getHistory(
+    cursor?: string | null
+  ): Promise<{ conversations: ConversationSummary[]; next_cursor: string | null }> {
+    return this.request(withCursor('/chat/history', cursor));
+  }
+
+  async getConversation(
+    conversationId: string,
+    cursor?: string | null
+  ): Promise<{ conversation_id: string; turns: ConversationTurn[]; next_cursor: string | null }> {
+    return this.request(withCursor(`/chat/conversation/${encodeURIComponent(conversationId)}`, cursor));
   }
 
   async deleteConversation(conversationId: string): Promise<any> {
-    return this.request(`/chat/conversation/${conversationId}`, {
+    return this.request(`/chat/conversation/${encodeURIComponent(conversationId)}`, {
       method: 'DELETE',
     });
   }
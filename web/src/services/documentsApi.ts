@@ -12,6 +12,9 @@ export interface DocumentUploadResponse {
   filename: string;
   file_path: string;
   message: string;
+  index_status?: 'indexed' | 'unchanged' | 'empty' | 'rebuild_required' | 'rebuild_in_progress';
+  chunks_added?: number;
+  index_reason?: string;
 }
 
 export interface DocumentDeleteResponse {
@@ -19,10 +22,24 @@ export interface DocumentDeleteResponse {
   message: string;
 }
 
+export interface IndexJob {
+  id: string;
+  status: 'queued' | 'running' | 'cancelling' | 'succeeded' | 'failed' | 'cancelled';
+  stage: 'parse' | 'chunk' | 'embed' | 'build' | 'done' | null;
+  progress: Record<string, number | string>;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+  returncode: number | null;
+  error: string | null;
+  documents?: number;
+}
+
 export interface IndexRebuildResponse {
   success: boolean;
   message: string;
-  documents_indexed: number;
+  already_running: boolean;
+  job: IndexJob;
 }
 
 class DocumentsApiService {
@@ -90,6 +107,16 @@ class DocumentsApiService {
       method: 'POST',
     });
   }
+
+  async getIndexJob(jobId: string): Promise<IndexJob> {
+    return this.request<IndexJob>(`/documents/jobs/${encodeURIComponent(jobId)}`);
+  }
+
+  async cancelIndexJob(jobId: string): Promise<IndexJob> {
+    return this.request<IndexJob>(`/documents/jobs/${encodeURIComponent(jobId)}/cancel`, {
+      method: 'POST',
+    });
+  }
 }
 
 export const documentsApi = new DocumentsApiService();